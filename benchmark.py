@@ -0,0 +1,327 @@
+# benchmark.py
+import argparse
+import random
+import re
+import time
+import tracemalloc
+import tempfile
+import json
+import os
+from datetime import time as time_
+import pandas as pd
+from openpyxl import Workbook
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects.sqlite import insert
+from database import (
+    crear_engine, crear_tabla, guardar_defensas, verificar_indices, preparar_defensas,
+    sincronizar_participaciones, aplicar_esquema, incrementar_version, DefensaTesis, COLUMNAS_DEFENSA
+)
+from consultas import (
+    consulta_filtrada, consulta_defensas_profesor, consulta_busqueda_texto,
+    consulta_conteo_por_profesor, paginar
+)
+from excel_processor import (
+    COLUMNAS_ENCABEZADO, procesar_filas, procesar_excel_stream, parsear_fecha,
+    estadisticas_cache, limpiar_cache
+)
+
+PROFESORES = [
+    "Dr. Juan Pérez @jperez", "Dra. Ana Gómez", "MSc. Luis Díaz", "Lic. Rosa Martí",
+    "Dr. Carlos Ruiz", "Dra. Elena Vidal", "MSc. Jorge Castro @jcastro", "Dra. Marta Soler"
+]
+HORAS = ["09:00", "10:30", "1 pkm", "2:00 pm", "14:30", "15:00", time_(9, 0), time_(13, 30), "11:00:00", None]
+LUGARES = ["Aula 3 (planta baja)", "Salón Francofonia", "Resp Lab 2", "Aula 5", "Sala de Consejo"]
+MESES = ["enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "septiembre", "octubre", "noviembre", "diciembre"]
+
+def generar_filas(n_filas, semilla=0):
+    # Filas crudas de un calendario como las de los archivos reales: encabezado
+    # de fecha en español, fila de títulos repetida en cada día (y a veces en
+    # medio del día), filas vacías, horas raras ("1 pkm", "2:00 pm", objetos
+    # time, vacías) y filas incompletas que el procesamiento debe descartar
+    rnd = random.Random(semilla)
+    filas = []
+    estudiante = 0
+    while estudiante < n_filas:
+        mes = rnd.choice(MESES)
+        fecha = f"{rnd.randint(1, 28)} de {mes.capitalize() if rnd.random() < 0.1 else mes} {rnd.randint(2023, 2026)}"
+        filas.append([None, fecha] + [None] * 8)
+        filas.append([None] + COLUMNAS_ENCABEZADO)
+        for _ in range(rnd.randint(4, 12)):
+            if rnd.random() < 0.02:
+                filas.append([None] + COLUMNAS_ENCABEZADO)
+            if rnd.random() < 0.03:
+                filas.append([None] * 10)
+            fila = [
+                None, f"Estudiante {estudiante}",
+                f"{rnd.choice(PROFESORES)}, {rnd.choice(PROFESORES)}",
+                rnd.choice(PROFESORES), rnd.choice(PROFESORES), rnd.choice(PROFESORES),
+                rnd.choice(PROFESORES), None, rnd.choice(HORAS), rnd.choice(LUGARES)
+            ]
+            if rnd.random() < 0.02:
+                fila[4] = fila[5] = None  # Sin miembros: no llega a 7 columnas con datos
+            filas.append(fila)
+            estudiante += 1
+    return filas
+
+def generar_filas_crudas(n_filas, semilla=0):
+    # Hoja cruda en memoria con la misma forma que devuelve pd.read_excel(header=None)
+    return pd.DataFrame(generar_filas(n_filas, semilla))
+
+def generar_calendario_excel(ruta, n_filas, hojas=1, semilla=0):
+    # Libro con n_filas defensas en cada hoja, en el formato oficial de calendario
+    libro = Workbook(write_only=True)
+    for numero in range(hojas):
+        hoja = libro.create_sheet(f"Calendario {numero + 1}")
+        for fila in generar_filas(n_filas, semilla + numero):
+            hoja.append(fila)
+    libro.save(ruta)
+    return ruta
+
+# Normalizadores anteriores, sin caché ni camino rápido: la referencia no
+# comparte código con lo que se mide (ver tests/test_normalizacion.py)
+def limpiar_nombres_referencia(texto):
+    if pd.isna(texto):
+        return None
+    return re.sub(r"@\w+", "", texto).strip()
+
+def normalizar_hora_referencia(hora):
+    if isinstance(hora, str) and "pkm" in hora.lower():
+        return "13:00"
+    if isinstance(hora, time_):
+        return hora.strftime("%H:%M")
+    try:
+        hora_parsed = pd.to_datetime(hora, errors='coerce')
+        return hora_parsed.strftime("%H:%M") if not pd.isna(hora_parsed) else None
+    except:
+        return None
+
+def normalizar_lugar_referencia(lugar):
+    lugar = str(lugar).split("(")[0].strip()
+    return lugar.replace("Francofonia", "Francofonía").replace("Resp ", "")
+
+def procesar_filas_iterrows(df_raw):
+    # Implementación anterior fila a fila, usada como referencia
+    data = []
+    current_date = None
+    for index, row in df_raw.iterrows():
+        if re.match(r"\d{1,2} de \w+ \d{4}", str(row[1])):
+            current_date = parsear_fecha(row[1])
+            continue
+        if list(row[1:10].dropna()) == COLUMNAS_ENCABEZADO:
+            continue
+        if current_date and len(row[1:9].dropna()) >= 7:
+            datos = {
+                "fecha": current_date,
+                "estudiante": row[1],
+                "tutores": limpiar_nombres_referencia(row[2]),
+                "presidente": limpiar_nombres_referencia(row[3]),
+                "miembro_1": limpiar_nombres_referencia(row[4]),
+                "miembro_2": limpiar_nombres_referencia(row[5]),
+                "oponente": limpiar_nombres_referencia(row[6]),
+                "hora": normalizar_hora_referencia(row[8]),
+                "lugar": normalizar_lugar_referencia(row[9])
+            }
+            try:
+                datos['hora'] = pd.to_datetime(datos['hora'], errors='coerce').time()
+            except:
+                datos['hora'] = None
+            data.append(datos)
+    return pd.DataFrame(data)
+
+def guardar_defensas_sqlalchemy(engine, lotes):
+    # Escritura anterior, usada como referencia: upsert de SQLAlchemy con un
+    # diccionario por fila y los índices actualizados fila a fila
+    tabla = DefensaTesis.__table__
+    with engine.begin() as conn:
+        for lote in lotes:
+            registros = preparar_defensas(lote).to_dict('records')
+            sentencia = insert(tabla)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=['clave'],
+                set_={
+                    **{columna: sentencia.excluded[columna] for columna in COLUMNAS_DEFENSA + ['hash_fila']},
+                    'sincronizada': None
+                },
+                where=tabla.c.hash_fila != sentencia.excluded.hash_fila
+            )
+            conn.execute(sentencia, registros)
+        sincronizar_participaciones(conn)
+        aplicar_esquema(conn)
+        incrementar_version(conn)
+
+def guardar_to_sql(engine, lotes):
+    # Escritura original con DataFrame.to_sql: solo la tabla de defensas, sin upsert
+    with engine.begin() as conn:
+        for lote in lotes:
+            preparar_defensas(lote).to_sql('defensas_tesis', conn, if_exists='append', index=False)
+
+def cronometrar(funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    return resultado, time.perf_counter() - inicio
+
+def benchmark_clasificacion(tamanos, con_referencia=True):
+    for n_filas in tamanos:
+        df_raw = generar_filas_crudas(n_filas)
+        limpiar_cache()
+        (df, _), t_columnar = cronometrar(procesar_filas, df_raw)
+        cache = estadisticas_cache()
+        linea = f"{n_filas:>8} filas | columnar: {t_columnar:8.3f}s ({len(df) / t_columnar:,.0f} filas/s)"
+        if con_referencia:
+            limpiar_cache()
+            df_ref, t_ref = cronometrar(procesar_filas_iterrows, df_raw)
+            pd.testing.assert_frame_equal(df, df_ref)
+            linea += f" | iterrows: {t_ref:8.3f}s | aceleración: {t_ref / t_columnar:6.1f}x"
+        print(linea)
+        for nombre, info in cache.items():
+            print(f"{'':>14}{nombre}: {info['hits']} aciertos, {info['misses']} fallos, {info['currsize']}/{info['maxsize']} en caché")
+
+def benchmark_consultas(n_filas, repeticiones=200):
+    # Cargar una base en memoria y medir las búsquedas por fecha y por lugar
+    engine = crear_engine("sqlite://")
+    crear_tabla(engine)
+    df, _ = procesar_filas(generar_filas_crudas(n_filas))
+    _, t_carga = cronometrar(guardar_defensas, engine, [df])
+    print(f"{len(df):>8} defensas cargadas en {t_carga:.2f}s")
+
+    planes = verificar_indices(engine)
+    print("Uso de índices (EXPLAIN QUERY PLAN):", planes)
+    if not all(planes.values()):
+        raise SystemExit("❌ Alguna búsqueda recorre la tabla completa")
+
+    with engine.connect() as conn:
+        fecha = conn.execute(text("SELECT fecha FROM defensas_tesis LIMIT 1")).scalar()
+        consultas = {
+            "fecha": ("SELECT * FROM defensas_tesis WHERE fecha = :valor", {"valor": fecha}),
+            "lugar": ("SELECT * FROM defensas_tesis WHERE lugar = :valor AND fecha = :fecha", {"valor": "Aula 5", "fecha": fecha}),
+        }
+        for nombre, (consulta, params) in consultas.items():
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                conn.execute(text(consulta), params).fetchall()
+            promedio = (time.perf_counter() - inicio) / repeticiones
+            print(f"Búsqueda por {nombre}: {promedio * 1000:.3f} ms")
+
+def benchmark_carga(n_filas, tamano_lote=5000):
+    # Filas/s de la escritura en una base nueva en disco: to_sql, el upsert
+    # anterior con SQLAlchemy y guardar_defensas (executemany, pragmas de
+    # crear_engine y, con masiva=True, índices reconstruidos al final)
+    df, _ = procesar_filas(generar_filas_crudas(n_filas))
+    lotes = [df.iloc[inicio:inicio + tamano_lote] for inicio in range(0, len(df), tamano_lote)]
+    variantes = {
+        "upsert SQLAlchemy (anterior)": (create_engine, guardar_defensas_sqlalchemy),
+        "to_sql (pandas, sin participaciones)": (create_engine, guardar_to_sql),
+        "executemany, índices mantenidos": (crear_engine, lambda engine, lotes: guardar_defensas(engine, lotes, masiva=False)),
+        "executemany, índices al final": (crear_engine, lambda engine, lotes: guardar_defensas(engine, lotes, masiva=True)),
+    }
+    with tempfile.TemporaryDirectory() as directorio:
+        referencia = None
+        for numero, (nombre, (fabrica, guardar)) in enumerate(variantes.items()):
+            engine = fabrica(f"sqlite:///{os.path.join(directorio, f'carga_{numero}.db')}")
+            crear_tabla(engine)
+            _, segundos = cronometrar(guardar, engine, lotes)
+            with engine.connect() as conn:
+                guardadas = conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar()
+            engine.dispose()
+            referencia = referencia or segundos
+            print(f"{nombre:<38} {guardadas:>8} filas en {segundos:7.2f}s ({guardadas / segundos:>9,.0f} filas/s, {referencia / segundos:5.1f}x)")
+
+def medir_etapa(nombre, funcion, filas, con_memoria=True):
+    # Tiempo sin instrumentar y, aparte, memoria pico con tracemalloc (que
+    # ralentiza la ejecución), para que una medida no altere la otra
+    resultado, segundos = cronometrar(funcion)
+    medida = {"etapa": nombre, "filas": filas, "segundos": round(segundos, 4),
+              "filas_s": round(filas / segundos) if segundos else None, "memoria_mb": None}
+    if con_memoria:
+        tracemalloc.start()
+        funcion()
+        medida["memoria_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    return resultado, medida
+
+def benchmark_ingesta(n_filas, hojas=1, con_memoria=True, repeticiones=20):
+    # Calendario sintético en Excel recorrido por todas las etapas: lectura,
+    # normalización, escritura en la base y consultas
+    medidas = []
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = generar_calendario_excel(os.path.join(directorio, "calendario.xlsx"), n_filas, hojas)
+        print(f"Calendario sintético: {n_filas} defensas x {hojas} hojas, {os.path.getsize(ruta) / 1024 / 1024:.1f} MB")
+
+        crudas, medida = medir_etapa("lectura (read_excel)", lambda: pd.read_excel(ruta, header=None, sheet_name=None), n_filas * hojas, con_memoria)
+        medidas.append(medida)
+
+        def normalizar():
+            limpiar_cache()
+            return [procesar_filas(df_raw)[0] for df_raw in crudas.values()]
+        lotes, medida = medir_etapa("normalización (procesar_filas)", normalizar, n_filas * hojas, con_memoria)
+        medidas.append(medida)
+        filas = sum(len(lote) for lote in lotes)
+
+        _, medida = medir_etapa(
+            "lectura por lotes, 1.ª hoja (procesar_excel_stream)",
+            lambda: sum(len(lote) for lote in procesar_excel_stream(ruta)), len(lotes[0]), con_memoria
+        )
+        medidas.append(medida)
+
+        def escribir():
+            ruta_bd = os.path.join(directorio, f"bench_{time.perf_counter_ns()}.db")
+            engine = crear_engine(f"sqlite:///{ruta_bd}")
+            crear_tabla(engine)
+            guardar_defensas(engine, lotes)
+            return engine
+        engine, medida = medir_etapa("escritura (guardar_defensas)", escribir, filas, con_memoria)
+        medidas.append(medida)
+
+        _, medida = medir_etapa("recarga sin cambios (upsert)", lambda: guardar_defensas(engine, lotes), filas, con_memoria)
+        medidas.append(medida)
+
+        with engine.connect() as conn:
+            desde, hasta = conn.execute(text("SELECT MIN(fecha), MAX(fecha) FROM defensas_tesis")).one()
+        consultas = {
+            "rango de fechas": consulta_filtrada(fechas=(desde, desde[:8] + "28")),
+            "profesor (cualquier rol)": consulta_defensas_profesor("perez"),
+            "texto completo": consulta_busqueda_texto("Estudiante 12", limite=100),
+            "conteo por tutor": consulta_conteo_por_profesor("tutor"),
+            "página 20 de todas": paginar(*consulta_filtrada(), 50, 1000)[0],
+        }
+        with engine.connect() as conn:
+            for nombre, (consulta, params) in consultas.items():
+                def ejecutar():
+                    for _ in range(repeticiones):
+                        devueltas = len(conn.execute(text(consulta), params).fetchall())
+                    return devueltas
+                devueltas, medida = medir_etapa(f"consulta: {nombre}", ejecutar, 0, con_memoria)
+                medida.update(filas=devueltas, ms_consulta=round(medida["segundos"] / repeticiones * 1000, 3))
+                medida["filas_s"] = round(devueltas * repeticiones / medida["segundos"]) if medida["segundos"] else None
+                medidas.append(medida)
+        engine.dispose()
+
+    print(pd.DataFrame(medidas).to_string(index=False))
+    return medidas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del procesamiento de calendarios")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 50_000, 100_000, 500_000])
+    parser.add_argument("--sin-referencia", action="store_true", help="No ejecutar la versión iterrows")
+    parser.add_argument("--consultas", type=int, metavar="FILAS", help="Medir búsquedas indexadas sobre una base de FILAS defensas")
+    parser.add_argument("--carga", type=int, metavar="FILAS", help="Comparar la velocidad de escritura en la base de FILAS defensas")
+    parser.add_argument("--ingesta", type=int, metavar="FILAS", help="Medir lectura, normalización, escritura y consultas de un Excel sintético de FILAS defensas por hoja")
+    parser.add_argument("--hojas", type=int, default=1, help="Hojas del Excel sintético")
+    parser.add_argument("--sin-memoria", action="store_true", help="No medir la memoria pico (evita ejecutar cada etapa dos veces)")
+    parser.add_argument("--json", metavar="RUTA", help="Guardar las medidas de --ingesta en un JSON para comparar entre versiones")
+    parser.add_argument("--generar", metavar="RUTA", help="Solo generar un calendario Excel sintético (usa --filas y --hojas)")
+    args = parser.parse_args()
+    if args.generar:
+        generar_calendario_excel(args.generar, args.filas[0], args.hojas)
+        print(f"✅ Calendario generado: {args.generar}")
+    elif args.ingesta:
+        medidas = benchmark_ingesta(args.ingesta, args.hojas, con_memoria=not args.sin_memoria)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as archivo:
+                json.dump({"filas": args.ingesta, "hojas": args.hojas, "medidas": medidas}, archivo, ensure_ascii=False, indent=2)
+    elif args.consultas:
+        benchmark_consultas(args.consultas)
+    elif args.carga:
+        benchmark_carga(args.carga)
+    else:
+        benchmark_clasificacion(args.filas, con_referencia=not args.sin_referencia)
@@ -0,0 +1,238 @@
+# cache_excel.py
+import argparse
+import hashlib
+import os
+import time
+from contextlib import suppress
+import pandas as pd
+import excel_processor
+from excel_processor import procesar_excel_stream, procesar_libro, nombre_archivo
+import tables_design as tb
+from instrumentacion import medir
+
+try:
+    import pyarrow as pa
+except ImportError:  # Sin pyarrow la caché queda desactivada y se procesa siempre el Excel
+    pa = None
+
+# Caché en disco de los libros ya procesados. La clave es el hash del
+# contenido del archivo (y de la versión de excel_processor.py), de modo que
+# un archivo sin cambios se lee del snapshot Arrow, mapeado en memoria, sin
+# volver a abrir el Excel. Los snapshots menos usados se borran cuando la
+# caché supera el tamaño máximo.
+
+DIRECTORIO_CACHE = os.environ.get("DEFENSAS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "defensas"))
+MAX_MB_CACHE = float(os.environ.get("DEFENSAS_CACHE_MB", 512))
+EXTENSION = ".arrow"
+BLOQUE_HASH = 1 << 20
+
+def version_procesador():
+    # Cambia cuando cambia la normalización, invalidando los snapshots viejos
+    with open(excel_processor.__file__, "rb") as archivo:
+        return hashlib.sha1(archivo.read()).hexdigest()[:12]
+
+VERSION_PROCESADOR = version_procesador()
+
+if pa is not None:
+    ESQUEMA = pa.schema(
+        [("fecha", pa.date32()), ("estudiante", pa.string())]
+        + [(columna, pa.string()) for columna in ["tutores", "presidente", "miembro_1", "miembro_2", "oponente"]]
+        + [("hora", pa.time64("us")), ("lugar", pa.string()), ("archivo_origen", pa.string()), ("hoja_origen", pa.string())]
+    )
+
+def cache_activa():
+    return pa is not None and MAX_MB_CACHE > 0
+
+def hash_contenido(file_path):
+    # Acepta rutas y archivos subidos (UploadedFile, BytesIO)
+    sha = hashlib.sha256()
+    if hasattr(file_path, "read"):
+        file_path.seek(0)
+        for bloque in iter(lambda: file_path.read(BLOQUE_HASH), b""):
+            sha.update(bloque)
+        file_path.seek(0)
+    else:
+        with open(file_path, "rb") as archivo:
+            for bloque in iter(lambda: archivo.read(BLOQUE_HASH), b""):
+                sha.update(bloque)
+    return sha.hexdigest()
+
+def ruta_snapshot(file_path, modo):
+    clave = hashlib.sha256(f"{hash_contenido(file_path)}:{modo}:{VERSION_PROCESADOR}".encode()).hexdigest()[:32]
+    return os.path.join(DIRECTORIO_CACHE, clave + EXTENSION)
+
+def leer_snapshot(ruta):
+    with pa.memory_map(ruta) as fuente:
+        tabla = pa.ipc.open_file(fuente).read_all()
+    os.utime(ruta)  # Marca de último uso para el recorte
+    return tabla
+
+def a_pandas(tabla, archivo):
+    df = tabla.to_pandas(date_as_object=True)
+    # El mismo contenido puede llegar con otro nombre de archivo
+    df["archivo_origen"] = archivo
+    return df
+
+class EscritorSnapshot:
+    # Escribe los lotes según se procesan en un archivo temporal que solo se
+    # publica (os.replace) si se llegó al final del libro sin errores
+
+    def __init__(self, ruta, archivo, modo):
+        self.ruta = ruta
+        self.temporal = f"{ruta}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        esquema = ESQUEMA.with_metadata({"archivo": archivo, "modo": modo})
+        self.destino = pa.OSFile(self.temporal, "wb")
+        self.escritor = pa.ipc.new_file(self.destino, esquema)
+
+    def agregar(self, df):
+        self.escritor.write_table(pa.Table.from_pandas(df, schema=ESQUEMA, preserve_index=False))
+
+    def publicar(self):
+        # Si no se puede publicar solo se pierde el snapshot; los lotes ya se entregaron
+        try:
+            self.escritor.close()
+            self.destino.close()
+            os.replace(self.temporal, self.ruta)
+        except Exception:
+            self.descartar()
+            return
+        with suppress(OSError):
+            recortar_cache()
+
+    def descartar(self):
+        for cerrar in (self.escritor.close, self.destino.close):
+            with suppress(Exception):
+                cerrar()
+        with suppress(OSError):
+            os.remove(self.temporal)
+
+def con_cache(file_path, modo, generar_lotes, chunk_rows):
+    # Entrega los lotes del snapshot si existe; si no, los de generar_lotes(),
+    # guardándolos a la vez. Cualquier problema con la caché deja el
+    # procesamiento normal intacto.
+    if not cache_activa():
+        yield from generar_lotes()
+        return
+
+    archivo = nombre_archivo(file_path)
+    ruta = ruta_snapshot(file_path, modo)
+    if os.path.exists(ruta):
+        try:
+            with medir("leer_snapshot") as tramo:
+                tabla = leer_snapshot(ruta)
+                tramo.filas = tabla.num_rows
+        except Exception:
+            # Snapshot dañado, o borrado entre tanto por otro proceso
+            with suppress(OSError):
+                os.remove(ruta)
+        else:
+            for inicio in range(0, tabla.num_rows, chunk_rows):
+                yield a_pandas(tabla.slice(inicio, chunk_rows), archivo)
+            return
+
+    try:
+        escritor = EscritorSnapshot(ruta, archivo, modo)
+    except Exception:
+        escritor = None
+    completo = False
+    try:
+        for lote in generar_lotes():
+            if escritor is not None:
+                try:
+                    escritor.agregar(lote)
+                except Exception:
+                    # Tipos que no encajan en el esquema (ej. estudiantes numéricos)
+                    escritor.descartar()
+                    escritor = None
+            yield lote
+        completo = True
+    finally:
+        if escritor is not None:
+            if completo:
+                escritor.publicar()
+            else:
+                escritor.descartar()
+
+def procesar_excel_cacheado(file_path, chunk_rows=5000):
+    # Igual que procesar_excel_stream (primera hoja, por lotes)
+    return con_cache(file_path, "hoja", lambda: procesar_excel_stream(file_path, chunk_rows), chunk_rows)
+
+def procesar_libro_cacheado(file_path):
+    # Igual que procesar_libro (todas las hojas); pensado para procesar_lote
+    lotes = list(con_cache(file_path, "libro", lambda: iter([procesar_libro(file_path)]), 1 << 62))
+    if not lotes:
+        return pd.DataFrame(columns=ESQUEMA.names)
+    return pd.concat(lotes, ignore_index=True) if len(lotes) > 1 else lotes[0]
+
+def entradas_cache(con_detalle=True):
+    # Snapshots con su tamaño y último uso; con detalle también las filas y el
+    # archivo de origen, que obligan a abrir cada snapshot
+    if not os.path.isdir(DIRECTORIO_CACHE):
+        return []
+    entradas = []
+    for nombre in os.listdir(DIRECTORIO_CACHE):
+        if not nombre.endswith(EXTENSION):
+            continue
+        ruta = os.path.join(DIRECTORIO_CACHE, nombre)
+        try:
+            estado = os.stat(ruta)
+        except FileNotFoundError:  # Recortado por otro proceso
+            continue
+        entrada = {"clave": nombre[:-len(EXTENSION)], "bytes": estado.st_size, "ultimo_uso": estado.st_mtime,
+                   "archivo": None, "modo": None, "filas": None}
+        if con_detalle and pa is not None:
+            try:
+                with pa.memory_map(ruta) as fuente:
+                    lector = pa.ipc.open_file(fuente)
+                    metadatos = lector.schema.metadata or {}
+                    entrada["filas"] = sum(lector.get_batch(i).num_rows for i in range(lector.num_record_batches))
+                entrada["archivo"] = metadatos.get(b"archivo", b"").decode()
+                entrada["modo"] = metadatos.get(b"modo", b"").decode()
+            except Exception:
+                pass
+        entradas.append(entrada)
+    return sorted(entradas, key=lambda entrada: entrada["ultimo_uso"], reverse=True)
+
+def recortar_cache(max_mb=None):
+    # Borrar los snapshots usados hace más tiempo hasta quedar por debajo del máximo
+    limite = (MAX_MB_CACHE if max_mb is None else max_mb) * 1024 * 1024
+    entradas = entradas_cache(con_detalle=False)
+    total = sum(entrada["bytes"] for entrada in entradas)
+    borrados = 0
+    for entrada in reversed(entradas):
+        if total <= limite:
+            break
+        with suppress(FileNotFoundError):
+            os.remove(os.path.join(DIRECTORIO_CACHE, entrada["clave"] + EXTENSION))
+        total -= entrada["bytes"]
+        borrados += 1
+    return borrados
+
+def limpiar_cache():
+    return recortar_cache(0)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Caché de libros Excel procesados ({DIRECTORIO_CACHE})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("info", help="Listar los snapshots guardados")
+    subparsers.add_parser("clear", help="Borrar todos los snapshots")
+    recortar = subparsers.add_parser("prune", help="Borrar los menos usados hasta un tamaño máximo")
+    recortar.add_argument("--max-mb", type=float, default=MAX_MB_CACHE)
+    args = parser.parse_args()
+
+    if args.comando == "info":
+        if pa is None:
+            print("⚠️ pyarrow no está instalado: la caché está desactivada")
+        entradas = entradas_cache()
+        total = sum(entrada["bytes"] for entrada in entradas)
+        print(f"📂 {DIRECTORIO_CACHE}: {len(entradas)} snapshots, {total / 1024 / 1024:.1f} MB de {MAX_MB_CACHE:.0f} MB")
+        if entradas:
+            tabla = pd.DataFrame(entradas)
+            tabla["MB"] = (tabla.pop("bytes") / 1024 / 1024).round(2)
+            tabla["ultimo_uso"] = [time.strftime("%Y-%m-%d %H:%M", time.localtime(marca)) for marca in tabla["ultimo_uso"]]
+            tb.print_rich_query_results(tabla, title="Snapshots en caché")
+    elif args.comando == "clear":
+        print(f"🗑️ Snapshots borrados: {limpiar_cache()}")
+    else:
+        print(f"🗑️ Snapshots borrados: {recortar_cache(args.max_mb)}")
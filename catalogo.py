@@ -0,0 +1,367 @@
+# catalogo.py
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from urllib.request import pathname2url
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+import pandas as pd
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+from conexiones import obtener_base, existe_base, normalizar_url
+from database import esquema_pendiente, texto_completo_disponible
+from consultas import consulta_federada, calificar_tablas
+from disponibilidad import MotorDisponibilidad
+from instrumentacion import medir
+import tables_design as tb
+
+# Catálogo de las bases de defensas conocidas (una por semestre, creadas al
+# guardar desde la consola, la web o cli.py import) con su rango de fechas y
+# número de filas. Las consultas sobre varias bases adjuntan los archivos
+# (ATTACH, solo lectura) a una conexión en memoria y unen los resultados;
+# las bases cuyo rango de fechas no cruza el filtro no se llegan a abrir.
+# Solo se catalogan bases SQLite en archivo: ATTACH no existe en otros motores.
+
+# En el directorio de datos del usuario, y no en el directorio actual, para
+# que el catálogo sea el mismo se ejecute cada comando desde donde se ejecute
+RUTA_CATALOGO = os.environ.get("DEFENSAS_CATALOGO", os.path.join(
+    os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+    "defensas", "catalogo_defensas.json"
+))
+MAX_ADJUNTAS = 10  # Límite de ATTACH por conexión en SQLite (SQLITE_MAX_ATTACHED)
+
+_bloqueo = threading.Lock()
+
+@contextmanager
+def bloquear(ruta):
+    # Exclusión entre hilos y entre procesos (varios cli.py import a la vez)
+    # mientras se lee, modifica y reescribe el catálogo
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with _bloqueo, open(f"{ruta}.lock", "a+b") as archivo:
+        if os.name == "nt":
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                archivo.seek(0)
+                msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+
+def ruta_sqlite(url):
+    # Ruta absoluta del archivo de una base SQLite; None en memoria o en un servidor
+    url = make_url(normalizar_url(str(url)))
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(url.database)
+
+def modificado(ruta):
+    # Con WAL los cambios pueden estar aún en el archivo -wal
+    return max(os.path.getmtime(archivo) for archivo in (ruta, ruta + "-wal") if os.path.exists(archivo))
+
+@contextmanager
+def abrir_solo_lectura(ruta):
+    # Conexión propia en solo lectura (mode=ro): leer los metadatos no migra
+    # la base ni toca los engines que obtener_base comparte con otras sesiones
+    engine = create_engine(
+        "sqlite://", poolclass=NullPool,
+        creator=lambda: sqlite3.connect(f"file:{pathname2url(ruta)}?mode=ro", uri=True, check_same_thread=False)
+    )
+    try:
+        with engine.connect() as conn:
+            yield conn
+    finally:
+        engine.dispose()
+
+def leer_metadatos(ruta):
+    with abrir_solo_lectura(ruta) as conn:
+        pendiente = esquema_pendiente(conn)
+        if "defensas_tesis" in pendiente:
+            raise ValueError(f"No es una base de defensas: {ruta}")
+        fila = conn.execute(text(
+            "SELECT COUNT(*) AS filas, MIN(fecha) AS primera_fecha, MAX(fecha) AS ultima_fecha FROM defensas_tesis"
+        )).one()
+        texto = texto_completo_disponible(conn)
+    return {
+        "nombre": os.path.splitext(os.path.basename(ruta))[0],
+        "ruta": ruta,
+        "filas": fila.filas,
+        "primera_fecha": str(fila.primera_fecha) if fila.primera_fecha else None,
+        "ultima_fecha": str(fila.ultima_fecha) if fila.ultima_fecha else None,
+        "texto_completo": texto,
+        "modificado": modificado(ruta),
+        "pendiente": pendiente,  # Tablas o columnas que faltan: la base se migra con migrate
+    }
+
+def cruza_fechas(entrada, desde=None, hasta=None):
+    # Sin filtro de fechas basta con que la base tenga defensas; con filtro,
+    # su rango [primera_fecha, ultima_fecha] tiene que tocar el pedido
+    if not entrada["filas"]:
+        return False
+    if not desde and not hasta:
+        return True
+    if not entrada["primera_fecha"]:
+        return False
+    return (not desde or entrada["ultima_fecha"] >= str(desde)) and (not hasta or entrada["primera_fecha"] <= str(hasta))
+
+class Catalogo:
+    def __init__(self, ruta=RUTA_CATALOGO):
+        self.ruta = ruta
+
+    def leer(self):
+        # {ruta de la base: metadatos}
+        if not os.path.exists(self.ruta):
+            return {}
+        with open(self.ruta, encoding="utf-8") as archivo:
+            return json.load(archivo)["bases"]
+
+    def escribir(self, bases):
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump({"bases": bases}, archivo, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta)
+
+    def registrar(self, url):
+        # Añade o actualiza una base; devuelve sus metadatos
+        ruta = ruta_sqlite(url)
+        if ruta is None:
+            raise ValueError(f"Solo se catalogan bases SQLite en archivo: {url}")
+        if not existe_base(ruta):
+            raise ValueError(f"No existe la base de datos: {ruta}")
+        entrada = leer_metadatos(ruta)
+        with bloquear(self.ruta):
+            bases = self.leer()
+            entrada["registrada"] = bases.get(ruta, {}).get("registrada", time.time())
+            bases[ruta] = entrada
+            self.escribir(bases)
+        return entrada
+
+    def registrar_carga(self, url):
+        # Tras guardar defensas: un fallo del catálogo no debe deshacer la
+        # carga, pero se avisa para que no pase desapercibido
+        try:
+            if ruta_sqlite(url):
+                self.registrar(url)
+        except Exception as e:
+            print(f"⚠️ La base no se pudo registrar en el catálogo {self.ruta}: {e}", file=sys.stderr)
+
+    def quitar(self, url):
+        ruta = ruta_sqlite(url) or url
+        with bloquear(self.ruta):
+            bases = self.leer()
+            quitada = bases.pop(ruta, None) is not None
+            self.escribir(bases)
+        return quitada
+
+    def buscar(self, directorio):
+        # Registra los archivos .db del directorio (y subdirectorios) que
+        # contienen defensas; devuelve los registrados
+        registradas = []
+        for ruta in sorted(glob.glob(os.path.join(directorio, "**", "*.db"), recursive=True)):
+            try:
+                with sqlite3.connect(f"file:{pathname2url(os.path.abspath(ruta))}?mode=ro", uri=True) as conn:
+                    es_base = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'defensas_tesis'"
+                    ).fetchone()
+            except sqlite3.Error:
+                continue
+            if es_base:
+                registradas.append(self.registrar(ruta))
+        return registradas
+
+    def entradas(self):
+        # Metadatos de todas las bases, releyendo solo las que cambiaron desde
+        # el registro (o se registraron sin "pendiente"); las que ya no
+        # existen se marcan con falta
+        bases = self.leer()
+        releidas = {}
+        for ruta, entrada in bases.items():
+            entrada["falta"] = not os.path.exists(ruta)
+            if not entrada["falta"] and (modificado(ruta) != entrada["modificado"] or "pendiente" not in entrada):
+                releidas[ruta] = {**leer_metadatos(ruta), "registrada": entrada.get("registrada")}
+                bases[ruta] = {**releidas[ruta], "falta": False}
+        if releidas:
+            # Otro proceso pudo cambiar el catálogo mientras tanto: se vuelve
+            # a leer y solo se actualizan las releídas que sigan en él
+            with bloquear(self.ruta):
+                actuales = self.leer()
+                actuales.update({ruta: entrada for ruta, entrada in releidas.items() if ruta in actuales})
+                self.escribir(actuales)
+        return sorted(bases.values(), key=lambda entrada: (entrada["primera_fecha"] or "", entrada["nombre"]))
+
+    def en_rango(self, desde=None, hasta=None):
+        return [
+            entrada for entrada in self.entradas()
+            if not entrada["falta"] and cruza_fechas(entrada, desde, hasta)
+        ]
+
+    def seleccionar(self, desde=None, hasta=None):
+        # Bases que pueden tener defensas en el rango; el resto ni se abre.
+        # Las de un esquema anterior se dejan fuera (ver desactualizadas)
+        return [entrada for entrada in self.en_rango(desde, hasta) if not entrada["pendiente"]]
+
+    def desactualizadas(self, desde=None, hasta=None):
+        # Bases del rango que seleccionar deja fuera hasta migrarlas
+        return [entrada for entrada in self.en_rango(desde, hasta) if entrada["pendiente"]]
+
+    def migrar(self, url):
+        # Completa el esquema de la base (solo a pedido) y la vuelve a registrar
+        ruta = ruta_sqlite(url)
+        if ruta is None or not existe_base(ruta):
+            raise ValueError(f"No existe la base de datos: {url}")
+        obtener_base(ruta, aplicar=True)
+        return self.registrar(ruta)
+
+@contextmanager
+def adjuntar(entradas, primero=0):
+    # Conexión en memoria con las bases adjuntas en solo lectura como b<n>,
+    # numeradas desde primero para que los esquemas no se repitan entre grupos
+    engine = create_engine(
+        "sqlite://", poolclass=NullPool,
+        creator=lambda: sqlite3.connect(":memory:", uri=True, check_same_thread=False)
+    )
+    try:
+        with engine.connect() as conn:
+            esquemas = []
+            for numero, entrada in enumerate(entradas, start=primero):
+                esquema = f"b{numero}"
+                conn.exec_driver_sql(f"ATTACH DATABASE ? AS {esquema}", (f"file:{pathname2url(entrada['ruta'])}?mode=ro",))
+                esquemas.append(esquema)
+            yield conn, esquemas
+    finally:
+        engine.dispose()
+
+def grupos(entradas):
+    for inicio in range(0, len(entradas), MAX_ADJUNTAS):
+        yield inicio, entradas[inicio:inicio + MAX_ADJUNTAS]
+
+def tablas_ajenas(conn, consulta, esquema, params=None):
+    # Tablas que la consulta ya calificada lee de una base distinta de
+    # esquema, vistas por SQLite al prepararla (EXPLAIN, sin ejecutarla): la
+    # base de cada tabla que abre el programa (OpenRead) y, para las tablas
+    # virtuales como defensas_fts, la de cada columna que lee (autorizador).
+    # Así una tabla sin calificar que SQLite resuelve en otra base adjunta no
+    # pasa desapercibida. Solo se admite el esquema interno de la base en
+    # memoria (main.sqlite_master, que FTS5 lee al abrir su tabla).
+    ajenas = set()
+    def interna(base, tabla):
+        return base in ("main", "temp") and tabla.startswith("sqlite_")
+    def autorizar(accion, tabla, columna, base, origen):
+        if accion == sqlite3.SQLITE_READ and base not in (None, esquema) and not interna(base, tabla):
+            ajenas.add(f"{base}.{tabla}")
+        return sqlite3.SQLITE_OK
+    conexion = conn.connection.driver_connection
+    bases = {numero: nombre for numero, nombre, _ in conexion.execute("PRAGMA database_list")}
+    conexion.set_authorizer(autorizar)
+    try:
+        programa = conexion.execute(f"EXPLAIN {consulta}", params or {}).fetchall()
+    finally:
+        conexion.set_authorizer(None)
+    for _, operacion, _, pagina, numero, *_ in programa:
+        if operacion == "OpenRead" and bases.get(numero) != esquema:
+            fila = conexion.execute(
+                f"SELECT tbl_name FROM {bases[numero]}.sqlite_master WHERE rootpage = ?", (pagina,)
+            ).fetchone()
+            # La página 1 es la del propio sqlite_master
+            tabla = fila[0] if fila else "sqlite_master" if pagina == 1 else str(pagina)
+            if not interna(bases[numero], tabla):
+                ajenas.add(f"{bases[numero]}.{tabla}")
+    return sorted(ajenas)
+
+def consultar_bases(entradas, consulta, params=None, orden=None):
+    # Resultado de la consulta en todas las bases, con la columna base (nombre
+    # de la base) delante. Se adjuntan hasta MAX_ADJUNTAS bases por conexión.
+    # ValueError si alguna parte leería tablas de otra base (ver calificar_tablas).
+    resultados = []
+    with medir("consulta_federada") as tramo:
+        for inicio, grupo in grupos(entradas):
+            with adjuntar(grupo, inicio) as (conn, esquemas):
+                for esquema in esquemas:
+                    ajenas = tablas_ajenas(conn, calificar_tablas(consulta, esquema), esquema, params)
+                    if ajenas:
+                        raise ValueError(
+                            f"La consulta lee tablas de otra base ({', '.join(ajenas)}): "
+                            "escriba cada tabla tras FROM, JOIN o una coma de la lista de tablas"
+                        )
+                df = pd.read_sql(text(consulta_federada(consulta, esquemas, orden)), conn, params=params or {})
+            df["base"] = df["base"].map({esquema: entrada["nombre"] for esquema, entrada in zip(esquemas, grupo)})
+            resultados.append(df)
+        if not resultados:
+            return pd.DataFrame(columns=["base"])
+        df = pd.concat(resultados, ignore_index=True) if len(resultados) > 1 else resultados[0]
+        if orden and len(resultados) > 1:
+            df = df.sort_values([columna.strip() for columna in orden.split(",")], kind="stable", ignore_index=True)
+        tramo.filas = len(df)
+    return df
+
+def disponibilidad_bases(entradas, franjas=None):
+    # Motor de disponibilidad con la ocupación de todas las bases; los ids son
+    # el nombre_clave canónico, así un profesor que aparece en varias bases es
+    # uno solo y sus defensas de todas ellas ocupan sus franjas
+    with ExitStack() as pila, medir("disponibilidad_federada") as tramo:
+        fuentes = []
+        for inicio, grupo in grupos(entradas):
+            conn, esquemas = pila.enter_context(adjuntar(grupo, inicio))
+            fuentes.extend((conn, esquema) for esquema in esquemas)
+        motor = MotorDisponibilidad.desde_fuentes(fuentes, franjas)
+        tramo.filas = len(motor.profesores)
+    return motor
+
+def estado_entrada(entrada):
+    if entrada["falta"]:
+        return "⚠️ no existe"
+    if entrada["pendiente"]:
+        return "🛠️ esquema anterior (migrate)"
+    return ""
+
+def tabla_entradas(entradas):
+    tabla = pd.DataFrame(entradas, columns=["nombre", "filas", "primera_fecha", "ultima_fecha", "ruta"])
+    tabla["estado"] = [estado_entrada(entrada) for entrada in entradas]
+    return tabla
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Catálogo de bases de defensas ({RUTA_CATALOGO})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+    subparsers.add_parser("info", help="Listar las bases registradas")
+    agregar = subparsers.add_parser("add", help="Registrar bases .db")
+    agregar.add_argument("bases", nargs="+")
+    buscar = subparsers.add_parser("scan", help="Registrar las bases .db de un directorio")
+    buscar.add_argument("directorio")
+    quitar = subparsers.add_parser("remove", help="Quitar bases del catálogo (no borra los archivos)")
+    quitar.add_argument("bases", nargs="+")
+    migrar = subparsers.add_parser("migrate", help="Completar el esquema de bases registradas con uno anterior")
+    migrar.add_argument("bases", nargs="*", help="Bases a migrar (por defecto, todas las desactualizadas)")
+    args = parser.parse_args()
+
+    catalogo = Catalogo()
+    if args.comando == "add":
+        for base in args.bases:
+            entrada = catalogo.registrar(base)
+            print(f"✅ {entrada['nombre']}: {entrada['filas']} defensas ({entrada['primera_fecha']} a {entrada['ultima_fecha']})")
+    elif args.comando == "scan":
+        print(f"📂 Bases registradas: {len(catalogo.buscar(args.directorio))}")
+    elif args.comando == "migrate":
+        for base in args.bases or [entrada["ruta"] for entrada in catalogo.desactualizadas()]:
+            entrada = catalogo.migrar(base)
+            print(f"🛠️ {entrada['nombre']}: esquema actualizado")
+    elif args.comando == "remove":
+        for base in args.bases:
+            print(f"🗑️ {base}" if catalogo.quitar(base) else f"⚠️ No estaba en el catálogo: {base}")
+    entradas = catalogo.entradas()
+    if entradas:
+        tb.print_rich_query_results(tabla_entradas(entradas), title="Bases en el catálogo")
+    else:
+        print("ℹ️ El catálogo está vacío")
@@ -0,0 +1,443 @@
+# cli.py
+import argparse
+import os
+import sys
+import pandas as pd
+from sqlalchemy import text
+from database import (
+    guardar_defensas, leer_por_lotes, verificar_resumenes, agrupar_profesores, unir_profesores,
+    reconstruir_resumenes, incrementar_version, candidatos_agrupar, separar_variante, seleccionar_en
+)
+from conexiones import obtener_base, existe_base, normalizar_url
+from excel_processor import listar_archivos_excel, procesar_lote
+from consultas import (
+    consulta_filtrada, consulta_conteo_por_profesor, consulta_conteo_por, consulta_resumen_general,
+    consulta_variantes, error_consulta_select
+)
+from excel_processor import clave_nombre
+from conflictos import detectar_conflictos
+from cache_excel import procesar_libro_cacheado
+from disponibilidad import MotorDisponibilidad
+from planificador import exportar_excel
+from catalogo import Catalogo, consultar_bases, disponibilidad_bases
+from instrumentacion import activar, RUTA_PREDETERMINADA
+
+# Versión sin interacción de la aplicación de consola, pensada para cron y
+# scripts: todo se indica con opciones, los resultados salen por stdout (o
+# --salida) por bloques y los mensajes van a stderr.
+#
+#   python cli.py import calendarios/*.xlsx --db defensas.db
+#   python cli.py query --db defensas.db --profesor perez --formato jsonl
+#   python cli.py free-slots --db defensas.db --profesor "Ana Gómez" --profesor "Luis Díaz"
+#   python cli.py export --db defensas.db --formato parquet --salida defensas.parquet
+#   python cli.py stats --db defensas.db --por lugar
+#   python cli.py query --catalogo --profesor perez --desde 2024-01-01
+#   python cli.py names --db defensas.db --profesor perez
+
+SALIDA_OK = 0
+SALIDA_ERROR = 1  # Error al procesar, consulta inválida, base inexistente...
+SALIDA_USO = 2  # Opciones incorrectas (argparse)
+SALIDA_CONFLICTOS = 3  # import --rechazar-conflictos encontró conflictos
+SALIDA_ARCHIVOS_CON_ERROR = 4  # import guardó los archivos válidos pero alguno falló
+
+FORMATOS = ["csv", "jsonl", "parquet"]
+TABLAS = ["defensas_tesis", "profesores", "alias_profesores", "participaciones"]
+ROLES = ["tutor", "presidente", "miembro", "oponente"]
+TAMANO_LOTE = 5000
+
+class ErrorCLI(Exception):
+    pass
+
+def avisar(mensaje):
+    print(mensaje, file=sys.stderr)
+
+def abrir_bd(ruta, crear=False):
+    # Los comandos de lectura no crean bases vacías por un error de ruta ni
+    # modifican la base: varias lecturas pueden correr a la vez sobre muchas
+    # bases. Los que escriben llaman a preparar() para completar el esquema.
+    # Devuelve la BaseDatos de conexiones.py: .lectura para consultar y
+    # .escritura para cargar.
+    if not crear and not existe_base(ruta):
+        raise ErrorCLI(f"No existe la base de datos: {normalizar_url(ruta)}")
+    base = obtener_base(ruta)
+    if base.pendiente and not crear:
+        avisar(f"⚠️ Esquema anterior (faltan: {', '.join(base.pendiente)}); "
+               "se actualiza con import o stats --verificar")
+    return base
+
+def escribir(lotes, formato, salida=None):
+    # Escribe cada bloque según llega, sin reunir el resultado completo en memoria
+    destino = open(salida, "wb") if salida else sys.stdout.buffer
+    try:
+        if formato == "parquet":
+            return escribir_parquet(lotes, destino)
+        filas = 0
+        for numero, lote in enumerate(lotes):
+            if formato == "csv":
+                contenido = lote.to_csv(index=False, header=numero == 0)
+            else:
+                contenido = lote.to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+                if contenido and not contenido.endswith("\n"):
+                    contenido += "\n"
+            destino.write(contenido.encode("utf-8"))
+            filas += len(lote)
+        return filas
+    finally:
+        destino.flush()
+        if salida:
+            destino.close()
+
+def escribir_parquet(lotes, destino):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ErrorCLI("El formato parquet necesita pyarrow (pip install pyarrow)")
+
+    escritor = None
+    esquema = None
+    filas = 0
+    try:
+        for lote in lotes:
+            if escritor is None:
+                # Las columnas vacías en el primer bloque se guardan como texto
+                esquema = pa.Schema.from_pandas(lote, preserve_index=False)
+                esquema = pa.schema([
+                    campo.with_type(pa.string()) if pa.types.is_null(campo.type) else campo
+                    for campo in esquema
+                ])
+                escritor = pq.ParquetWriter(destino, esquema)
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+            filas += len(lote)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+def comando_import(args):
+    rutas = []
+    for ruta in args.archivos:
+        encontrados = listar_archivos_excel(ruta)
+        if not encontrados:
+            avisar(f"⚠️ Sin archivos Excel en: {ruta}")
+        rutas.extend(encontrados)
+    if not rutas:
+        raise ErrorCLI("No se encontraron archivos Excel")
+
+    errores = 0
+    def resultados_validos():
+        nonlocal errores
+        for ruta, df, error in procesar_lote(sorted(set(rutas)), max_workers=args.workers, procesar=procesar_libro_cacheado):
+            if error:
+                errores += 1
+                avisar(f"❌ {ruta}: {error}")
+            else:
+                avisar(f"✅ {ruta}: {len(df)} defensas")
+                yield df
+
+    lotes = resultados_validos()
+    base = abrir_bd(args.db, crear=True).preparar()
+    if args.rechazar_conflictos:
+        # Hay que ver todo el lote antes de decidir si se guarda; los
+        # profesores se reconocen por las variantes ya agrupadas en la base
+        lotes = list(lotes)
+        conflictos = detectar_conflictos(lotes, base.lectura)
+        if not conflictos.empty:
+            escribir([conflictos], args.formato, args.salida)
+            avisar(f"❌ {len(conflictos)} conflictos; no se guardó nada")
+            return SALIDA_CONFLICTOS
+
+    # Con el lote completo en memoria se sabe cuántas filas llegan (ver guardar_defensas)
+    filas_esperadas = sum(len(df) for df in lotes) if isinstance(lotes, list) else None
+    resumen = guardar_defensas(base.escritura, lotes, reemplazar=args.reemplazar, filas_esperadas=filas_esperadas)
+    Catalogo().registrar_carga(normalizar_url(args.db))
+    escribir([pd.DataFrame([resumen])], args.formato, args.salida)
+    return SALIDA_ARCHIVOS_CON_ERROR if errores else SALIDA_OK
+
+def bases_catalogo(args):
+    # Bases del catálogo cuyo rango de fechas cruza --desde/--hasta
+    catalogo = Catalogo()
+    desactualizadas = catalogo.desactualizadas(args.desde, args.hasta)
+    if desactualizadas:
+        avisar(f"⚠️ Bases omitidas por tener un esquema anterior: {', '.join(entrada['nombre'] for entrada in desactualizadas)} "
+               "(python catalogo.py migrate)")
+    entradas = catalogo.seleccionar(args.desde, args.hasta)
+    if not entradas:
+        raise ErrorCLI("Ninguna base del catálogo tiene defensas en ese rango")
+    avisar(f"Bases consultadas: {', '.join(entrada['nombre'] for entrada in entradas)}")
+    return entradas
+
+def comando_query(args):
+    if args.catalogo:
+        return consulta_catalogo(args)
+    base = abrir_bd(args.db)
+    if args.sql:
+        error = error_consulta_select(args.sql)
+        if error:
+            raise ErrorCLI(error)
+        consulta, params = args.sql, {}
+    else:
+        fechas = (args.desde or "0000-00-00", args.hasta or "9999-99-99") if args.desde or args.hasta else None
+        consulta, params = consulta_filtrada(
+            tutor=args.tutor, oponente=args.oponente, fechas=fechas,
+            lugar=args.lugar, texto=args.texto, profesor=args.profesor, fts=base.texto_completo
+        )
+    if args.limite:
+        consulta = f"SELECT * FROM ({consulta}) AS q LIMIT :limite_cli"
+        params = {**params, 'limite_cli': args.limite}
+    filas = escribir(leer_por_lotes(base.lectura, consulta, params, TAMANO_LOTE), args.formato, args.salida)
+    avisar(f"{filas} filas")
+    return SALIDA_OK
+
+def consulta_catalogo(args):
+    # La misma consulta unida sobre todas las bases, con la columna base delante
+    entradas = bases_catalogo(args)
+    if args.sql:
+        error = error_consulta_select(args.sql)
+        if error:
+            raise ErrorCLI(error)
+        consulta, params, orden = args.sql, {}, None
+    else:
+        fechas = (args.desde or "0000-00-00", args.hasta or "9999-99-99") if args.desde or args.hasta else None
+        consulta, params = consulta_filtrada(
+            tutor=args.tutor, oponente=args.oponente, fechas=fechas, lugar=args.lugar, texto=args.texto,
+            profesor=args.profesor, fts=all(entrada["texto_completo"] for entrada in entradas)
+        )
+        orden = "fecha, hora"
+    if args.limite:
+        # Cada base devuelve a lo sumo --limite filas (las primeras según
+        # orden); el recorte final deja las primeras del conjunto
+        consulta = f"SELECT * FROM ({consulta}) AS q{f' ORDER BY {orden}' if orden else ''} LIMIT :limite_cli"
+        params = {**params, 'limite_cli': args.limite}
+    try:
+        df = consultar_bases(entradas, consulta, params, orden)
+    except ValueError as e:
+        raise ErrorCLI(str(e))
+    if args.limite:
+        df = df.head(args.limite)
+    escribir([df], args.formato, args.salida)
+    avisar(f"{len(df)} filas")
+    return SALIDA_OK
+
+def comando_free_slots(args):
+    if args.catalogo:
+        motor = disponibilidad_bases(bases_catalogo(args))
+    else:
+        with abrir_bd(args.db).lectura.connect() as conn:
+            motor = MotorDisponibilidad.desde_bd(conn)
+
+    ids = []
+    for nombre in args.profesor:
+        encontrados = motor.buscar_profesores(nombre)
+        if not encontrados:
+            raise ErrorCLI(f"No se encontró el profesor: {nombre}")
+        ids.extend(encontrados)
+
+    # Por defecto los días en que participa alguno de ellos, como en la consola
+    dias = motor.dias if args.todo_el_calendario else motor.dias_de(ids)
+    dias = [fecha for fecha in dias if fecha >= (args.desde or "") and fecha <= (args.hasta or "~")]
+    filas = [
+        (fecha, hora)
+        for fecha, mascara in motor.libres(ids, dias).items()
+        for hora in motor.horas(mascara)
+    ]
+    escribir([pd.DataFrame(filas, columns=["fecha", "hora"])], args.formato, args.salida)
+    return SALIDA_OK
+
+def comando_export(args):
+    engine = abrir_bd(args.db).lectura
+    if args.formato == "xlsx":
+        # Calendario con el mismo formato que lee procesar_excel
+        if args.tabla != "defensas_tesis" or not args.salida:
+            raise ErrorCLI("El formato xlsx solo exporta defensas_tesis y necesita --salida")
+        with engine.connect() as conn:
+            df = pd.read_sql(text(
+                "SELECT fecha, estudiante, tutores, presidente, miembro_1, miembro_2, oponente, hora, lugar "
+                "FROM defensas_tesis WHERE fecha IS NOT NULL AND hora IS NOT NULL ORDER BY fecha, hora"
+            ), conn)
+        df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+        df['hora'] = pd.to_datetime(df['hora'], format="%H:%M").dt.time
+        exportar_excel(df, args.salida)
+        avisar(f"{len(df)} filas")
+        return SALIDA_OK
+
+    filas = escribir(leer_por_lotes(engine, f"SELECT * FROM {args.tabla} ORDER BY id", tamano_lote=TAMANO_LOTE), args.formato, args.salida)
+    avisar(f"{filas} filas")
+    return SALIDA_OK
+
+def comando_stats(args):
+    # Se leen las tablas de resumen que mantiene cada carga
+    base = abrir_bd(args.db)
+    engine = base.lectura
+    if not args.verificar and any(tabla in base.pendiente for tabla in ("resumen_defensas", "resumen_profesores")):
+        raise ErrorCLI("La base no tiene las tablas de resumen: ejecute stats --verificar para crearlas")
+    if args.verificar:
+        # Reparar escribe: completa antes el esquema (crea las tablas de resumen que falten)
+        diferencias = verificar_resumenes(base.preparar().escritura, reparar=True)
+        if any(diferencias.values()):
+            avisar(f"⚠️ Resúmenes reconstruidos ({', '.join(f'{tabla}: {total} filas distintas' for tabla, total in diferencias.items())})")
+        else:
+            avisar("✅ Resúmenes consistentes")
+    if args.por == "resumen":
+        consultas = [consulta_resumen_general()]
+    elif args.por == "profesor":
+        consultas = [consulta_conteo_por_profesor(rol) for rol in ([args.rol] if args.rol else ROLES)]
+    else:
+        consultas = [consulta_conteo_por(args.por)]
+
+    def lotes():
+        with engine.connect() as conn:
+            for consulta, params in consultas:
+                df = pd.read_sql(text(consulta), conn, params=params)
+                if args.por == "profesor":
+                    df.insert(0, "rol", params['rol'])
+                yield df
+    escribir(lotes(), args.formato, args.salida)
+    return SALIDA_OK
+
+def comando_names(args):
+    # Variantes de nombre de cada profesor (alias_profesores). --agrupar
+    # muestra los profesores que parecen la misma persona y, con --confirmar,
+    # los une; --unir junta a mano dos profesores que no se agruparon y
+    # --separar deshace una unión equivocada.
+    base = abrir_bd(args.db)
+    if args.agrupar and not args.confirmar:
+        with base.lectura.connect() as conn:
+            uniones = candidatos_agrupar(conn)
+            nombres = dict(seleccionar_en(conn, "SELECT id, nombre FROM profesores WHERE id IN :valores",
+                                          list(uniones) + list(uniones.values())))
+        candidatos = pd.DataFrame(
+            [(nombres[origen], nombres[destino]) for origen, destino in uniones.items()],
+            columns=["profesor", "se_uniria_a"]
+        ).sort_values(["se_uniria_a", "profesor"], ignore_index=True)
+        escribir([candidatos], args.formato, args.salida)
+        avisar(f"Candidatos a unir: {len(candidatos)} (repita con --confirmar para unirlos)")
+        return SALIDA_OK
+    if args.agrupar or args.unir or args.separar:
+        with base.preparar().escritura.begin() as conn:
+            if args.unir:
+                ids = []
+                for nombre in args.unir:
+                    profesor_id = conn.execute(text(
+                        "SELECT profesor_id FROM alias_profesores WHERE nombre_clave = :clave"
+                    ), {'clave': clave_nombre(nombre)}).scalar()
+                    if profesor_id is None:
+                        raise ErrorCLI(f"No se encontró la variante: {nombre}")
+                    ids.append(profesor_id)
+                if ids[0] != ids[1]:
+                    unir_profesores(conn, {ids[1]: ids[0]}, canonicos=False)
+                cambios = int(ids[0] != ids[1])
+            elif args.separar:
+                clave = clave_nombre(args.separar)
+                otras = conn.execute(text(
+                    "SELECT COUNT(*) FROM alias_profesores WHERE profesor_id = "
+                    "(SELECT profesor_id FROM alias_profesores WHERE nombre_clave = :clave)"
+                ), {'clave': clave}).scalar()
+                if not otras:
+                    raise ErrorCLI(f"No se encontró la variante: {args.separar}")
+                if otras == 1:
+                    raise ErrorCLI(f"La variante ya es el único nombre de su profesor: {args.separar}")
+                separar_variante(conn, clave)
+                cambios = 1
+            else:
+                cambios = agrupar_profesores(conn)
+            if cambios:
+                reconstruir_resumenes(conn)
+                incrementar_version(conn)
+        avisar(f"Profesores separados: {cambios}" if args.separar else f"Profesores unidos: {cambios}")
+
+    with base.lectura.connect() as conn:
+        consulta, params = consulta_variantes(args.profesor)
+        variantes = pd.read_sql(text(consulta), conn, params=params)
+    tabla = variantes.groupby("profesor", sort=True)["variante"].agg(
+        variantes=lambda nombres: " | ".join(nombres), total="count"
+    ).reset_index()
+    escribir([tabla], args.formato, args.salida)
+    return SALIDA_OK
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Gestión de defensas sin interacción (import, query, free-slots, export, stats, names)")
+    parser.add_argument("--perfil", nargs="?", const=RUTA_PREDETERMINADA, metavar="RUTA",
+                        help=f"Registrar tiempos de cada etapa en un JSON Lines (por defecto {RUTA_PREDETERMINADA})")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    def agregar_comunes(sub, formatos=FORMATOS):
+        sub.add_argument("--db", help="Archivo .db, :memory: o URL de la base (por defecto DEFENSAS_BD o defensas.db)")
+        sub.add_argument("--formato", choices=formatos, default="csv")
+        sub.add_argument("--salida", help="Archivo de salida (por defecto stdout)")
+
+    sub = subparsers.add_parser("import", help="Procesar archivos Excel y guardarlos en la base")
+    sub.add_argument("archivos", nargs="+", help="Archivos, directorios o patrones (ej: 'calendarios/*.xlsx')")
+    sub.add_argument("--reemplazar", action="store_true", help="Vaciar la tabla antes de cargar")
+    sub.add_argument("--rechazar-conflictos", action="store_true", help="No guardar si hay profesores o locales con dos defensas a la vez")
+    sub.add_argument("--workers", type=int, help="Procesos en paralelo")
+    agregar_comunes(sub)
+    sub.set_defaults(funcion=comando_import)
+
+    sub = subparsers.add_parser("query", help="Consultar defensas con filtros o SQL")
+    sub.add_argument("--profesor", help="Nombre parcial, cualquier rol")
+    sub.add_argument("--tutor", help="Nombre completo del tutor")
+    sub.add_argument("--oponente", help="Nombre completo del oponente")
+    sub.add_argument("--lugar")
+    sub.add_argument("--desde", help="Fecha inicial YYYY-MM-DD")
+    sub.add_argument("--hasta", help="Fecha final YYYY-MM-DD")
+    sub.add_argument("--texto", help="Búsqueda de texto completo")
+    sub.add_argument("--sql", help="Consulta SELECT propia (ignora los filtros)")
+    sub.add_argument("--limite", type=int)
+    sub.add_argument("--catalogo", action="store_true", help="Consultar todas las bases del catálogo (ignora --db)")
+    agregar_comunes(sub)
+    sub.set_defaults(funcion=comando_query)
+
+    sub = subparsers.add_parser("free-slots", help="Franjas libres comunes de uno o varios profesores")
+    sub.add_argument("--profesor", action="append", required=True, help="Se puede repetir")
+    sub.add_argument("--desde")
+    sub.add_argument("--hasta")
+    sub.add_argument("--todo-el-calendario", action="store_true", help="Todos los días con defensas, no solo los de los profesores")
+    sub.add_argument("--catalogo", action="store_true", help="Ocupación reunida de todas las bases del catálogo (ignora --db)")
+    agregar_comunes(sub)
+    sub.set_defaults(funcion=comando_free_slots)
+
+    sub = subparsers.add_parser("export", help="Volcar una tabla completa")
+    sub.add_argument("--tabla", choices=TABLAS, default="defensas_tesis")
+    agregar_comunes(sub, FORMATOS + ["xlsx"])
+    sub.set_defaults(funcion=comando_export)
+
+    sub = subparsers.add_parser("stats", help="Estadísticas agregadas")
+    sub.add_argument("--por", choices=["resumen", "profesor", "lugar", "fecha", "hora"], default="resumen")
+    sub.add_argument("--rol", choices=ROLES, help="Con --por profesor, limitar a un rol")
+    sub.add_argument("--verificar", action="store_true", help="Comparar los resúmenes con la tabla y reconstruirlos si no coinciden")
+    agregar_comunes(sub)
+    sub.set_defaults(funcion=comando_stats)
+
+    sub = subparsers.add_parser("names", help="Variantes de nombre de cada profesor")
+    sub.add_argument("--profesor", help="Solo los profesores con alguna variante que contenga este nombre")
+    sub.add_argument("--agrupar", action="store_true", help="Listar los profesores que parecen la misma persona")
+    sub.add_argument("--confirmar", action="store_true", help="Con --agrupar, unir los profesores listados")
+    sub.add_argument("--unir", nargs=2, metavar=("NOMBRE", "VARIANTE"), help="Asignar el profesor de VARIANTE al de NOMBRE")
+    sub.add_argument("--separar", metavar="VARIANTE", help="Pasar VARIANTE a un profesor propio (deshace una unión)")
+    agregar_comunes(sub)
+    sub.set_defaults(funcion=comando_names)
+    return parser
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    if args.comando == "names" and args.confirmar and not args.agrupar:
+        parser.error("names: --confirmar solo se usa junto con --agrupar")
+    if args.perfil:
+        activar(args.perfil)
+    try:
+        return args.funcion(args)
+    except ErrorCLI as e:
+        avisar(f"❌ {e}")
+    except BrokenPipeError:
+        # La salida se cortó (ej: | head); no es un error del comando.
+        # stdout se redirige a /dev/null para que el cierre no vuelva a fallar.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return SALIDA_OK
+    except Exception as e:
+        avisar(f"❌ Error: {e}")
+    return SALIDA_ERROR
+
+if __name__ == "__main__":
+    sys.exit(main())
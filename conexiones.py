@@ -0,0 +1,124 @@
+# conexiones.py
+import os
+import threading
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+from database import crear_engine, crear_tabla, texto_completo_disponible, esquema_pendiente
+
+# Configuración única de la base de datos para la consola, la interfaz web y
+# la CLI. DEFENSAS_BD acepta una ruta .db, ":memory:" (pruebas) o una URL de
+# SQLAlchemy, p. ej. postgresql+psycopg2://usuario@localhost/defensas.
+#
+# Cada base tiene dos engines: uno de escritura para las cargas y otro de
+# lectura, con su propio pool, para las consultas. En SQLite con WAL los
+# lectores no esperan al escritor, y las cargas de un mismo proceso se ponen
+# en cola en el pool de escritura (una conexión) en lugar de chocar con
+# "database is locked". DEFENSAS_BD_LECTURA permite leer de una réplica.
+
+URL_PREDETERMINADA = "sqlite:///defensas.db"
+POOL_LECTURA = int(os.environ.get("DEFENSAS_POOL", 10))  # Conexiones de lectura que se mantienen abiertas
+POOL_EXTRA = int(os.environ.get("DEFENSAS_POOL_EXTRA", 10))  # Conexiones adicionales en picos de uso
+ESPERA_POOL = float(os.environ.get("DEFENSAS_POOL_ESPERA", 300))  # Segundos esperando una conexión libre
+
+_bases = {}
+_bloqueo = threading.Lock()
+
+def normalizar_url(valor=None):
+    # Ruta de archivo, ":memory:" o URL; sin valor, DEFENSAS_BD o defensas.db
+    valor = valor or os.environ.get("DEFENSAS_BD") or URL_PREDETERMINADA
+    if valor == ":memory:":
+        return "sqlite://"
+    if "://" not in valor:
+        return f"sqlite:///{valor}"
+    return valor
+
+def es_sqlite_en_memoria(url):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def opciones_pool(url, escritura):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        if es_sqlite_en_memoria(url):
+            # Una sola conexión compartida: cada conexión nueva sería otra base vacía
+            return {"poolclass": StaticPool, "connect_args": {"check_same_thread": False}}
+        if escritura:
+            # SQLite admite un escritor a la vez
+            return {"pool_size": 1, "max_overflow": 0, "pool_timeout": ESPERA_POOL}
+        return {"pool_size": POOL_LECTURA, "max_overflow": POOL_EXTRA, "pool_timeout": ESPERA_POOL}
+    opciones = {"pool_pre_ping": True, "pool_recycle": 1800, "pool_timeout": ESPERA_POOL}
+    if escritura:
+        return {**opciones, "pool_size": 2, "max_overflow": 3}
+    return {**opciones, "pool_size": POOL_LECTURA, "max_overflow": POOL_EXTRA}
+
+class BaseDatos:
+    # Engines de escritura y de lectura de una base. El esquema (tablas,
+    # migraciones, índices) solo se completa con preparar(), que llaman los
+    # puntos que escriben (importar, guardar); abrir una base para leerla no
+    # la modifica.
+
+    def __init__(self, url, url_lectura=None, aplicar=False):
+        self.url = url
+        self.escritura = crear_engine(url, **opciones_pool(url, escritura=True))
+        if es_sqlite_en_memoria(url) and not url_lectura:
+            self.lectura = self.escritura
+        else:
+            url_lectura = url_lectura or url
+            self.lectura = crear_engine(url_lectura, solo_lectura=True, **opciones_pool(url_lectura, escritura=False))
+        self.preparada = False
+        self.bloqueo = threading.Lock()
+        if aplicar:
+            self.preparar()
+        else:
+            self.leer_estado()
+
+    def leer_estado(self):
+        with self.lectura.connect() as conn:
+            self.texto_completo = texto_completo_disponible(conn)
+            self.pendiente = esquema_pendiente(conn)  # Tablas o columnas que faltan
+
+    def preparar(self):
+        # Crea o migra el esquema una vez por proceso; devuelve la base
+        with self.bloqueo:
+            if not self.preparada:
+                crear_tabla(self.escritura)
+                self.preparada = True
+                self.leer_estado()
+        return self
+
+    @property
+    def nombre(self):
+        # Para mensajes: archivo en SQLite, URL sin contraseña en el resto
+        url = make_url(self.url)
+        if url.get_backend_name() == "sqlite":
+            return url.database or ":memory:"
+        return url.render_as_string(hide_password=True)
+
+    def cerrar(self):
+        self.escritura.dispose()
+        if self.lectura is not self.escritura:
+            self.lectura.dispose()
+
+def obtener_base(url=None, url_lectura=None, aplicar=False):
+    # Una BaseDatos por URL y proceso, compartida por todas las sesiones.
+    # aplicar=True completa el esquema (ver BaseDatos.preparar).
+    url = normalizar_url(url)
+    url_lectura = url_lectura or (os.environ.get("DEFENSAS_BD_LECTURA") if url == normalizar_url() else None)
+    with _bloqueo:
+        if (url, url_lectura) not in _bases:
+            _bases[(url, url_lectura)] = BaseDatos(url, url_lectura)
+        base = _bases[(url, url_lectura)]
+    return base.preparar() if aplicar else base
+
+def existe_base(url):
+    # Un archivo SQLite que no existe no es una base (evita crear una vacía
+    # por un error al escribir la ruta); en un servidor se mira la tabla
+    url = make_url(normalizar_url(url))
+    if url.get_backend_name() == "sqlite":
+        return es_sqlite_en_memoria(url) or os.path.exists(url.database)
+    engine = crear_engine(url)
+    try:
+        return inspect(engine).has_table("defensas_tesis")
+    finally:
+        engine.dispose()
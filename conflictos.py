@@ -0,0 +1,97 @@
+# conflictos.py
+import argparse
+import sys
+import pandas as pd
+from sqlalchemy import inspect, text
+from database import formatear_hora
+from conexiones import obtener_base, existe_base
+from excel_processor import separar_nombres, clave_nombre
+import tables_design as tb
+
+COLUMNAS_PERSONAS = ["tutores", "presidente", "miembro_1", "miembro_2", "oponente"]
+COLUMNAS_CONFLICTO = ["tipo", "recurso", "fecha", "hora", "estudiante", "en_conflicto_con"]
+
+class DetectorConflictos:
+    # Detecta profesores o locales con dos defensas a la misma fecha y hora.
+    # Cada (profesor, fecha, hora) y (lugar, fecha, hora) se guarda en un
+    # diccionario con la primera defensa que lo ocupa, así que cada fila se
+    # comprueba en tiempo constante y el total es lineal en número de filas.
+    # Se alimenta por lotes para poder usarlo mientras se lee el archivo.
+    # Con alias ({nombre_clave: profesor_id}, ver alias_bd) las variantes de
+    # nombre de un mismo profesor cuentan como una persona; los nombres que
+    # la base aún no conoce se comparan por su clave_nombre.
+
+    def __init__(self, alias=None):
+        self.alias = alias or {}
+        self.personas = {}  # (profesor_id o nombre_clave, fecha, hora) -> (fila, estudiante)
+        self.lugares = {}  # (lugar, fecha, hora) -> (fila, estudiante)
+        self.conflictos = []
+        self.filas = 0
+
+    def agregar(self, df):
+        columnas = [df[columna].to_numpy() for columna in ["estudiante", "fecha", "hora", "lugar"] + COLUMNAS_PERSONAS]
+        for estudiante, fecha, hora, lugar, *personas in zip(*columnas):
+            self.filas += 1
+            defensa = (self.filas, estudiante)
+            hora = formatear_hora(hora)
+            if fecha is None or pd.isna(fecha) or hora is None:
+                continue
+            fecha = str(fecha)[:10]
+
+            if lugar is not None and not pd.isna(lugar) and lugar != "":
+                self.registrar(self.lugares, "lugar", lugar, lugar, fecha, hora, defensa)
+
+            # Una misma persona en dos roles de la misma defensa no es un conflicto
+            vistos = set()
+            for celda in personas:
+                for nombre in separar_nombres(celda):
+                    clave = clave_nombre(nombre)
+                    clave = self.alias.get(clave, clave)
+                    if clave and clave not in vistos:
+                        vistos.add(clave)
+                        self.registrar(self.personas, "profesor", clave, nombre, fecha, hora, defensa)
+        return self
+
+    def registrar(self, indice, tipo, clave, nombre, fecha, hora, defensa):
+        primera = indice.setdefault((clave, fecha, hora), defensa)
+        if primera is not defensa:
+            self.conflictos.append((tipo, nombre, fecha, hora, defensa[1], primera[1]))
+
+    def resultado(self):
+        return pd.DataFrame(self.conflictos, columns=COLUMNAS_CONFLICTO)
+
+def alias_bd(engine):
+    # Variantes de nombre ya agrupadas en la base; vacío si no tiene alias_profesores
+    with engine.connect() as conn:
+        if not inspect(conn).has_table("alias_profesores"):
+            return {}
+        return dict(conn.execute(text("SELECT nombre_clave, profesor_id FROM alias_profesores")).fetchall())
+
+def detectar_conflictos(lotes, engine=None):
+    # Conflictos de un iterable de DataFrames con las columnas de procesar_excel.
+    # Con engine los profesores se identifican por alias_profesores de esa base.
+    detector = DetectorConflictos(alias_bd(engine) if engine is not None else None)
+    for df in lotes:
+        detector.agregar(df)
+    return detector.resultado()
+
+def conflictos_bd(engine, tamano_lote=5000):
+    # Revisar una base existente leyendo la tabla por bloques
+    with engine.connect() as conn:
+        consulta = "SELECT estudiante, fecha, hora, lugar, " + ", ".join(COLUMNAS_PERSONAS) + " FROM defensas_tesis ORDER BY id"
+        return detectar_conflictos(pd.read_sql(consulta, conn, chunksize=tamano_lote), engine)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Buscar profesores y locales con dos defensas a la misma hora")
+    parser.add_argument("base", help="Archivo .db o URL de la base a revisar")
+    args = parser.parse_args()
+    if not existe_base(args.base):
+        parser.error(f"no existe la base {args.base}")
+
+    conflictos = conflictos_bd(obtener_base(args.base).lectura)
+    if conflictos.empty:
+        print("✅ Sin conflictos de profesores ni de locales")
+        sys.exit(0)
+
+    tb.print_rich_query_results(conflictos, title=f"⚠️ Conflictos encontrados: {len(conflictos)}")
+    sys.exit(1)
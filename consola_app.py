@@ -1,21 +1,41 @@
 # consola_app.py
+import argparse
 import pandas as pd
 import re
-import numpy as np
 import os
 import subprocess
 from pathlib import Path
-from excel_processor import procesar_excel
-from database import crear_tabla, DefensaTesis
-from sqlalchemy import create_engine, Date, Time, String, text
+from excel_processor import procesar_excel, listar_archivos_excel, procesar_lote
+from cache_excel import procesar_excel_cacheado, procesar_libro_cacheado
+from database import guardar_defensas, leer_version, leer_por_lotes, DefensaTesis
+from conexiones import obtener_base
+from catalogo import Catalogo, consultar_bases, disponibilidad_bases, tabla_entradas
+from disponibilidad import MotorDisponibilidad
+from conflictos import DetectorConflictos, alias_bd
+from planificador import Planificador, FRANJAS_PREDETERMINADAS, dias_habiles, leer_pendientes, exportar_excel
+from sqlalchemy import Date, Time, String, text
 from tabulate import tabulate
+from consultas import (
+    consulta_defensas_profesor,
+    consulta_busqueda_texto, expresion_fts, error_consulta_select, consulta_filtrada
+)
 import tables_design as tb
+from instrumentacion import medir, activar, RUTA_PREDETERMINADA
+
+LIMITE_CONSULTA = 1000  # Registros que se muestran de una consulta SQL personalizada
 
 class AplicacionConsola:
-    def __init__(self):
-        self.engine = create_engine('sqlite:///defensas.db')
-        crear_tabla(self.engine)
+    def __init__(self, url=None):
+        # Base de trabajo: lecturas por self.bd.lectura y cargas por self.bd.escritura.
+        # Abrirla no la modifica; el esquema se completa al guardar o si se acepta aquí.
+        self.bd = obtener_base(url)
+        if self.bd.pendiente:
+            print(f"⚠️ La base {self.bd.nombre} no tiene el esquema actual (faltan: {', '.join(self.bd.pendiente)})")
+            if input("¿Actualizarla ahora? (s/n): ").lower() == 's':
+                self.bd.preparar()
         self.df = None
+        self.ruta_archivo = None
+        self.disponibilidad = None
         
     def mostrar_menu_principal(self):
         print("\n=== MENÚ PRINCIPAL ===")
@@ -23,90 +43,88 @@ class AplicacionConsola:
         print("2. Consultar defensas")
         print("3. Consulta SQL personalizada")
         print("4. Modificar base de datos (DB Browser)")  # Nueva opción
-        print("5. Salir")
+        print("5. Importar lote de archivos Excel")
+        print("6. Planificar defensas pendientes")
+        print("7. Consultar todas las bases (catálogo)")
+        print("8. Salir")
         return input("Seleccione una opción: ")
     
+    def obtener_disponibilidad(self):
+        # El motor se reconstruye solo si cambió la base (otra carga u otro archivo .db)
+        version = (self.bd.url, leer_version(self.bd.lectura))
+        if self.disponibilidad is None or self.disponibilidad[0] != version:
+            with self.bd.lectura.connect() as conn, medir("cargar_disponibilidad") as tramo:
+                self.disponibilidad = (version, MotorDisponibilidad.desde_bd(conn))
+                tramo.filas = len(self.disponibilidad[1].profesores)
+        return self.disponibilidad[1]
+
+    def mostrar_horarios(self, motor, libres, titulo):
+        # Tabla fecha x hora con 🟢 Libre o 🔴 Ocupado a partir de las máscaras
+        tabla = pd.DataFrame(
+            [['🟢' if mascara >> posicion & 1 else '🔴' for posicion in range(len(motor.franjas))]
+             for mascara in libres.values()],
+            index=pd.to_datetime(list(libres)).strftime('%d/%m/%Y'),
+            columns=motor.franjas
+        )
+        tb.print_rich_pivot_table(tabla, title=titulo)
+
+        # Calcular estadísticas
+        sesiones_por_dia = pd.Series(
+            {fecha: bin(mascara).count("1") for fecha, mascara in zip(tabla.index, libres.values())},
+            dtype=int
+        )
+        sesiones_por_dia = sesiones_por_dia[sesiones_por_dia > 0]
+        print(f"\n📊 Estadísticas:")
+        print(f"- Total de sesiones libres: {sesiones_por_dia.sum()}")
+        print(f"- Sesiones libres por día:\n{sesiones_por_dia.to_string()}")
+
     def horarios_libres_profesor(self):
         print("\n=== HORARIOS LIBRES POR PROFESOR ===")
         nombre_prof = input("Ingrese nombre del profesor: ").strip()
 
-        # Consulta para obtener las fechas donde participa el profesor y todas las horas posibles del sistema
-        query = """
-        WITH dias_profesor AS (
-            SELECT DISTINCT fecha 
-            FROM defensas_tesis 
-            WHERE 
-                tutores LIKE :profesor OR
-                presidente LIKE :profesor OR
-                miembro_1 LIKE :profesor OR
-                miembro_2 LIKE :profesor OR
-                oponente LIKE :profesor
-        ),
-        horas_ocupadas AS (
-            SELECT 
-                fecha,
-                substr(hora, 1, 5) AS hora
-            FROM defensas_tesis 
-            WHERE 
-                tutores LIKE :profesor OR
-                presidente LIKE :profesor OR
-                miembro_1 LIKE :profesor OR
-                miembro_2 LIKE :profesor OR
-                oponente LIKE :profesor
-        ),
-        todas_horas AS (
-            SELECT DISTINCT substr(hora,1,5) AS hora
-            FROM defensas_tesis
-        )
-        SELECT 
-            dp.fecha AS Fecha,
-            th.hora AS Hora,
-            CASE WHEN ho.hora IS NULL THEN 1 ELSE 0 END AS Libre
-        FROM dias_profesor dp
-        CROSS JOIN todas_horas th
-        LEFT JOIN horas_ocupadas ho 
-            ON dp.fecha = ho.fecha 
-            AND th.hora = ho.hora
-        ORDER BY dp.fecha, th.hora;
-        """
+        try:
+            with medir("horarios_libres_profesor") as tramo:
+                # Días en que participa el profesor y franjas libres de cada uno
+                motor = self.obtener_disponibilidad()
+                ids = motor.buscar_profesores(nombre_prof)
+                dias = motor.dias_de(ids)
+                tramo.filas = len(dias)
+                if not dias:
+                    print("\n⚠️ El profesor no tiene defensas registradas en el sistema.")
+                    return
+                self.mostrar_horarios(motor, motor.libres(ids, dias), f"📅 Horarios del profesor {nombre_prof}")
+
+        except Exception as e:
+            print(f"\n❌ Error: {str(e)}")
+
+    def horarios_comunes_tribunal(self):
+        print("\n=== HORARIOS COMUNES DE UN TRIBUNAL ===")
+        nombres = [nombre.strip() for nombre in input("Ingrese los profesores separados por comas: ").split(",") if nombre.strip()]
+        if not nombres:
+            print("\n⚠️ Debe ingresar al menos un profesor")
+            return
 
         try:
-            with self.engine.connect() as conn:
-                params = {'profesor': f'%{nombre_prof}%'}
-                resultados = pd.read_sql(text(query), conn, params=params)
+            motor = self.obtener_disponibilidad()
+            grupos = {nombre: motor.buscar_profesores(nombre) for nombre in nombres}
+            no_encontrados = [nombre for nombre, ids in grupos.items() if not ids]
+            if no_encontrados:
+                print(f"\n⚠️ No se encontraron: {', '.join(no_encontrados)}")
+                return
+            ids = [id_ for ids_nombre in grupos.values() for id_ in ids_nombre]
 
-                if not resultados.empty:
-                    # Formatear fecha a dd/mm/YYYY
-                    resultados['Fecha'] = pd.to_datetime(resultados['Fecha']).dt.strftime('%d/%m/%Y')
-                    # Asignar 🟢 Libre o 🔴 Ocupado
-                    resultados['Estado'] = np.where(resultados['Libre'] == 1, '🟢', '🔴')
-
-                    # Obtener lista dinámica de horas (ordenada)
-                    horas_unicas = sorted(resultados['Hora'].unique())
-
-                    # Crear tabla pivote usando las horas dinámicas
-                    tabla_pivote = resultados.pivot_table(
-                        index='Fecha',
-                        columns='Hora',
-                        values='Estado',
-                        aggfunc='first',
-                        fill_value='🔴'
-                    ).reindex(columns=horas_unicas)
-
-                    # Mostrar la tabla pivote
-                    tb.print_rich_pivot_table(tabla_pivote, title=f"📅 Horarios del profesor {nombre_prof}")
-
-                    # Calcular estadísticas
-                    libres = resultados[resultados['Libre'] == 1]
-                    total_libres = len(libres)
-                    sesiones_por_dia = libres.groupby('Fecha').size()
-
-                    print(f"\n📊 Estadísticas:")
-                    print(f"- Total de sesiones libres: {total_libres}")
-                    print(f"- Sesiones libres por día:\n{sesiones_por_dia.to_string()}")
+            desde = input("Buscar desde la fecha (YYYY-MM-DD, vacío para todo el calendario): ").strip()
+            dias = [fecha for fecha in motor.dias if fecha >= desde]
+            if not dias:
+                print("\n⚠️ No hay días del calendario en ese rango")
+                return
+            self.mostrar_horarios(motor, motor.libres(ids, dias), f"📅 Horarios comunes de {', '.join(nombres)}")
 
-                else:
-                    print("\n⚠️ El profesor no tiene defensas registradas en el sistema.")
+            fecha, horas = motor.primer_dia_libre(ids, desde)
+            if fecha:
+                print(f"\n✅ Primer día con horario común: {pd.to_datetime(fecha).strftime('%d/%m/%Y')} ({', '.join(horas)})")
+            else:
+                print("\n⚠️ No hay ningún día con horario común para todo el tribunal")
 
         except Exception as e:
             print(f"\n❌ Error: {str(e)}")
@@ -114,9 +132,22 @@ class AplicacionConsola:
 
     def procesar_archivo(self, ruta_archivo):
         try:
-            self.df = procesar_excel(ruta_archivo)
+            # Una sola lectura del Excel para la vista previa y los conflictos:
+            # al completarla queda el snapshot de cache_excel.py, del que lee
+            # el guardado sin volver a abrir el libro
+            self.df = None
+            detector = DetectorConflictos(alias_bd(self.bd.lectura))
+            for lote in procesar_excel_cacheado(ruta_archivo):
+                if self.df is None:
+                    self.df = lote.head(3)
+                detector.agregar(lote)
+            if self.df is None:
+                print("\n⚠️ El archivo no contiene defensas reconocibles")
+                return
+            self.ruta_archivo = ruta_archivo
             print("\n✅ Archivo procesado correctamente")
-            tb.print_rich_df_preview(self.df.head(3), title="Vista previa del archivo procesado")
+            tb.print_rich_df_preview(self.df, title="Vista previa del archivo procesado")
+            self.mostrar_conflictos(detector.resultado())
 
             guardar = input("\n¿Desea guardar en base de datos? (s/n): ").lower()
             if guardar == 's':
@@ -125,6 +156,14 @@ class AplicacionConsola:
         except Exception as e:
             print(f"\n❌ Error procesando archivo: {str(e)}")
 
+    def mostrar_conflictos(self, conflictos):
+        if conflictos.empty:
+            print("\n✅ Sin conflictos de profesores ni de locales")
+            return
+        tb.print_rich_query_results(conflictos, title="⚠️ Profesores o locales con dos defensas a la misma hora")
+        por_tipo = conflictos['tipo'].value_counts()
+        print(f"\n⚠️ Conflictos: {len(conflictos)} (profesores: {por_tipo.get('profesor', 0)}, locales: {por_tipo.get('lugar', 0)})")
+
     def guardar_en_bd(self):
         while True:
             nombre_archivo = input("\nNombre del archivo de base de datos (sin extensión .db): ").strip()
@@ -133,36 +172,27 @@ class AplicacionConsola:
                 continue
                 
             nombre_archivo += ".db"
+            reemplazar = False
             
             if os.path.exists(nombre_archivo):
                 print(f"\n⚠️ ¡Atención! El archivo '{nombre_archivo}' ya existe.")
-                confirmar = input("¿Desea sobrescribirlo? (s/n): ").lower()
-                if confirmar != 's':
+                confirmar = input("¿Actualizar solo los cambios (i), sobrescribirlo (s) o cancelar (n)? ").lower()
+                if confirmar not in ('i', 's'):
                     print("Operación cancelada.")
                     return
+                reemplazar = confirmar == 's'
                     
             try:
-                # Crear motor dinámico con el nombre proporcionado
-                self.engine = create_engine(f'sqlite:///{nombre_archivo}')
-                crear_tabla(self.engine)
+                destino = obtener_base(nombre_archivo, aplicar=True)
                 
-                # Convertir tipos y guardar
-                self.df['fecha'] = pd.to_datetime(self.df['fecha']).dt.date
-                self.df['hora'] = self.df['hora'].astype(str).str.slice(0, 5)
-                
-                with self.engine.begin() as conn:
-                    self.df.to_sql(
-                        name='defensas_tesis',
-                        con=conn,
-                        if_exists='replace',
-                        index=False,
-                        dtype={
-                            'fecha': Date(),
-                            'hora': String(5),
-                            'lugar': String(100)
-                        }
-                    )
+                # Guardar por lotes a medida que se leen del archivo
+                resumen = guardar_defensas(destino.escritura, procesar_excel_cacheado(self.ruta_archivo), reemplazar=reemplazar)
                 print(f"\n✅ Datos guardados exitosamente en: {nombre_archivo}")
+                Catalogo().registrar_carga(nombre_archivo)
+                self.mostrar_resumen_carga(resumen)
+                # Las consultas siguen sobre la base actual salvo que se elija cambiar
+                if destino is not self.bd and input(f"¿Consultar '{nombre_archivo}' a partir de ahora en lugar de '{self.bd.nombre}'? (s/n): ").lower() == 's':
+                    self.bd = destino
                 break
                 
             except Exception as e:
@@ -172,6 +202,132 @@ class AplicacionConsola:
                     print("Operación cancelada.")
                     break
 
+    def mostrar_resumen_carga(self, resumen):
+        print(f"📊 Procesadas: {resumen['procesadas']} | Nuevas: {resumen['insertadas']} | "
+              f"Actualizadas: {resumen['actualizadas']} | Sin cambios: {resumen['sin_cambios']}")
+
+    def importar_lote(self):
+        print("\n=== IMPORTACIÓN POR LOTES ===")
+        ruta = input("Ingrese un directorio o patrón (ej: calendarios/*.xlsx): ").strip()
+        rutas = listar_archivos_excel(ruta)
+        if not rutas:
+            print("\n⚠️ No se encontraron archivos Excel")
+            return
+
+        print(f"\n📂 Archivos encontrados: {len(rutas)} (se procesan todas las hojas en paralelo)")
+        reemplazar = input("¿Reemplazar el contenido actual de la base de datos? (s/n): ").lower() == 's'
+
+        errores = []
+        def resultados_validos():
+            # Reportar cada archivo según termina y pasar solo los correctos a la BD
+            for ruta_archivo, df, error in procesar_lote(rutas, procesar=procesar_libro_cacheado):
+                if error:
+                    errores.append(ruta_archivo)
+                    print(f"❌ {ruta_archivo}: {error}")
+                else:
+                    print(f"✅ {ruta_archivo}: {len(df)} defensas")
+                    yield df
+
+        try:
+            resumen = guardar_defensas(self.bd.preparar().escritura, resultados_validos(), reemplazar=reemplazar)
+            print(f"\n✅ Datos guardados en: {self.bd.nombre}")
+            Catalogo().registrar_carga(self.bd.url)
+            self.mostrar_resumen_carga(resumen)
+            if errores:
+                print(f"⚠️ Archivos con errores: {len(errores)} de {len(rutas)}")
+        except Exception as e:
+            print(f"\n❌ Error al guardar: {str(e)}")
+
+    def menu_catalogo(self):
+        # Consultas sobre todas las bases registradas (un archivo .db por semestre)
+        catalogo = Catalogo()
+        while True:
+            print("\n=== CATÁLOGO DE BASES ===")
+            print("1. Ver bases registradas")
+            print("2. Registrar las bases de un directorio")
+            print("3. Defensas de un profesor en todas las bases")
+            print("4. Defensas entre dos fechas en todas las bases")
+            print("5. Horarios libres de un profesor en todas las bases")
+            print("6. Volver")
+            opcion = input("Seleccione una opción: ")
+            try:
+                if opcion == '1':
+                    entradas = catalogo.entradas()
+                    if entradas:
+                        tb.print_rich_query_results(tabla_entradas(entradas), title="Bases en el catálogo")
+                    else:
+                        print("\nℹ️ El catálogo está vacío: guarde un archivo o registre un directorio")
+                elif opcion == '2':
+                    directorio = input("Directorio con archivos .db: ").strip() or "."
+                    print(f"\n📂 Bases registradas: {len(catalogo.buscar(directorio))}")
+                elif opcion in ('3', '4', '5'):
+                    nombre = input("Ingrese nombre del profesor: ").strip() if opcion != '4' else None
+                    desde = input("Desde la fecha (YYYY-MM-DD, vacío para no limitar): ").strip() or None
+                    hasta = input("Hasta la fecha (YYYY-MM-DD, vacío para no limitar): ").strip() or None
+                    # Las bases cuyo rango de fechas no cruza el pedido no se abren
+                    entradas = catalogo.seleccionar(desde, hasta)
+                    desactualizadas = catalogo.desactualizadas(desde, hasta)
+                    if desactualizadas:
+                        print(f"\n⚠️ Bases omitidas por tener un esquema anterior: {', '.join(entrada['nombre'] for entrada in desactualizadas)} (python catalogo.py migrate)")
+                    if not entradas:
+                        print("\n⚠️ Ninguna base del catálogo tiene defensas en ese rango")
+                        continue
+                    print(f"\n🗄️ Bases consultadas: {', '.join(entrada['nombre'] for entrada in entradas)}")
+                    if opcion == '5':
+                        motor = disponibilidad_bases(entradas)
+                        ids = motor.buscar_profesores(nombre)
+                        dias = [fecha for fecha in motor.dias_de(ids) if fecha >= (desde or "") and fecha <= (hasta or "~")]
+                        if not dias:
+                            print("\n⚠️ El profesor no tiene defensas registradas en esas fechas.")
+                            continue
+                        self.mostrar_horarios(motor, motor.libres(ids, dias), f"📅 Horarios del profesor {nombre} (todas las bases)")
+                        continue
+                    fechas = (desde or "0000-00-00", hasta or "9999-99-99") if desde or hasta else None
+                    consulta, params = consulta_filtrada(
+                        profesor=nombre, fechas=fechas, fts=all(entrada["texto_completo"] for entrada in entradas)
+                    )
+                    resultados = consultar_bases(entradas, consulta, params, "fecha, hora")
+                    if resultados.empty:
+                        print("\n⚠️ No se encontraron resultados")
+                    else:
+                        tb.print_rich_query_results(resultados.drop(columns=["id"]), title=f"Resultados en {len(entradas)} bases")
+                elif opcion == '6':
+                    break
+                else:
+                    print("\n⚠️ Opción no válida")
+            except Exception as e:
+                print(f"\n❌ Error: {str(e)}")
+
+    def planificar_defensas(self):
+        print("\n=== PLANIFICACIÓN DE DEFENSAS ===")
+        ruta = input("Archivo de pendientes (CSV o Excel con columnas Estudiantes y Tutor): ").strip()
+        try:
+            pendientes = leer_pendientes(ruta)
+            desde = input("Desde la fecha (YYYY-MM-DD): ").strip()
+            hasta = input("Hasta la fecha (YYYY-MM-DD): ").strip()
+            lugares = [lugar.strip() for lugar in input("Locales separados por comas (vacío para los ya registrados): ").split(",") if lugar.strip()]
+            franjas = [franja.strip() for franja in input(f"Horas separadas por comas (vacío para {', '.join(FRANJAS_PREDETERMINADAS)}): ").split(",") if franja.strip()]
+
+            with self.bd.lectura.connect() as conn:
+                planificador = Planificador.desde_bd(conn, dias_habiles(desde, hasta), lugares, franjas)
+            if not planificador.lugares:
+                print("\n⚠️ No hay locales registrados; indíquelos manualmente")
+                return
+            propuesta, sin_asignar = planificador.planificar(pendientes)
+
+            print(f"\n✅ Defensas planificadas: {len(propuesta)} de {len(pendientes)}")
+            if not propuesta.empty:
+                tb.print_rich_query_results(propuesta, title="📅 Calendario propuesto")
+            if sin_asignar:
+                print(f"⚠️ Sin hueco disponible: {', '.join(sin_asignar)}")
+
+            if not propuesta.empty and input("\n¿Exportar a Excel? (s/n): ").lower() == 's':
+                salida = input("Nombre del archivo (ej: propuesta.xlsx): ").strip() or "propuesta.xlsx"
+                exportar_excel(propuesta, salida)
+                print(f"✅ Calendario exportado a: {salida} (se puede importar con la opción 1)")
+        except Exception as e:
+            print(f"\n❌ Error al planificar: {str(e)}")
+
     def mostrar_filtros(self):
         print("\n=== FILTROS DISPONIBLES ===")
         print("1. Por fecha")
@@ -181,13 +337,16 @@ class AplicacionConsola:
         print("5. Por lugar")
         print("6. Por profesor (cualquier rol)")  
         print("7. Horarios libres por profesor")  # Nueva opción
-        print("8. Volver al menú principal")
+        print("8. Horarios comunes de un tribunal")
+        print("9. Búsqueda libre en todos los campos")
+        print("10. Volver al menú principal")
         return input("Seleccione filtro: ")
 
-    def ejecutar_consulta(self, consulta_sql):
+    def ejecutar_consulta(self, consulta_sql, params=None):
         try:
-            with self.engine.connect() as conn:
-                resultados = pd.read_sql_query(consulta_sql, conn)
+            with self.bd.lectura.connect() as conn, medir("ejecutar_consulta") as tramo:
+                resultados = pd.read_sql_query(text(consulta_sql), conn, params=params or {})
+                tramo.filas = len(resultados)
                 if not resultados.empty:
                     # Resaltar coincidencias
                     # resultados = resultados.map(lambda x: f"\033[93m{x}\033[0m" if isinstance(x,str) and any(rol in x for rol in ['tutor','presidente','miembro','oponente']) else x)
@@ -209,33 +368,11 @@ class AplicacionConsola:
         except Exception as e:
             print(f"\n❌ Error en la consulta: {str(e)}")
             
-    def generar_query_profesor(nombre_profesor):
-        return f"""
-        SELECT * FROM defensas_tesis 
-        WHERE 
-            tutores LIKE '%{nombre_profesor}%' OR
-            presidente LIKE '%{nombre_profesor}%' OR
-            miembro_1 LIKE '%{nombre_profesor}%' OR
-            miembro_2 LIKE '%{nombre_profesor}%' OR
-            oponente LIKE '%{nombre_profesor}%'
-        ORDER BY fecha, hora
-        """     
     def menu_consultas(self):
-        def generar_query_profesor(nombre_profesor):
-            return f"""
-            SELECT * FROM defensas_tesis 
-            WHERE 
-                tutores LIKE '%{nombre_profesor}%' OR
-                presidente LIKE '%{nombre_profesor}%' OR
-                miembro_1 LIKE '%{nombre_profesor}%' OR
-                miembro_2 LIKE '%{nombre_profesor}%' OR
-                oponente LIKE '%{nombre_profesor}%'
-            ORDER BY fecha, hora
-            """     
         while True:
             opcion = self.mostrar_filtros()
             
-            if opcion == '8':
+            if opcion == '10':
                 break
                 
             campo, valor = None, None
@@ -247,28 +384,54 @@ class AplicacionConsola:
                 campo = 'estudiante'
                 valor = input("Ingrese nombre estudiante: ").strip()
             elif opcion == '3':
-                campo = 'tutores'
                 valor = input("Ingrese nombre tutor: ").strip()
+                self.ejecutar_consulta(*consulta_defensas_profesor(valor, rol='tutor'))
+                continue
             elif opcion == '4':
-                campo = 'oponente'
                 valor = input("Ingrese nombre oponente: ").strip()
+                self.ejecutar_consulta(*consulta_defensas_profesor(valor, rol='oponente'))
+                continue
             elif opcion == '5':
                 campo = 'lugar'
                 valor = input("Ingrese lugar: ").strip()
             elif opcion == '6': 
                 nombre_prof = input("Ingrese nombre del profesor: ").strip()
-                consulta = generar_query_profesor(nombre_prof)
-                self.ejecutar_consulta(consulta)
+                self.ejecutar_consulta(*consulta_defensas_profesor(nombre_prof))
                 continue
             elif opcion == '7':  
                 self.horarios_libres_profesor()
                 continue
+            elif opcion == '8':
+                self.horarios_comunes_tribunal()
+                continue
+            elif opcion == '9':
+                campo = 'todos'
+                valor = input("Ingrese texto a buscar: ").strip()
             else:
                 print("\n⚠️ Opción no válida")
                 continue
                 
-            consulta = f"SELECT * FROM defensas_tesis WHERE {campo} LIKE '%{valor}%'"
-            self.ejecutar_consulta(consulta)
+            if campo == 'fecha':
+                # Rango sobre el índice de fecha: admite fecha completa o prefijo (YYYY-MM)
+                consulta = "SELECT * FROM defensas_tesis WHERE fecha >= :desde AND fecha < :hasta ORDER BY fecha, hora"
+                params = {'desde': valor.strip(), 'hasta': valor.strip() + '~'}
+            elif campo in ('estudiante', 'todos'):
+                # Índice de texto completo: sin distinguir tildes y por prefijo de palabra
+                if not expresion_fts(valor):
+                    print("\n⚠️ Ingrese al menos una palabra")
+                    continue
+                columnas = ['estudiante'] if campo == 'estudiante' else None
+                consulta, params = consulta_busqueda_texto(valor, columnas, fts=self.bd.texto_completo)
+            else:
+                # Resolver primero los valores distintos que coinciden (recorre solo el
+                # índice de la columna) y luego buscar las defensas por igualdad
+                consulta = f"""
+                SELECT * FROM defensas_tesis
+                WHERE {campo} IN (SELECT DISTINCT {campo} FROM defensas_tesis WHERE {campo} LIKE :patron)
+                ORDER BY fecha, hora
+                """
+                params = {'patron': f'%{valor}%'}
+            self.ejecutar_consulta(consulta, params)
 
     
     def consulta_personalizada(self):
@@ -276,7 +439,7 @@ class AplicacionConsola:
         print("Normas de seguridad:")
         print("- Solo se permiten consultas SELECT")
         print("- No se permite múltiples statements")
-        print("- Límite de 1000 registros por consulta")
+        print(f"- Se muestran hasta {LIMITE_CONSULTA} registros (la exportación a CSV incluye todos)")
         
         consulta = input("\nIngrese su consulta SQL (o 'exit' para salir):\n").strip()
         
@@ -284,39 +447,43 @@ class AplicacionConsola:
             return
         
         # Validación de seguridad
-        if not consulta.upper().startswith("SELECT"):
-            print("\n❌ Error: Solo se permiten consultas SELECT")
-            return
-            
-        if ';' in consulta:
-            print("\n❌ Error: No se permiten múltiples statements")
+        error = error_consulta_select(consulta)
+        if error:
+            print(f"\n❌ Error: {error}")
             return
             
         try:
-            with self.engine.connect() as conn:
-                # Ejecutar con límite de resultados
+            # Solo se piden a la base las filas que se muestran (una más para
+            # saber si la consulta devuelve más)
+            with self.bd.lectura.connect() as conn:
                 resultados = pd.read_sql_query(
-                    sql=text(consulta),
+                    sql=text(f"SELECT * FROM ({consulta}) AS q LIMIT :limite"),
                     con=conn,
-                    params={},
-                    coerce_float=False,
-                    chunksize=None
-                ).head(1000)
-                
-                if not resultados.empty:
-                    print(f"\n🔍 Resultados ({len(resultados)} registros):")
-                    # print(tabulate(resultados, headers='keys', tablefmt='psql', showindex=False))
-                    tb.print_rich_sql_results(resultados, title="Resultados SQL")
-
-                    # Opción para guardar resultados
-                    guardar = input("\n¿Desea exportar a CSV? (s/n): ").lower()
-                    if guardar == 's':
-                        nombre_archivo = input("Nombre del archivo (sin extensión): ").strip()
-                        resultados.to_csv(f"{nombre_archivo}.csv", index=False)
-                        print(f"✅ Datos guardados en {nombre_archivo}.csv")
-                else:
-                    print("\nℹ️ La consulta no devolvió resultados")
-                    
+                    params={'limite': LIMITE_CONSULTA + 1},
+                    coerce_float=False
+                )
+            hay_mas = len(resultados) > LIMITE_CONSULTA
+            resultados = resultados.head(LIMITE_CONSULTA)
+
+            if not resultados.empty:
+                print(f"\n🔍 Resultados ({len(resultados)} registros{', hay más' if hay_mas else ''}):")
+                # print(tabulate(resultados, headers='keys', tablefmt='psql', showindex=False))
+                tb.print_rich_sql_results(resultados, title="Resultados SQL")
+
+                # Opción para guardar resultados: la exportación incluye todas las
+                # filas, leídas y escritas por bloques
+                guardar = input("\n¿Desea exportar a CSV? (s/n): ").lower()
+                if guardar == 's':
+                    nombre_archivo = input("Nombre del archivo (sin extensión): ").strip()
+                    total = 0
+                    with open(f"{nombre_archivo}.csv", "w", newline="", encoding="utf-8") as archivo:
+                        for numero, lote in enumerate(leer_por_lotes(self.bd.lectura, consulta)):
+                            lote.to_csv(archivo, index=False, header=numero == 0)
+                            total += len(lote)
+                    print(f"✅ {total} registros guardados en {nombre_archivo}.csv")
+            else:
+                print("\nℹ️ La consulta no devolvió resultados")
+
         except Exception as e:
             print(f"\n❌ Error en la consulta: {str(e)}")
             # Mostrar sugerencias para errores comunes
@@ -341,11 +508,24 @@ class AplicacionConsola:
             elif opcion == '4':
                 print("\n Ejecutar desde terminal: ./OpenBrowser.sh database.db ( si es la primera vez ejecute antes: chmod +x abrir_db_browser.sh) ")
             elif opcion == '5':
+                self.importar_lote()
+            elif opcion == '6':
+                self.planificar_defensas()
+            elif opcion == '7':
+                self.menu_catalogo()
+            elif opcion == '8':
                 print("\n👋 ¡Hasta pronto!")
                 break
             else:
                 print("\n⚠️ Opción no válida, intente nuevamente")
 
 if __name__ == "__main__":
-    app = AplicacionConsola()
+    parser = argparse.ArgumentParser(description="Sistema de gestión de defensas (consola)")
+    parser.add_argument("--perfil", nargs="?", const=RUTA_PREDETERMINADA, metavar="RUTA",
+                        help=f"Registrar tiempos de cada etapa en un JSON Lines (por defecto {RUTA_PREDETERMINADA})")
+    parser.add_argument("--db", help="Archivo .db, :memory: o URL de la base (por defecto DEFENSAS_BD o defensas.db)")
+    args = parser.parse_args()
+    if args.perfil:
+        activar(args.perfil)
+    app = AplicacionConsola(args.db)
     app.ejecutar()
\ No newline at end of file
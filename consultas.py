@@ -0,0 +1,238 @@
+# consultas.py
+import re
+from excel_processor import clave_nombre
+from database import DIMENSIONES_RESUMEN, COLUMNAS_TEXTO
+
+# Defensas en las que participa un profesor, resuelto contra sus variantes
+# de nombre (alias_profesores, pequeña) y buscado por el índice de
+# participaciones: cualquier variante encuentra las defensas de todas.
+# {operador} es LIKE en las búsquedas parciales y = en las exactas.
+SUBCONSULTA_PROFESOR = """
+    SELECT pa.defensa_id
+    FROM participaciones pa
+    WHERE pa.profesor_id IN (SELECT profesor_id FROM alias_profesores WHERE nombre_clave {operador} :profesor)
+"""
+
+def patron_profesor(nombre, exacto=False):
+    # Búsqueda parcial sin distinguir tildes, mayúsculas ni títulos
+    return clave_nombre(nombre) if exacto else f"%{clave_nombre(nombre)}%"
+
+def filtro_profesor(rol=None, parametro='profesor', columna='id', exacto=False):
+    # Condición WHERE para defensas_tesis; con rol se limita a ese papel.
+    # parametro permite combinar varios filtros de profesor en una consulta.
+    # exacto compara con = para que "_" o "%" del nombre no sean comodines.
+    subconsulta = SUBCONSULTA_PROFESOR.format(operador='=' if exacto else 'LIKE').replace(':profesor', f':{parametro}')
+    if rol:
+        subconsulta += f" AND pa.rol = :{parametro}_rol"
+    return f"{columna} IN ({subconsulta})"
+
+def consulta_defensas_profesor(nombre, rol=None, exacto=False, columnas="*"):
+    consulta = f"""
+    SELECT {columnas} FROM defensas_tesis
+    WHERE {filtro_profesor(rol, exacto=exacto)}
+    ORDER BY fecha, hora
+    """
+    params = {'profesor': patron_profesor(nombre, exacto)}
+    if rol:
+        params['profesor_rol'] = rol
+    return consulta, params
+
+def consulta_conteo_por_profesor(rol):
+    # Defensas por profesor en un rol, contadas por persona y no por el texto
+    # de la celda; se leen de resumen_profesores, actualizada en cada carga
+    consulta = """
+    SELECT p.nombre AS profesor, r.total
+    FROM resumen_profesores r
+    JOIN profesores p ON p.id = r.profesor_id
+    WHERE r.rol = :rol
+    ORDER BY r.total DESC, p.nombre
+    """
+    return consulta, {'rol': rol}
+
+def consulta_profesores(rol=None):
+    # Nombres de profesores, opcionalmente solo los que han tenido un rol
+    if rol:
+        consulta = """
+        SELECT DISTINCT p.nombre FROM profesores p
+        JOIN resumen_profesores r ON r.profesor_id = p.id
+        WHERE r.rol = :rol
+        ORDER BY p.nombre
+        """
+        return consulta, {'rol': rol}
+    return "SELECT nombre FROM profesores ORDER BY nombre", {}
+
+def consulta_variantes(nombre=None):
+    # Variantes de nombre registradas de cada profesor; con nombre, solo los
+    # profesores con alguna variante que lo contenga
+    consulta = """
+    SELECT p.nombre AS profesor, a.nombre AS variante
+    FROM alias_profesores a
+    JOIN profesores p ON p.id = a.profesor_id
+    """
+    params = {}
+    if nombre:
+        consulta += " WHERE a.profesor_id IN (SELECT profesor_id FROM alias_profesores WHERE nombre_clave LIKE :profesor)"
+        params['profesor'] = patron_profesor(nombre)
+    return consulta + " ORDER BY p.nombre, a.nombre", params
+
+def consulta_conteo_por(columna):
+    # Defensas por fecha, hora o lugar (sin los vacíos), de resumen_defensas
+    if columna not in DIMENSIONES_RESUMEN:
+        raise ValueError(f"Columna sin resumen: {columna}")
+    consulta = f"""
+    SELECT valor AS {columna}, total FROM resumen_defensas
+    WHERE dimension = :dimension AND valor != ''
+    ORDER BY valor
+    """
+    return consulta, {'dimension': columna}
+
+def consulta_resumen_general():
+    # Totales de la base sin recorrer defensas_tesis; los conteos por fecha
+    # incluyen las defensas sin fecha (valor ''), así que suman el total
+    consulta = """
+    SELECT
+        (SELECT COALESCE(SUM(total), 0) FROM resumen_defensas WHERE dimension = 'fecha') AS defensas,
+        (SELECT MIN(valor) FROM resumen_defensas WHERE dimension = 'fecha' AND valor != '') AS primera_fecha,
+        (SELECT MAX(valor) FROM resumen_defensas WHERE dimension = 'fecha' AND valor != '') AS ultima_fecha,
+        (SELECT COUNT(*) FROM resumen_defensas WHERE dimension = 'lugar' AND valor != '') AS lugares,
+        (SELECT COUNT(*) FROM profesores) AS profesores
+    """
+    return consulta, {}
+
+def expresion_fts(texto):
+    # Cada palabra se busca como prefijo ("per" encuentra "Pérez") y todas deben aparecer
+    palabras = re.findall(r"\w+", texto)
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+def condicion_texto_like(texto, columnas=None, alias="d."):
+    # Alternativa a FTS5 (PostgreSQL, SQLite sin FTS5): cada palabra debe
+    # aparecer en alguna de las columnas, sin distinguir mayúsculas
+    condiciones = []
+    params = {}
+    for numero, palabra in enumerate(re.findall(r"\w+", texto)):
+        params[f'palabra_{numero}'] = f"%{palabra.lower()}%"
+        condiciones.append("(" + " OR ".join(
+            f"LOWER({alias}{columna}) LIKE :palabra_{numero}" for columna in columnas or COLUMNAS_TEXTO
+        ) + ")")
+    return " AND ".join(condiciones), params
+
+def consulta_busqueda_texto(texto, columnas=None, limite=None, fts=True):
+    # Búsqueda de texto completo ordenada por relevancia (bm25). Con columnas
+    # se limita la búsqueda a esos campos. Con fts=False se busca con LIKE y
+    # se ordena por fecha.
+    if not fts:
+        condicion, params = condicion_texto_like(texto, columnas)
+        consulta = f"SELECT d.* FROM defensas_tesis d {'WHERE ' + condicion if condicion else ''} ORDER BY d.fecha, d.hora"
+        if limite:
+            consulta += " LIMIT :limite"
+            params['limite'] = limite
+        return consulta, params
+    expresion = expresion_fts(texto)
+    if columnas:
+        expresion = f"{{{' '.join(columnas)}}} : ({expresion})"
+    consulta = """
+    SELECT d.* FROM defensas_fts
+    JOIN defensas_tesis d ON d.id = defensas_fts.rowid
+    WHERE defensas_fts MATCH :expresion
+    ORDER BY defensas_fts.rank
+    """
+    params = {'expresion': expresion}
+    if limite:
+        consulta += " LIMIT :limite"
+        params['limite'] = limite
+    return consulta, params
+
+def consulta_filtrada(tutor=None, oponente=None, fechas=None, lugar=None, texto=None, profesor=None, fts=True):
+    # Combina los filtros de la interfaz web en una sola consulta parametrizada.
+    # fechas es una fecha o un par (desde, hasta). Con texto se ordena por relevancia
+    # (con fts=False se busca con LIKE). profesor busca por nombre parcial en cualquier rol.
+    desde = "defensas_tesis d"
+    orden = "d.fecha, d.hora"
+    condiciones = []
+    params = {}
+    if texto and not fts:
+        condicion, params_texto = condicion_texto_like(texto)
+        if condicion:
+            condiciones.append(condicion)
+            params.update(params_texto)
+    elif texto and expresion_fts(texto):
+        desde += " JOIN defensas_fts ON defensas_fts.rowid = d.id"
+        condiciones.append("defensas_fts MATCH :expresion")
+        params['expresion'] = expresion_fts(texto)
+        orden = "defensas_fts.rank"
+    if tutor:
+        condiciones.append(filtro_profesor('tutor', 'tutor', 'd.id', exacto=True))
+        params.update({'tutor': patron_profesor(tutor, exacto=True), 'tutor_rol': 'tutor'})
+    if oponente:
+        condiciones.append(filtro_profesor('oponente', 'oponente', 'd.id', exacto=True))
+        params.update({'oponente': patron_profesor(oponente, exacto=True), 'oponente_rol': 'oponente'})
+    if profesor:
+        condiciones.append(filtro_profesor(columna='d.id'))
+        params['profesor'] = patron_profesor(profesor)
+    if fechas:
+        inicio, fin = (fechas[0], fechas[-1]) if isinstance(fechas, (list, tuple)) else (fechas, fechas)
+        condiciones.append("d.fecha BETWEEN :fecha_desde AND :fecha_hasta")
+        params.update({'fecha_desde': str(inicio), 'fecha_hasta': str(fin)})
+    if lugar:
+        condiciones.append("d.lugar = :lugar")
+        params['lugar'] = lugar
+    donde = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    return f"SELECT d.* FROM {desde} {donde} ORDER BY {orden}", params
+
+# Tablas de una base de defensas que se pueden leer de una base adjunta (ATTACH)
+TABLAS_BASE = ["defensas_tesis", "participaciones", "profesores", "alias_profesores", "defensas_fts", "resumen_defensas", "resumen_profesores"]
+RESERVADAS = "WHERE|ON|USING|JOIN|LEFT|RIGHT|FULL|INNER|OUTER|CROSS|NATURAL|ORDER|GROUP|HAVING|LIMIT|UNION|EXCEPT|INTERSECT|WINDOW"
+# Tabla (quizá ya con esquema) y alias opcional
+REFERENCIA_TABLA = rf"(?:\w+\.)?\w+(?:\s+(?:AS\s+)?(?!(?:{RESERVADAS})\b)\w+)?"
+# FROM o JOIN seguido de una o varias referencias separadas por comas
+PATRON_DESDE = re.compile(rf"\b(FROM|JOIN)(\s+)({REFERENCIA_TABLA}(?:\s*,\s*{REFERENCIA_TABLA})*)", re.IGNORECASE)
+PATRON_REFERENCIA = re.compile(
+    rf"^({'|'.join(TABLAS_BASE)})(\s+(?:AS\s+)?(?!(?:{RESERVADAS})\b)\w+)?$", re.IGNORECASE
+)
+
+def calificar_tablas(consulta, esquema):
+    # Lee las tablas de la base adjunta como esquema, tras FROM, JOIN o
+    # la coma de una lista de tablas. Sin alias propio la tabla se renombra
+    # con su nombre, de modo que el resto de la consulta (defensas_fts MATCH,
+    # defensas_fts.rank, columnas calificadas) no cambia. Las referencias que
+    # no se reconocen quedan igual: consultar_bases (catalogo.py) comprueba
+    # que cada parte solo lea de su base.
+    def calificar(referencia):
+        m = PATRON_REFERENCIA.match(referencia.strip())
+        if not m:
+            return referencia
+        return f"{esquema}.{m[1]}{m[2] or ' AS ' + m[1]}"
+
+    def reemplazar(m):
+        lista = ", ".join(calificar(referencia) for referencia in m[3].split(","))
+        return f"{m[1]}{m[2]}{lista}"
+
+    return PATRON_DESDE.sub(reemplazar, consulta)
+
+def consulta_federada(consulta, esquemas, orden=None):
+    # Une la misma consulta sobre varias bases adjuntas; la columna base
+    # indica el esquema de cada fila. Cada parte va en una subconsulta para
+    # conservar su ORDER BY y LIMIT; orden ordena el resultado conjunto.
+    partes = [
+        f"SELECT '{esquema}' AS base, q.* FROM ({calificar_tablas(consulta, esquema)}) AS q"
+        for esquema in esquemas
+    ]
+    federada = "\nUNION ALL\n".join(partes)
+    if orden:
+        federada += f"\nORDER BY {orden}"
+    return federada
+
+def error_consulta_select(consulta):
+    # Las consultas libres solo pueden ser un único SELECT; devuelve el motivo del rechazo
+    if not consulta.upper().startswith("SELECT"):
+        return "Solo se permiten consultas SELECT"
+    if ';' in consulta:
+        return "No se permiten múltiples statements"
+    return None
+
+def paginar(consulta, params, limite, desplazamiento):
+    # Página de resultados y total de filas de cualquier consulta
+    consulta_pagina = f"{consulta} LIMIT :limite OFFSET :desplazamiento"
+    consulta_conteo = f"SELECT COUNT(*) AS total FROM ({consulta}) AS q"
+    params_pagina = {**params, 'limite': limite, 'desplazamiento': desplazamiento}
+    return (consulta_pagina, params_pagina), (consulta_conteo, params)
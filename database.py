@@ -1,5 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, Date, Time, String, DateTime  # Añadir Integer
+import hashlib
+import re
+from collections import Counter
+from itertools import chain
+import pandas as pd
+from datetime import time
+from sqlalchemy import create_engine, event, bindparam, Column, Integer, Date, Time, String, DateTime, Boolean, ForeignKey, Index, inspect, text  # Añadir Integer
 from sqlalchemy.ext.declarative import declarative_base
+from excel_processor import separar_nombres, clave_nombre
+from nombres import IndiceNombres, completitud
+from instrumentacion import instrumentar
 
 Base = declarative_base()
 
@@ -7,15 +16,681 @@ class DefensaTesis(Base):
     __tablename__ = 'defensas_tesis'
     
     id = Column(Integer, primary_key=True)  # Ahora funciona
-    fecha = Column(DateTime)
+    fecha = Column(Date, index=True)
     estudiante = Column(String(150))
-    tutores = Column(String(300))
-    presidente = Column(String(150))
-    miembro_1 = Column(String(150))
-    miembro_2 = Column(String(150))
-    oponente = Column(String(150))
-    hora = Column(String(10))
-    lugar = Column(String(100))
+    tutores = Column(String(300), index=True)
+    presidente = Column(String(150), index=True)
+    miembro_1 = Column(String(150), index=True)
+    miembro_2 = Column(String(150), index=True)
+    oponente = Column(String(150), index=True)
+    hora = Column(String(10), index=True)
+    lugar = Column(String(100), index=True)
+    archivo_origen = Column(String(255))
+    hoja_origen = Column(String(100))
+    clave = Column(String(40), unique=True)  # Hash de la clave natural: estudiante + fecha + hora
+    hash_fila = Column(String(40))  # Hash del contenido, para detectar cambios al reimportar
+    sincronizada = Column(Boolean, index=True)  # NULL mientras falten sus participaciones
+
+class Profesor(Base):
+    __tablename__ = 'profesores'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(150))  # Variante más completa (ver actualizar_canonicos)
+    nombre_clave = Column(String(150), unique=True)  # Su forma canónica (clave_nombre)
+
+class AliasProfesor(Base):
+    # Cada forma en que aparece un profesor ("J. Pérez", "Juan Peres García"),
+    # asignada a su identidad en profesores por nombres.py al importar. Las
+    # búsquedas por nombre pasan por esta tabla.
+    __tablename__ = 'alias_profesores'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(150))  # Primera forma en que apareció la variante
+    nombre_clave = Column(String(150), unique=True)
+    profesor_id = Column(Integer, ForeignKey('profesores.id'), index=True)
+
+class Participacion(Base):
+    __tablename__ = 'participaciones'
+    __table_args__ = (
+        Index('ix_participaciones_profesor_rol', 'profesor_id', 'rol', 'defensa_id'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    defensa_id = Column(Integer, ForeignKey('defensas_tesis.id', ondelete='CASCADE'), index=True)
+    profesor_id = Column(Integer, ForeignKey('profesores.id'))
+    rol = Column(String(20))
+
+class VersionDatos(Base):
+    # Contador que aumenta con cada carga; las cachés de la interfaz web lo usan como clave
+    __tablename__ = 'version_datos'
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class ResumenDefensas(Base):
+    # Defensas por fecha, hora y lugar, mantenidas en cada carga para que las
+    # estadísticas no recorran defensas_tesis. valor '' agrupa los vacíos.
+    __tablename__ = 'resumen_defensas'
+
+    dimension = Column(String(10), primary_key=True)  # 'fecha', 'hora' o 'lugar'
+    valor = Column(String(100), primary_key=True)
+    total = Column(Integer, nullable=False)
+
+class ResumenProfesor(Base):
+    # Defensas de cada profesor en cada rol
+    __tablename__ = 'resumen_profesores'
+
+    profesor_id = Column(Integer, primary_key=True)
+    rol = Column(String(20), primary_key=True)
+    total = Column(Integer, nullable=False)
+
+# Columnas de defensas_tesis que se cuentan en resumen_defensas
+DIMENSIONES_RESUMEN = ['fecha', 'hora', 'lugar']
+
+# Consultas que calculan desde cero el contenido de cada tabla de resumen
+CONSULTAS_RESUMEN = {
+    'resumen_defensas': (['dimension', 'valor', 'total'], " UNION ALL ".join(
+        f"SELECT '{columna}', COALESCE(CAST({columna} AS VARCHAR(100)), ''), COUNT(*) FROM defensas_tesis GROUP BY 2"
+        for columna in DIMENSIONES_RESUMEN
+    )),
+    'resumen_profesores': (['profesor_id', 'rol', 'total'],
+        "SELECT profesor_id, rol, COUNT(*) FROM participaciones GROUP BY profesor_id, rol"),
+}
+
+# Columnas de texto indexadas en la búsqueda de texto completo (FTS5)
+COLUMNAS_TEXTO = ['estudiante', 'tutores', 'presidente', 'miembro_1', 'miembro_2', 'oponente', 'lugar']
+
+# Rol que representa cada columna de la defensa
+ROLES = {
+    'tutores': 'tutor',
+    'presidente': 'presidente',
+    'miembro_1': 'miembro',
+    'miembro_2': 'miembro',
+    'oponente': 'oponente'
+}
+
+# Columnas que vienen del procesamiento del Excel
+COLUMNAS_DEFENSA = [
+    'fecha', 'estudiante', 'tutores', 'presidente', 'miembro_1', 'miembro_2',
+    'oponente', 'hora', 'lugar', 'archivo_origen', 'hoja_origen'
+]
+COLUMNAS_CLAVE = ['estudiante', 'fecha', 'hora']
+COLUMNAS_CONTENIDO = [
+    'fecha', 'estudiante', 'tutores', 'presidente', 'miembro_1', 'miembro_2',
+    'oponente', 'hora', 'lugar'
+]
+
+# Ajustes de SQLite aplicados a cada conexión que abre el engine
+PRAGMAS_SQLITE = {
+    'journal_mode': 'WAL',  # Los lectores (consola, web) no se bloquean mientras se carga
+    'synchronous': 'NORMAL',  # Con WAL solo se pierde la última transacción si se cae el sistema
+    'cache_size': -65536,  # 64 MB de páginas en memoria (negativo = KiB)
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # Esperar al escritor en vez de fallar con "database is locked"
+}
+
+# Por debajo de este tamaño de carga se mantienen los índices fila a fila
+UMBRAL_CARGA_MASIVA = 5000
+
+def crear_engine(url, solo_lectura=False, **opciones):
+    # Todas las aplicaciones abren la base con esta función (a través de
+    # conexiones.py) para que cada conexión tenga los mismos ajustes.
+    # opciones se pasan a create_engine (tamaño del pool, etc.).
+    engine = create_engine(url, **opciones)
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', lambda conexion_dbapi, registro: configurar_sqlite(conexion_dbapi, solo_lectura))
+    elif solo_lectura:
+        event.listen(engine, 'connect', configurar_solo_lectura)
+    return engine
+
+def configurar_sqlite(conexion_dbapi, solo_lectura=False):
+    cursor = conexion_dbapi.cursor()
+    for pragma, valor in PRAGMAS_SQLITE.items():
+        if solo_lectura and pragma == 'journal_mode':
+            continue  # Queda guardado en el archivo: lo fija la conexión de escritura
+        # En bases en memoria journal_mode queda en "memory"
+        cursor.execute(f"PRAGMA {pragma} = {valor}")
+    if solo_lectura:
+        cursor.execute("PRAGMA query_only = 1")
+    cursor.close()
+
+def configurar_solo_lectura(conexion_dbapi, registro):
+    # PostgreSQL y compatibles: transacciones de solo lectura en el pool de consultas
+    cursor = conexion_dbapi.cursor()
+    cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+    cursor.close()
+    conexion_dbapi.commit()
 
 def crear_tabla(engine):
-    Base.metadata.create_all(engine)
\ No newline at end of file
+    migrar_tabla_legada(engine)
+    with engine.begin() as conn:
+        aplicar_esquema(conn)
+
+@instrumentar()
+def aplicar_esquema(conn):
+    # Crear tablas, columnas e índices que falten. create_all no toca las
+    # tablas que ya existen, por eso columnas e índices se revisan uno a uno.
+    resumenes_nuevos = not all(inspect(conn).has_table(tabla) for tabla in CONSULTAS_RESUMEN)
+    alias_nuevos = not inspect(conn).has_table('alias_profesores')
+    Base.metadata.create_all(conn)
+    inspector = inspect(conn)
+    for tabla in Base.metadata.sorted_tables:
+        existentes = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name not in existentes:
+                tipo = columna.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"))
+        for indice in tabla.indexes:
+            indice.create(conn, checkfirst=True)
+    if alias_nuevos:
+        # Bases creadas antes de alias_profesores: cada profesor es su propia
+        # variante. Los que parecen la misma persona no se unen solos: los
+        # propone cli.py names --agrupar y se unen al confirmarlos.
+        conn.execute(text(
+            "INSERT INTO alias_profesores (nombre, nombre_clave, profesor_id) SELECT nombre, nombre_clave, id FROM profesores"
+        ))
+    if resumenes_nuevos:
+        # Bases creadas antes de las tablas de resumen
+        reconstruir_resumenes(conn)
+    if conn.dialect.name == 'sqlite':
+        crear_indice_texto(conn)
+        # Actualizar estadísticas del planificador tras cambios grandes
+        conn.execute(text("PRAGMA optimize"))
+
+def esquema_pendiente(conn):
+    # Tablas y columnas del modelo que faltan en la base ("tabla" o
+    # "tabla.columna"), sin modificarla; vacía si el esquema está al día
+    inspector = inspect(conn)
+    tablas = set(inspector.get_table_names())
+    faltan = []
+    for tabla in Base.metadata.sorted_tables:
+        if tabla.name not in tablas:
+            faltan.append(tabla.name)
+            continue
+        existentes = {columna['name'] for columna in inspector.get_columns(tabla.name)}
+        faltan.extend(f"{tabla.name}.{columna.name}" for columna in tabla.columns if columna.name not in existentes)
+    return faltan
+
+def texto_completo_disponible(conn):
+    # Solo SQLite con FTS5; sin él las búsquedas de texto usan LIKE (consultas.py)
+    return conn.dialect.name == 'sqlite' and conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'defensas_fts'")
+    ).first() is not None
+
+def crear_indice_texto(conn):
+    # Tabla FTS5 de contenido externo sobre defensas_tesis, mantenida por
+    # triggers. remove_diacritics permite buscar "perez" y encontrar "Pérez".
+    if texto_completo_disponible(conn):
+        return
+    if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        return  # SQLite compilado sin FTS5
+    columnas = ', '.join(COLUMNAS_TEXTO)
+    nuevos = ', '.join(f"new.{columna}" for columna in COLUMNAS_TEXTO)
+    viejos = ', '.join(f"old.{columna}" for columna in COLUMNAS_TEXTO)
+    conn.execute(text(f"""
+        CREATE VIRTUAL TABLE defensas_fts USING fts5(
+            {columnas},
+            content='defensas_tesis', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER defensas_fts_insertar AFTER INSERT ON defensas_tesis BEGIN
+            INSERT INTO defensas_fts(rowid, {columnas}) VALUES (new.id, {nuevos});
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER defensas_fts_borrar AFTER DELETE ON defensas_tesis BEGIN
+            INSERT INTO defensas_fts(defensas_fts, rowid, {columnas}) VALUES ('delete', old.id, {viejos});
+        END
+    """))
+    # Solo cuando cambian columnas de texto (no al marcar sincronizada)
+    conn.execute(text(f"""
+        CREATE TRIGGER defensas_fts_actualizar AFTER UPDATE OF {columnas} ON defensas_tesis BEGIN
+            INSERT INTO defensas_fts(defensas_fts, rowid, {columnas}) VALUES ('delete', old.id, {viejos});
+            INSERT INTO defensas_fts(rowid, {columnas}) VALUES (new.id, {nuevos});
+        END
+    """))
+    # Indexar las filas que ya existían
+    conn.execute(text("INSERT INTO defensas_fts(defensas_fts) VALUES ('rebuild')"))
+
+def indices_carga():
+    # Índices que se pueden quitar durante una carga masiva. Se conservan los
+    # que usa la propia carga: la clave única (ON CONFLICT), sincronizada y
+    # participaciones.defensa_id (sincronizar_participaciones).
+    return [indice for indice in DefensaTesis.__table__.indexes if 'sincronizada' not in indice.columns] + [
+        indice for indice in Participacion.__table__.indexes if indice.name == 'ix_participaciones_profesor_rol'
+    ]
+
+def quitar_indices(conn):
+    # Antes de una carga grande: construir los índices una vez al final
+    # (aplicar_esquema) es más rápido que actualizarlos con cada fila. Dentro
+    # de la transacción de la carga, así que un error los deja como estaban.
+    if conn.dialect.name == 'sqlite':
+        for trigger in ['defensas_fts_insertar', 'defensas_fts_borrar', 'defensas_fts_actualizar']:
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS defensas_fts"))
+    for indice in indices_carga():
+        indice.drop(conn, checkfirst=True)
+
+def plan_consulta(conn, consulta, params=None):
+    # Detalle de EXPLAIN QUERY PLAN (solo SQLite)
+    filas = conn.execute(text(f"EXPLAIN QUERY PLAN {consulta}"), params or {}).fetchall()
+    return [fila[-1] for fila in filas]
+
+def verificar_indices(engine):
+    # Comprobar que las búsquedas por fecha, lugar, hora y profesor buscan
+    # por índice (SEARCH) y no recorren una tabla completa (SCAN)
+    consultas = {
+        'fecha': ("SELECT * FROM defensas_tesis WHERE fecha = :valor", {'valor': '2025-01-01'}),
+        'lugar': ("SELECT * FROM defensas_tesis WHERE lugar = :valor", {'valor': 'Aula'}),
+        'hora': ("SELECT * FROM defensas_tesis WHERE fecha = :fecha AND hora = :hora", {'fecha': '2025-01-01', 'hora': '09:00'}),
+        # La forma de consultas.filtro_profesor con exacto=True
+        'profesor': (
+            "SELECT * FROM defensas_tesis WHERE id IN (SELECT pa.defensa_id FROM participaciones pa "
+            "WHERE pa.profesor_id IN (SELECT profesor_id FROM alias_profesores WHERE nombre_clave = :valor) AND pa.rol = :rol)",
+            {'valor': 'juan perez', 'rol': 'tutor'}
+        ),
+    }
+    resultado = {}
+    with engine.connect() as conn:
+        for nombre, (consulta, params) in consultas.items():
+            detalle = plan_consulta(conn, consulta, params)
+            resultado[nombre] = not any(paso.startswith('SCAN') for paso in detalle)
+    return resultado
+
+def migrar_tabla_legada(engine):
+    # Las bases creadas con to_sql(if_exists='replace') no tienen id ni clave:
+    # se renombra la tabla vieja, se crea la del modelo y se copian las filas
+    inspector = inspect(engine)
+    if not inspector.has_table('defensas_tesis'):
+        return
+    columnas = {columna['name'] for columna in inspector.get_columns('defensas_tesis')}
+    if 'clave' in columnas:
+        return
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS defensas_tesis_legado"))
+        conn.execute(text("ALTER TABLE defensas_tesis RENAME TO defensas_tesis_legado"))
+        aplicar_esquema(conn)
+        lotes = pd.read_sql_query(text("SELECT * FROM defensas_tesis_legado"), conn, chunksize=5000)
+        cargar_lotes(conn, lotes)
+        sincronizar_participaciones(conn)
+        reconstruir_resumenes(conn)
+        conn.execute(text("DROP TABLE defensas_tesis_legado"))
+
+def formatear_hora(hora):
+    # Hora guardada como "HH:MM"; acepta objetos time o textos ya normalizados
+    if isinstance(hora, time):
+        return hora.strftime("%H:%M")
+    if isinstance(hora, str) and len(hora) >= 5 and hora[2] == ':' and hora[:2].isdigit() and hora[3:5].isdigit():
+        return hora[:5]
+    return None
+
+def calcular_hash(valores):
+    texto = "\x1f".join("" if pd.isna(valor) else str(valor) for valor in valores)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+def calcular_hashes(textos, columnas):
+    # calcular_hash de cada fila a partir de las columnas ya convertidas a texto
+    return [hashlib.sha1("\x1f".join(fila).encode("utf-8")).hexdigest() for fila in zip(*(textos[columna] for columna in columnas))]
+
+def preparar_defensas(df):
+    # Convertir tipos al formato guardado: fecha como date y hora como "HH:MM",
+    # y calcular la clave natural y el hash de contenido de cada fila
+    df = df.reindex(columns=COLUMNAS_DEFENSA).astype(object)
+    df['fecha'] = pd.to_datetime(df['fecha']).dt.date
+    df['hora'] = df['hora'].map(formatear_hora)
+    df = df.astype(object).where(df.notna(), None)
+    # Cada columna se pasa a texto una sola vez para las dos claves
+    textos = {columna: ["" if valor is None else str(valor) for valor in df[columna].tolist()] for columna in COLUMNAS_CONTENIDO}
+    df['clave'] = calcular_hashes(textos, COLUMNAS_CLAVE)
+    df['hash_fila'] = calcular_hashes(textos, COLUMNAS_CONTENIDO)
+    return df
+
+# Literales de texto o identificadores entre comillas, o un marcador "?"
+PATRON_MARCADOR = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\?")
+
+def sentencia_driver(sentencia, paramstyle):
+    # Pasa los marcadores "?" al estilo del driver. Solo se cambian los que
+    # están fuera de comillas; con format/pyformat (psycopg2, MySQL) los "%"
+    # de los literales se duplican para que el driver no los lea como marcas.
+    if paramstyle == 'qmark':
+        return sentencia
+    if paramstyle not in ('format', 'pyformat'):
+        raise ValueError(f"Estilo de parámetros no soportado: {paramstyle}")
+    return PATRON_MARCADOR.sub(lambda m: '%s' if m[0] == '?' else m[0].replace('%', '%%'), sentencia)
+
+def ejecutar_muchos(conn, sentencia, filas):
+    # executemany del driver con una sentencia preparada una vez y parámetros
+    # posicionales ("?"), sin el procesamiento por fila de SQLAlchemy
+    return conn.exec_driver_sql(sentencia_driver(sentencia, conn.dialect.paramstyle), filas)
+
+@instrumentar(filas=lambda resumen: resumen['procesadas'])
+def guardar_defensas(engine, lotes, reemplazar=False, masiva=None, filas_esperadas=None):
+    # Carga incremental e idempotente en una sola transacción. Con
+    # reemplazar=True se vacía la tabla antes de cargar. masiva=True/False
+    # fuerza o evita quitar los índices durante la carga (None: automático).
+    # filas_esperadas es el total de filas que traerán los lotes, si el
+    # llamador lo sabe de antemano (ej. un archivo ya leído).
+    with engine.begin() as conn:
+        if reemplazar:
+            conn.execute(Participacion.__table__.delete())
+            conn.execute(DefensaTesis.__table__.delete())
+        # Si lo que llega es al menos tanto como lo que hay, los índices se
+        # quitan durante la carga y aplicar_esquema los reconstruye al final.
+        # Los lotes pueden ser un generador que se lee una sola vez: sin
+        # filas_esperadas se decide con el tamaño del primer lote, así que
+        # muchos lotes pequeños se cargan con los índices puestos.
+        lotes = iter(lotes)
+        primero = next(lotes, None)
+        if primero is not None:
+            lotes = chain([primero], lotes)
+            if masiva is None:
+                filas_actuales = conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar()
+                masiva = max(len(primero), filas_esperadas or 0) >= max(UMBRAL_CARGA_MASIVA, filas_actuales)
+            if masiva:
+                quitar_indices(conn)
+        # Los resúmenes se recalculan enteros tras un reemplazo o una carga
+        # masiva; en las demás se suman solo las diferencias de lo cargado
+        if reemplazar or masiva:
+            resumen = cargar_lotes(conn, lotes)
+            # Sin el índice de participaciones por profesor (o tras vaciar la
+            # tabla) los profesores sin defensas se buscan en una sola pasada
+            sincronizar_participaciones(conn, limpiar=False)
+            quitar_profesores_sin_defensas(conn)
+            reconstruir_resumenes(conn)
+        else:
+            cambios_defensas, cambios_profesores = Counter(), Counter()
+            resumen = cargar_lotes(conn, lotes, cambios_defensas)
+            sincronizar_participaciones(conn, cambios=cambios_profesores)
+            aplicar_cambios_resumen(conn, cambios_defensas, cambios_profesores)
+        aplicar_esquema(conn)
+        incrementar_version(conn)
+    return resumen
+
+def leer_por_lotes(engine, consulta, params=None, tamano_lote=5000):
+    # Resultado de una consulta en DataFrames de tamano_lote filas, pidiendo
+    # las filas al cursor según se consumen en lugar de cargarlas todas
+    with engine.connect().execution_options(stream_results=True) as conn:
+        yield from pd.read_sql(text(consulta), conn, params=params or {}, chunksize=tamano_lote, coerce_float=False)
+
+def incrementar_version(conn):
+    if conn.execute(text("UPDATE version_datos SET version = version + 1 WHERE id = 1")).rowcount == 0:
+        conn.execute(text("INSERT INTO version_datos (id, version) VALUES (1, 1)"))
+
+def leer_version(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT version FROM version_datos WHERE id = 1")).scalar() or 0
+
+@instrumentar(filas=lambda resumen: resumen['procesadas'])
+def cargar_lotes(conn, lotes, cambios=None):
+    # Cada lote se escribe con un INSERT ... ON CONFLICT(clave) DO UPDATE
+    # ejecutado con executemany, que solo reescribe las filas cuyo hash de
+    # contenido cambió. Con cambios (Counter) se acumulan las diferencias
+    # para resumen_defensas.
+    columnas = COLUMNAS_DEFENSA + ['clave', 'hash_fila']
+    actualizar = ', '.join(f"{columna} = excluded.{columna}" for columna in COLUMNAS_DEFENSA + ['hash_fila'])
+    sentencia = (
+        f"INSERT INTO defensas_tesis ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))}) "
+        f"ON CONFLICT (clave) DO UPDATE SET {actualizar}, sincronizada = NULL "
+        f"WHERE defensas_tesis.hash_fila != excluded.hash_fila"
+    )
+    procesadas = modificadas = 0
+    filas_antes = conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar()
+    for lote in lotes:
+        if lote.empty:
+            continue
+        df = preparar_defensas(lote)
+        # Fecha en texto ISO, como la guarda el tipo Date de SQLAlchemy en SQLite
+        df['fecha'] = [None if fecha is None else fecha.isoformat() for fecha in df['fecha']]
+        filas = list(zip(*(df[columna].tolist() for columna in columnas)))
+        if cambios is not None:
+            contar_cambios(conn, df, cambios)
+        modificadas += ejecutar_muchos(conn, sentencia, filas).rowcount
+        procesadas += len(filas)
+    insertadas = conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar() - filas_antes
+    return {
+        'procesadas': procesadas,
+        'insertadas': insertadas,
+        'actualizadas': modificadas - insertadas,
+        'sin_cambios': procesadas - modificadas
+    }
+
+def valor_resumen(valor):
+    return '' if valor is None else str(valor)
+
+def sumar_resumen(cambios, valores, signo):
+    for dimension, valor in zip(DIMENSIONES_RESUMEN, valores):
+        cambios[(dimension, valor_resumen(valor))] += signo
+
+def seleccionar_en(conn, consulta, valores, tamano_lote=5000):
+    # Filas de una consulta con "IN :valores", en bloques para no superar el
+    # máximo de parámetros por sentencia
+    consulta = text(consulta).bindparams(bindparam('valores', expanding=True))
+    for inicio in range(0, len(valores), tamano_lote):
+        yield from conn.execute(consulta, {'valores': valores[inicio:inicio + tamano_lote]})
+
+def contar_cambios(conn, df, cambios):
+    # Diferencias que deja el upsert de un lote ya preparado: +1 por cada
+    # defensa nueva y, si una existente cambió, -1 para su versión anterior y
+    # +1 para la nueva. Se recorre en orden, como lo aplica executemany, para
+    # que una misma clave repetida en el lote se cuente como actualización.
+    anteriores = {
+        clave: (hash_fila, fecha, hora, lugar)
+        for clave, hash_fila, fecha, hora, lugar in seleccionar_en(
+            conn, "SELECT clave, hash_fila, fecha, hora, lugar FROM defensas_tesis WHERE clave IN :valores",
+            df['clave'].tolist()
+        )
+    }
+    columnas = ['clave', 'hash_fila'] + DIMENSIONES_RESUMEN
+    for clave, hash_fila, *valores in zip(*(df[columna].tolist() for columna in columnas)):
+        anterior = anteriores.get(clave)
+        if anterior is not None:
+            if anterior[0] == hash_fila:
+                continue
+            sumar_resumen(cambios, anterior[1:], -1)
+        sumar_resumen(cambios, valores, 1)
+        anteriores[clave] = (hash_fila, *valores)
+
+def aplicar_cambios_resumen(conn, cambios_defensas, cambios_profesores):
+    for tabla, clave, cambios in [
+        ('resumen_defensas', 'dimension, valor', cambios_defensas),
+        ('resumen_profesores', 'profesor_id, rol', cambios_profesores),
+    ]:
+        filas = [(*clave_resumen, total) for clave_resumen, total in cambios.items() if total]
+        if filas:
+            ejecutar_muchos(conn,
+                f"INSERT INTO {tabla} ({clave}, total) VALUES (?, ?, ?) "
+                f"ON CONFLICT ({clave}) DO UPDATE SET total = {tabla}.total + excluded.total",
+                filas
+            )
+        conn.execute(text(f"DELETE FROM {tabla} WHERE total <= 0"))
+
+def reconstruir_resumenes(conn):
+    for tabla, (columnas, consulta) in CONSULTAS_RESUMEN.items():
+        conn.execute(text(f"DELETE FROM {tabla}"))
+        conn.execute(text(f"INSERT INTO {tabla} ({', '.join(columnas)}) {consulta}"))
+
+def diferencias_resumenes(conn):
+    # Filas de cada tabla de resumen que no coinciden con lo calculado desde cero
+    diferencias = {}
+    for tabla, (columnas, consulta) in CONSULTAS_RESUMEN.items():
+        guardadas = set(map(tuple, conn.execute(text(f"SELECT {', '.join(columnas)} FROM {tabla}"))))
+        calculadas = set(map(tuple, conn.execute(text(consulta))))
+        diferencias[tabla] = len(guardadas ^ calculadas)
+    return diferencias
+
+def verificar_resumenes(engine, reparar=False):
+    # Comprobación de consistencia (p. ej. tras editar la base a mano); con
+    # reparar=True se reconstruyen los resúmenes si no coinciden
+    with engine.begin() as conn:
+        diferencias = diferencias_resumenes(conn)
+        if reparar and any(diferencias.values()):
+            reconstruir_resumenes(conn)
+            incrementar_version(conn)
+    return diferencias
+
+@instrumentar(filas=lambda sincronizadas: sincronizadas)
+def sincronizar_participaciones(conn, tamano_lote=5000, cambios=None, limpiar=True):
+    # Separar los nombres de las defensas nuevas o modificadas en profesores y
+    # participaciones. Solo se procesan las filas con sincronizada a NULL, así
+    # que el trabajo crece con lo que cambió y no con el tamaño de la tabla.
+    # Con cambios (Counter) se acumulan las diferencias para resumen_profesores.
+    # limpiar=False deja al llamador quitar los profesores sin defensas.
+    # Devuelve el número de defensas sincronizadas.
+    sincronizadas = 0
+    tocados = set()  # Profesores de las participaciones que se reemplazan
+    alias = dict(conn.execute(text("SELECT nombre_clave, profesor_id FROM alias_profesores")).fetchall())
+    indice = None  # Índice de nombres.py, solo si aparece alguna variante nueva
+    columnas = ', '.join(ROLES)
+    while True:
+        pendientes = conn.execute(text(
+            f"SELECT id, {columnas} FROM defensas_tesis WHERE sincronizada IS NULL LIMIT :limite"
+        ), {'limite': tamano_lote}).fetchall()
+        if not pendientes:
+            break
+        sincronizadas += len(pendientes)
+
+        # (defensa, clave del profesor, rol), separando cada celda una sola vez
+        nombres = []
+        nuevos = {}
+        for fila in pendientes:
+            for columna, rol in ROLES.items():
+                for nombre in separar_nombres(getattr(fila, columna)):
+                    clave = clave_nombre(nombre)
+                    if clave:
+                        nombres.append((fila.id, clave, rol))
+                        if clave not in alias:
+                            nuevos.setdefault(clave, nombre)
+        if nuevos:
+            indice = indice or IndiceNombres(alias)
+            alias.update(registrar_variantes(conn, indice, nuevos))
+
+        ids = [(fila.id,) for fila in pendientes]
+        participaciones = {(defensa_id, alias[clave], rol) for defensa_id, clave, rol in nombres}
+        for profesor_id, rol in seleccionar_en(
+            conn, "SELECT profesor_id, rol FROM participaciones WHERE defensa_id IN :valores", [fila.id for fila in pendientes]
+        ):
+            tocados.add(profesor_id)
+            if cambios is not None:
+                cambios[(profesor_id, rol)] -= 1
+        if cambios is not None:
+            for _, profesor_id, rol in participaciones:
+                cambios[(profesor_id, rol)] += 1
+        ejecutar_muchos(conn, "DELETE FROM participaciones WHERE defensa_id = ?", ids)
+        if participaciones:
+            ejecutar_muchos(conn, "INSERT INTO participaciones (defensa_id, profesor_id, rol) VALUES (?, ?, ?)", list(participaciones))
+        ejecutar_muchos(conn, "UPDATE defensas_tesis SET sincronizada = TRUE WHERE id = ?", ids)
+
+    # Solo los profesores de las participaciones quitadas pueden haberse quedado sin defensas
+    if limpiar:
+        quitar_profesores_sin_defensas(conn, tocados)
+    return sincronizadas
+
+def quitar_profesores_sin_defensas(conn, ids=None):
+    # Borra los profesores (y sus variantes) que ya no participan en ninguna
+    # defensa. Con ids solo se revisan esos, por el índice de participaciones;
+    # sin ids se recorre la tabla entera (tras vaciarla con reemplazar).
+    if ids is None:
+        conn.execute(text(
+            "DELETE FROM alias_profesores WHERE profesor_id NOT IN (SELECT profesor_id FROM participaciones)"
+        ))
+        conn.execute(text(
+            "DELETE FROM profesores WHERE id NOT IN (SELECT profesor_id FROM participaciones)"
+        ))
+        return
+    sin_defensas = [(profesor_id,) for profesor_id, in seleccionar_en(conn,
+        "SELECT id FROM profesores p WHERE id IN :valores "
+        "AND NOT EXISTS (SELECT 1 FROM participaciones pa WHERE pa.profesor_id = p.id)", list(ids)
+    )]
+    if sin_defensas:
+        ejecutar_muchos(conn, "DELETE FROM alias_profesores WHERE profesor_id = ?", sin_defensas)
+        ejecutar_muchos(conn, "DELETE FROM profesores WHERE id = ?", sin_defensas)
+
+def registrar_variantes(conn, indice, nuevos):
+    # Asigna cada variante nueva ({clave: nombre tal como apareció}) al
+    # profesor de una variante parecida o a un profesor nuevo y la guarda en
+    # alias_profesores. Devuelve {clave: id del profesor}.
+    asignacion = indice.asignar(nuevos)
+    representantes = sorted({identidad for identidad in asignacion.values() if isinstance(identidad, str)})
+    if representantes:
+        ejecutar_muchos(conn, "INSERT INTO profesores (nombre, nombre_clave) VALUES (?, ?)", [
+            (nuevos[clave], clave) for clave in representantes
+        ])
+        ids = dict(seleccionar_en(conn, "SELECT nombre_clave, id FROM profesores WHERE nombre_clave IN :valores", representantes))
+        asignacion = {clave: ids.get(identidad, identidad) for clave, identidad in asignacion.items()}
+        for clave, profesor_id in asignacion.items():
+            indice.agregar(clave, profesor_id)
+    ejecutar_muchos(conn, "INSERT INTO alias_profesores (nombre, nombre_clave, profesor_id) VALUES (?, ?, ?)", [
+        (nuevos[clave], clave, profesor_id) for clave, profesor_id in asignacion.items()
+    ])
+    # Una variante más completa de un profesor ya registrado pasa a ser su nombre
+    actualizar_canonicos(conn, {
+        profesor_id for clave, profesor_id in asignacion.items() if clave not in representantes
+    })
+    return asignacion
+
+def actualizar_canonicos(conn, ids):
+    # El nombre de cada profesor es su variante más completa (más palabras
+    # enteras y más larga): "Juan Pérez García" antes que "J. Pérez"
+    mejores = {}
+    for profesor_id, nombre, clave in seleccionar_en(
+        conn, "SELECT profesor_id, nombre, nombre_clave FROM alias_profesores WHERE profesor_id IN :valores", list(ids)
+    ):
+        if profesor_id not in mejores or completitud(clave) > completitud(mejores[profesor_id][1]):
+            mejores[profesor_id] = (nombre, clave)
+    if mejores:
+        ejecutar_muchos(conn, "UPDATE profesores SET nombre = ?, nombre_clave = ? WHERE id = ?", [
+            (nombre, clave, profesor_id) for profesor_id, (nombre, clave) in mejores.items()
+        ])
+
+def unir_profesores(conn, uniones, canonicos=True):
+    # {id: id destino}: las participaciones y variantes de cada profesor pasan
+    # al destino. Con canonicos=False el destino conserva su nombre (uniones
+    # hechas a mano). Hay que reconstruir resumen_profesores después.
+    pares = [(destino, origen) for origen, destino in uniones.items()]
+    ejecutar_muchos(conn, "UPDATE participaciones SET profesor_id = ? WHERE profesor_id = ?", pares)
+    ejecutar_muchos(conn, "UPDATE alias_profesores SET profesor_id = ? WHERE profesor_id = ?", pares)
+    ejecutar_muchos(conn, "DELETE FROM profesores WHERE id = ?", [(origen,) for origen in uniones])
+    # Una defensa con dos variantes del mismo profesor en un rol queda con una participación
+    conn.execute(text(
+        "DELETE FROM participaciones WHERE id NOT IN "
+        "(SELECT MIN(id) FROM participaciones GROUP BY defensa_id, profesor_id, rol)"
+    ))
+    if canonicos:
+        actualizar_canonicos(conn, set(uniones.values()))
+
+def candidatos_agrupar(conn):
+    # Vuelve a agrupar todas las variantes registradas sin tocar la base.
+    # Devuelve {id: id destino} con los profesores que parecen ser otro.
+    alias = dict(conn.execute(text("SELECT nombre_clave, profesor_id FROM alias_profesores")).fetchall())
+    return IndiceNombres().agrupar(alias)
+
+def agrupar_profesores(conn, uniones=None):
+    # Une los profesores de uniones (por defecto, candidatos_agrupar).
+    # Devuelve cuántos se unieron.
+    uniones = candidatos_agrupar(conn) if uniones is None else uniones
+    if uniones:
+        unir_profesores(conn, uniones)
+    return len(uniones)
+
+def separar_variante(conn, clave):
+    # Deshace una unión equivocada: la variante pasa a ser un profesor nuevo
+    # y las defensas de su profesor anterior se vuelven a sincronizar, así las
+    # celdas con esa variante se asignan al nuevo. Hay que reconstruir
+    # resumen_profesores después. Devuelve (id anterior, id nuevo).
+    nombre, anterior = conn.execute(text(
+        "SELECT nombre, profesor_id FROM alias_profesores WHERE nombre_clave = :clave"
+    ), {'clave': clave}).one()
+    # Sin nombre_clave hasta que actualizar_canonicos se lo dé: la variante
+    # puede ser todavía la forma canónica del anterior (única)
+    nuevo = conn.execute(Profesor.__table__.insert().values(nombre=nombre)).inserted_primary_key[0]
+    conn.execute(text("UPDATE alias_profesores SET profesor_id = :nuevo WHERE nombre_clave = :clave"), {'nuevo': nuevo, 'clave': clave})
+    conn.execute(text(
+        "UPDATE defensas_tesis SET sincronizada = NULL "
+        "WHERE id IN (SELECT defensa_id FROM participaciones WHERE profesor_id = :anterior)"
+    ), {'anterior': anterior})
+    sincronizar_participaciones(conn)
+    actualizar_canonicos(conn, {anterior})
+    actualizar_canonicos(conn, {nuevo})
+    return anterior, nuevo
@@ -0,0 +1,55 @@
+# datos.py
+import tempfile
+import pandas as pd
+import streamlit as st
+from sqlalchemy import text
+from database import leer_version
+from conexiones import obtener_base, normalizar_url
+from trabajos import GestorTrabajos
+from instrumentacion import medir, instrumentar
+
+URL_BD = normalizar_url()  # DEFENSAS_BD o defensas.db
+
+# Capa de acceso a datos de la interfaz web. Streamlit vuelve a ejecutar gui.py
+# en cada interacción: los engines (uno de escritura y otro de lectura, ver
+# conexiones.py) se crean una sola vez por proceso y los comparten todas las
+# sesiones, y los resultados se guardan en caché con la versión de la tabla
+# como parte de la clave, de modo que solo se vuelven a leer cuando una carga
+# la incrementa.
+
+@st.cache_resource
+def obtener_base_datos(url=URL_BD):
+    return obtener_base(url)
+
+@st.cache_resource
+def obtener_gestor():
+    # Un gestor de trabajos por proceso: un archivo subido en varias sesiones se procesa una vez
+    return GestorTrabajos()
+
+def version_actual(url=URL_BD):
+    # Única consulta que se hace en cada ejecución del script
+    return leer_version(obtener_base_datos(url).lectura)
+
+@st.cache_data(show_spinner=False)
+@instrumentar("consulta_web", filas=len)
+def consultar(url, version, consulta, params=None):
+    # Solo se ejecuta (y se mide) cuando el resultado no está en caché
+    return pd.read_sql(text(consulta), obtener_base_datos(url).lectura, params=params or {})
+
+def generar_csv(url, consulta, params=None, tamano_lote=5000):
+    # Exportación completa, leída por lotes y escrita lote a lote en un
+    # archivo temporal: en memoria solo hay un lote a la vez. gui.py la pasa
+    # como función a st.download_button, que solo la llama al pulsar el botón.
+    archivo = tempfile.TemporaryFile(buffering=0)  # FileIO, que download_button lee entero al servirlo
+    with obtener_base_datos(url).lectura.connect() as conn, medir("generar_csv") as tramo:
+        lotes = pd.read_sql(text(consulta), conn, params=params or {}, chunksize=tamano_lote)
+        tramo.filas = 0
+        for numero, lote in enumerate(lotes):
+            archivo.write(lote.to_csv(index=False, header=numero == 0).encode('utf-8'))
+            tramo.filas += len(lote)
+    archivo.seek(0)
+    return archivo
+
+def limpiar_cache():
+    # Para cambios hechos fuera de la aplicación (p. ej. DB Browser)
+    consultar.clear()
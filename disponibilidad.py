@@ -0,0 +1,104 @@
+# disponibilidad.py
+from collections import defaultdict
+from sqlalchemy import text
+from excel_processor import clave_nombre
+from consultas import calificar_tablas
+
+class MotorDisponibilidad:
+    # Ocupación de cada profesor en memoria como un mapa de bits por día: el bit
+    # i indica que el profesor tiene una defensa en la franja horaria i. Las
+    # franjas libres de uno o varios profesores se obtienen con OR / AND / NOT.
+
+    def __init__(self, franjas, dias, profesores, ocupacion, variantes=None):
+        self.franjas = franjas  # Horas "HH:MM" ordenadas
+        self.dias = dias  # Fechas ISO con al menos una defensa, ordenadas
+        self.profesores = profesores  # id -> (nombre, nombre_clave)
+        self.ocupacion = ocupacion  # id -> {fecha: máscara}
+        # Pares (variante del nombre según clave_nombre, id); sin variantes, la canónica
+        self.variantes = variantes or [(clave, id_) for id_, (_, clave) in profesores.items()]
+        self.todas = (1 << len(franjas)) - 1
+
+    @classmethod
+    def desde_bd(cls, conn, franjas=None, esquemas=None):
+        # Sin franjas se usan las horas que aparecen en la tabla; con franjas
+        # propias se ignoran las defensas que caen fuera de ellas. esquemas son
+        # bases adjuntas a conn (ATTACH) cuya ocupación se reúne.
+        return cls.desde_fuentes([(conn, esquema) for esquema in esquemas or [None]], franjas)
+
+    @classmethod
+    def desde_fuentes(cls, fuentes, franjas=None):
+        # fuentes: pares (conexión, esquema), con esquema None para la base de
+        # la propia conexión. Con bases adjuntas cada base numera a sus
+        # profesores, así que el id pasa a ser el nombre_clave canónico: el
+        # mismo profesor en varias bases es un solo id y su ocupación se une.
+        def leer(conn, esquema, consulta):
+            return conn.execute(text(calificar_tablas(consulta, esquema) if esquema else consulta))
+
+        canonicos = {}  # (esquema, id) -> nombre_clave
+
+        def clave(esquema, id_):
+            return id_ if esquema is None else canonicos[(esquema, id_)]
+
+        if franjas is None:
+            franjas = sorted({
+                fila[0] for conn, esquema in fuentes
+                for fila in leer(conn, esquema, "SELECT DISTINCT substr(hora, 1, 5) FROM defensas_tesis WHERE hora IS NOT NULL")
+            })
+        indice = {franja: posicion for posicion, franja in enumerate(franjas)}
+        dias = sorted({
+            str(fila[0]) for conn, esquema in fuentes
+            for fila in leer(conn, esquema, "SELECT DISTINCT fecha FROM defensas_tesis WHERE fecha IS NOT NULL")
+        })
+        profesores = {}
+        variantes = []
+        ocupacion = defaultdict(lambda: defaultdict(int))
+        for conn, esquema in fuentes:
+            for fila in leer(conn, esquema, "SELECT id, nombre, nombre_clave FROM profesores"):
+                canonicos[(esquema, fila.id)] = fila.nombre_clave
+                profesores.setdefault(clave(esquema, fila.id), (fila.nombre, fila.nombre_clave))
+            for fila in leer(conn, esquema, "SELECT nombre_clave, profesor_id FROM alias_profesores"):
+                variantes.append((fila.nombre_clave, clave(esquema, fila.profesor_id)))
+            filas = leer(conn, esquema, """
+                SELECT DISTINCT pa.profesor_id, d.fecha, substr(d.hora, 1, 5) AS hora
+                FROM participaciones pa
+                JOIN defensas_tesis d ON d.id = pa.defensa_id
+                WHERE d.fecha IS NOT NULL AND d.hora IS NOT NULL
+            """)
+            for profesor_id, fecha, hora in filas:
+                if hora in indice:
+                    ocupacion[clave(esquema, profesor_id)][str(fecha)] |= 1 << indice[hora]
+        return cls(franjas, dias, profesores, ocupacion, list(dict.fromkeys(variantes)))
+
+    def buscar_profesores(self, nombre):
+        # Ids con alguna variante del nombre que contiene el texto (sin tildes ni títulos)
+        patron = clave_nombre(nombre)
+        if not patron:
+            return []
+        return list(dict.fromkeys(id_ for clave, id_ in self.variantes if patron in clave))
+
+    def dias_de(self, ids):
+        return sorted({fecha for id_ in ids for fecha in self.ocupacion.get(id_, {})})
+
+    def mascara_ocupada(self, ids, fecha):
+        mascara = 0
+        for id_ in ids:
+            mascara |= self.ocupacion.get(id_, {}).get(fecha, 0)
+        return mascara
+
+    def libres(self, ids, dias=None):
+        # {fecha: máscara de franjas libres para todos los ids}. Sin dias se
+        # usan todas las fechas del calendario.
+        return {fecha: self.todas & ~self.mascara_ocupada(ids, fecha) for fecha in (dias or self.dias)}
+
+    def primer_dia_libre(self, ids, desde=None, franjas_minimas=1):
+        # Primera fecha en la que todos tienen al menos franjas_minimas franjas libres en común
+        for fecha in self.dias:
+            if desde and fecha < str(desde):
+                continue
+            libres = self.todas & ~self.mascara_ocupada(ids, fecha)
+            if bin(libres).count("1") >= franjas_minimas:
+                return fecha, self.horas(libres)
+        return None, []
+
+    def horas(self, mascara):
+        return [franja for posicion, franja in enumerate(self.franjas) if mascara >> posicion & 1]
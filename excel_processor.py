@@ -1,69 +1,213 @@
 import pandas as pd
+import numpy as np
 import re
+import os
+import sys
+import glob
+import unicodedata
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, time
+from itertools import islice
+from openpyxl import load_workbook
+from instrumentacion import medir, instrumentar
 
+COLUMNAS_ENCABEZADO = ["Estudiantes", "Tutor", "Presidente", "Miembro", "Miembro2", "Oponente", "Fecha", "Hora", "Lugar"]
+PATRON_FECHA = re.compile(r"\d{1,2} de \w+ \d{4}")
+PATRON_HORA = re.compile(r"(\d{1,2}):(\d{1,2})(?::(\d{2}))?")
+PATRON_MENCION = re.compile(r"@\w+")
+PATRON_SEPARADOR_NOMBRES = re.compile(r"\s*(?:[,;/\n]|\s+y\s+|\s+e\s+)\s*")
+TITULOS = {'dr', 'dra', 'drc', 'msc', 'mcs', 'mc', 'lic', 'ing', 'prof', 'profa', 'phd', 'ms'}
+TAMANO_CACHE = 8192  # Valores distintos que recuerda cada normalizador
+MESES = {
+    'enero': '01', 'febrero': '02', 'marzo': '03',
+    'abril': '04', 'mayo': '05', 'junio': '06',
+    'julio': '07', 'agosto': '08', 'septiembre': '09',
+    'octubre': '10', 'noviembre': '11', 'diciembre': '12'
+}
+
+@instrumentar(filas=len)
 def procesar_excel(file_path):
     # Leer el archivo crudo manteniendo estructura original
-    df_raw = pd.read_excel(file_path, header=None)
-    
-    # Variables para almacenar datos procesados
-    data = []
-    current_date = None
-    headers = ["Estudiantes", "Tutor", "Presidente", "Miembro", "Miembro2", "Oponente", "Fecha", "Hora", "Lugar"]
-    
-    for index, row in df_raw.iterrows():
-        # Detectar filas con fechas (ej: "26 de febrero 2025")
-        if re.match(r"\d{1,2} de \w+ \d{4}", str(row[1])):
-            try:
-                current_date = datetime.strptime(row[1], "%d de %B %Y").date()
-            except:
-                # Plan B: Mapeo manual de meses en español
-                meses = {
-                    'enero': '01', 'febrero': '02', 'marzo': '03',
-                    'abril': '04', 'mayo': '05', 'junio': '06',
-                    'julio': '07', 'agosto': '08', 'septiembre': '09',
-                    'octubre': '10', 'noviembre': '11', 'diciembre': '12'
-                }
-                
-                fecha_partes = row[1].split()
-                mes = fecha_partes[2].lower()
-                fecha_formateada = f"{fecha_partes[0]} {meses[mes]} {fecha_partes[3]}"
-                current_date = datetime.strptime(fecha_formateada, "%d %m %Y").date()
-            
-            continue
-        
-        # Detectar filas de encabezado
-        if list(row[1:10].dropna()) == headers:
-            continue
-        
-        # Capturar filas de datos válidas
-        if current_date and len(row[1:9].dropna()) >= 7:
-            datos = {
-                "fecha": current_date if pd.notnull(current_date) else None,
-                "estudiante": row[1],
-                "tutores": limpiar_nombres(row[2]),
-                "presidente": limpiar_nombres(row[3]),
-                "miembro_1": limpiar_nombres(row[4]),
-                "miembro_2": limpiar_nombres(row[5]),
-                "oponente": limpiar_nombres(row[6]),
-                "hora": normalizar_hora(row[8]),  # ← Corregido: Columna H (índice 7)
-                "lugar": normalizar_lugar(row[9])  # ← Corregido: Columna I (índice 8)
-            }
+    with medir("read_excel") as tramo:
+        df_raw = pd.read_excel(file_path, header=None)
+        tramo.filas = len(df_raw)
+    df, _ = procesar_filas(df_raw)
+    return df
+
+def procesar_excel_stream(file_path, chunk_rows=5000):
+    # Leer la primera hoja en modo solo lectura y entregar lotes normalizados
+    # sin cargar el libro completo en memoria
+    if hasattr(file_path, "seek"):
+        file_path.seek(0)
+    archivo = nombre_archivo(file_path)
+    libro = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        hoja = libro.worksheets[0]
+        hoja.reset_dimensions()
+        filas_hoja = hoja.iter_rows(values_only=True)
+        current_date = None
+        while True:
+            with medir("leer_bloque_excel") as tramo:
+                bloque = list(islice(filas_hoja, chunk_rows))
+                tramo.filas = len(bloque)
+            if not bloque:
+                break
+            df, current_date = procesar_filas(pd.DataFrame(bloque), current_date)
+            if not df.empty:
+                yield marcar_origen(df, archivo, hoja.title)
+    finally:
+        libro.close()
+
+@instrumentar(filas=len)
+def procesar_libro(file_path):
+    # Procesar todas las hojas de un libro, anotando archivo y hoja de origen
+    archivo = nombre_archivo(file_path)
+    hojas = pd.read_excel(file_path, header=None, sheet_name=None)
+    resultados = [
+        marcar_origen(procesar_filas(df_raw)[0], archivo, nombre_hoja)
+        for nombre_hoja, df_raw in hojas.items()
+    ]
+    con_datos = [df for df in resultados if not df.empty]
+    return pd.concat(con_datos or resultados[:1], ignore_index=True)
+
+def listar_archivos_excel(ruta):
+    # Aceptar un directorio (se buscan .xlsx y .xls dentro) o un patrón glob
+    if os.path.isdir(ruta):
+        patrones = [os.path.join(ruta, "*.xlsx"), os.path.join(ruta, "*.xls")]
+    else:
+        patrones = [ruta]
+    archivos = set()
+    for patron in patrones:
+        archivos.update(glob.glob(patron))
+    return sorted(archivos)
+
+def procesar_lote(rutas, max_workers=None, procesar=None):
+    # Procesar varios libros en paralelo. Devuelve (ruta, df, error) según van
+    # terminando; un archivo con error no detiene el resto del lote.
+    # procesar reemplaza a procesar_libro (ej. la versión con caché).
+    procesar = procesar or procesar_libro
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(procesar, ruta): ruta for ruta in rutas}
+        for futuro in as_completed(futuros):
+            ruta = futuros[futuro]
             try:
-                datos['hora'] = pd.to_datetime(datos['hora'], errors='coerce').time()
-            except:
-                datos['hora'] = None
-            data.append(datos)
-    
-    df = pd.DataFrame(data)
+                df = futuro.result()
+            except Exception as e:
+                yield ruta, None, str(e)
+            else:
+                yield ruta, df, None
+
+def nombre_archivo(file_path):
+    # Nombre del archivo para rutas y para archivos subidos (tienen .name)
+    return os.path.basename(str(getattr(file_path, "name", file_path)))
+
+def marcar_origen(df, archivo, hoja):
+    df["archivo_origen"] = archivo
+    df["hoja_origen"] = hoja
     return df
 
+@instrumentar(filas=lambda resultado: len(resultado[0]))
+def procesar_filas(df_raw, fecha_inicial=None):
+    # Clasificar las filas crudas por columnas en vez de recorrerlas una a una.
+    # Devuelve el DataFrame normalizado y la última fecha vista, para poder
+    # continuar el estado en el siguiente bloque de filas.
+    df_raw = df_raw.reindex(columns=range(10))
+
+    # Detectar filas con fechas (ej: "26 de febrero 2025")
+    es_fecha = df_raw[1].astype(str).str.match(PATRON_FECHA, na=False)
+
+    # Detectar filas de encabezado (las 9 columnas coinciden con los títulos)
+    es_encabezado = pd.Series(True, index=df_raw.index)
+    for columna, titulo in enumerate(COLUMNAS_ENCABEZADO, start=1):
+        es_encabezado &= df_raw[columna].eq(titulo)
+
+    # Propagar la fecha vigente hacia abajo hasta el siguiente encabezado de fecha
+    textos_fecha = df_raw.loc[es_fecha, 1]
+    fechas_parseadas = {texto: parsear_fecha(texto) for texto in textos_fecha.unique()}
+    fechas = pd.Series(None, index=df_raw.index, dtype=object)
+    fechas[es_fecha] = textos_fecha.map(fechas_parseadas)
+    if fecha_inicial is not None and len(fechas) and not es_fecha.iloc[0]:
+        fechas.iloc[0] = fecha_inicial
+    fechas = fechas.ffill()
+
+    # Capturar filas de datos válidas
+    suficientes = df_raw.loc[:, 1:8].notna().sum(axis=1) >= 7
+    es_dato = ~es_fecha & ~es_encabezado & fechas.notna() & suficientes
+
+    filas = df_raw[es_dato]
+    df = pd.DataFrame({
+        "fecha": fechas[es_dato].to_numpy(),
+        "estudiante": filas[1].to_numpy(),
+        "tutores": mapear_unicos(filas[2], limpiar_nombres),
+        "presidente": mapear_unicos(filas[3], limpiar_nombres),
+        "miembro_1": mapear_unicos(filas[4], limpiar_nombres),
+        "miembro_2": mapear_unicos(filas[5], limpiar_nombres),
+        "oponente": mapear_unicos(filas[6], limpiar_nombres),
+        "hora": mapear_unicos(filas[8], hora_normalizada),  # Columna H (índice 8)
+        "lugar": mapear_unicos(filas[9], normalizar_lugar)  # Columna I (índice 9)
+    })
+
+    ultima_fecha = fechas.iloc[-1] if len(fechas) else fecha_inicial
+    return df, ultima_fecha
+
+def parsear_fecha(texto):
+    try:
+        return datetime.strptime(texto, "%d de %B %Y").date()
+    except:
+        # Plan B: Mapeo manual de meses en español
+        fecha_partes = texto.split()
+        mes = fecha_partes[2].lower()
+        fecha_formateada = f"{fecha_partes[0]} {MESES[mes]} {fecha_partes[3]}"
+        return datetime.strptime(fecha_formateada, "%d %m %Y").date()
+
+def mapear_unicos(serie, funcion):
+    # Aplicar la función una sola vez por valor distinto de la columna
+    with medir(f"normalizar:{funcion.__name__}", filas=len(serie)) as tramo:
+        codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+        valores = np.empty(len(unicos), dtype=object)
+        valores[:] = [funcion(valor) for valor in unicos]
+        tramo.datos["unicos"] = len(unicos)
+        return valores[codigos]
+
+def hora_normalizada(hora):
+    return hora_a_time(normalizar_hora(hora))
+
+def hora_a_time(hora):
+    # normalizar_hora devuelve "HH:MM" o None
+    if hora is None:
+        return None
+    return time(int(hora[:2]), int(hora[3:5]))
+
+@lru_cache(maxsize=TAMANO_CACHE, typed=True)
 def limpiar_nombres(texto):
     # Eliminar menciones de Twitter y múltiples espacios
     if pd.isna(texto):
         return None
-    return re.sub(r"@\w+", "", texto).strip()
+    return sys.intern(PATRON_MENCION.sub("", texto).strip())
+
+@lru_cache(maxsize=TAMANO_CACHE, typed=True)
+def separar_nombres(texto):
+    # Una celda de tutores puede traer varios nombres: "A, B y C"
+    if texto is None or pd.isna(texto):
+        return ()
+    return tuple(nombre for nombre in PATRON_SEPARADOR_NOMBRES.split(texto) if nombre)
 
+@lru_cache(maxsize=TAMANO_CACHE, typed=True)
+def clave_nombre(nombre):
+    # Forma canónica para comparar nombres: sin tildes, sin títulos académicos,
+    # sin signos de puntuación y en minúsculas
+    texto = unicodedata.normalize("NFKD", nombre)
+    texto = "".join(caracter for caracter in texto if not unicodedata.combining(caracter)).lower()
+    palabras = re.sub(r"[^\w\s]", " ", texto).split()
+    while palabras and palabras[0] in TITULOS:
+        titulo = palabras.pop(0)
+        # "Dr. C." / "Dra. C." (doctor en ciencias)
+        if titulo in ('dr', 'dra') and palabras[:1] == ['c']:
+            palabras.pop(0)
+    return sys.intern(" ".join(palabras))
+
+@lru_cache(maxsize=TAMANO_CACHE, typed=True)
 def normalizar_hora(hora):
     # Caso especial "1 pkm"
     if isinstance(hora, str) and "pkm" in hora.lower():
@@ -71,17 +215,37 @@ def normalizar_hora(hora):
     
     # Manejar objetos time existentes
     if isinstance(hora, time):  # <-- Usar 'time' directamente
-        return hora.strftime("%H:%M")
+        return sys.intern(hora.strftime("%H:%M"))
+
+    # Camino rápido para "H:MM" y "HH:MM[:SS]" sin pasar por pandas
+    if isinstance(hora, str):
+        coincidencia = PATRON_HORA.fullmatch(hora.strip())
+        if coincidencia:
+            horas, minutos, segundos = (int(valor or 0) for valor in coincidencia.groups())
+            if horas < 24 and minutos < 60 and segundos < 60:
+                return sys.intern(f"{horas:02d}:{minutos:02d}")
     
     try:
-        # Convertir cualquier formato a string HH:MM
+        # Convertir cualquier otro formato a string HH:MM
         hora_parsed = pd.to_datetime(hora, errors='coerce')
-        return hora_parsed.strftime("%H:%M") if not pd.isna(hora_parsed) else None
+        return sys.intern(hora_parsed.strftime("%H:%M")) if not pd.isna(hora_parsed) else None
     except:
         return None
 
 
+@lru_cache(maxsize=TAMANO_CACHE, typed=True)
 def normalizar_lugar(lugar):
     # Estandarizar nombres de lugares
     lugar = str(lugar).split("(")[0].strip()
-    return lugar.replace("Francofonia", "Francofonía").replace("Resp ", "")
\ No newline at end of file
+    return sys.intern(lugar.replace("Francofonia", "Francofonía").replace("Resp ", ""))
+
+def estadisticas_cache():
+    # Aciertos y fallos de la caché de cada normalizador
+    return {
+        funcion.__name__: funcion.cache_info()._asdict()
+        for funcion in (limpiar_nombres, normalizar_hora, normalizar_lugar, separar_nombres, clave_nombre)
+    }
+
+def limpiar_cache():
+    for funcion in (limpiar_nombres, normalizar_hora, normalizar_lugar, separar_nombres, clave_nombre):
+        funcion.cache_clear()
@@ -1,11 +1,14 @@
+from functools import partial
 import streamlit as st
 import pandas as pd
-import traceback
-import re
-from sqlalchemy import create_engine, Date, Time, String
-from sqlalchemy.orm import sessionmaker
-from database import crear_tabla
-from excel_processor import procesar_excel
+from database import verificar_resumenes
+import datos
+import instrumentacion
+import trabajos
+from consultas import (
+    consulta_conteo_por_profesor, consulta_conteo_por, consulta_resumen_general,
+    consulta_profesores, consulta_filtrada, paginar
+)
 
 # Configuración inicial obligatoria
 st.set_page_config(
@@ -19,9 +22,8 @@ st.title("🏛️ Gestión de Defensas de Tesis Universitarias")
 
 # Conexión a DB con verificación
 try:
-    engine = create_engine('sqlite:///defensas.db')
-    crear_tabla(engine)
-    st.success("Conexión a base de datos establecida")
+    base = datos.obtener_base_datos(datos.URL_BD)
+    st.success(f"Conexión a base de datos establecida ({base.nombre})")
 except Exception as e:
     st.error(f"Error de conexión a DB: {str(e)}")
     st.stop()
@@ -37,70 +39,122 @@ except Exception as e:
     st.error(f"Error al crear el uploader: {str(e)}")
     st.stop()
 
-# Procesamiento de datos
+# Procesamiento de datos: cada archivo se lee una sola vez, en segundo plano
+# (trabajos.py); la página solo consulta el estado del trabajo
+gestor = datos.obtener_gestor()
+trabajo = None
 if uploaded_file:
+    subidos = st.session_state.setdefault("trabajos_subidos", {})  # id de la subida -> clave del trabajo
+    id_subida = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+    trabajo = gestor.obtener(subidos.get(id_subida))
+    if trabajo is None:
+        trabajo = gestor.enviar(uploaded_file.name, uploaded_file.getvalue(), base)
+        subidos[id_subida] = trabajo.clave
+
+@st.fragment(run_every=1)
+def progreso(tarea):
+    # Se actualiza cada segundo sin volver a ejecutar la página; al terminar
+    # la lectura o el guardado se ejecuta la página completa con el resultado
+    if not tarea.activo:
+        st.rerun()
+    elif isinstance(tarea, trabajos.Guardado):
+        st.progress(min(tarea.filas_guardadas / max(tarea.filas, 1), 1.0),
+                    text=f"💾 Guardando {tarea.nombre}: {tarea.filas_guardadas} de {tarea.filas} defensas")
+    else:
+        st.info(f"⏳ {tarea.nombre}: {tarea.estado}, {tarea.filas} defensas leídas")
+
+if trabajo is not None and trabajo.estado == trabajos.ERROR:
+    st.error(f"Error procesando el archivo {trabajo.nombre}")
+    st.code(trabajo.error)
+    st.stop()
+
+if trabajo is not None and trabajo.activo:
+    progreso(trabajo)
+
+if trabajo is not None and trabajo.vista_previa is not None:
+    vista = trabajo.vista_previa
+
+    # Sección de preview
+    st.subheader("Previsualización de Datos")
+    col1, col2 = st.columns(2)
     
-    try:
-        df = procesar_excel(uploaded_file)
-        
-        # Sección de preview
-        st.subheader("Previsualización de Datos")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric("Total de defensas", len(df))
-            st.write("Primeros registros:")
-            st.dataframe(df.head(3))
-            
-        with col2:
-            st.write("Estadísticas:")
-            st.json({
-                "Fechas únicas": df['fecha'].unique().tolist(),
-                "Lugares únicos": df['lugar'].nunique()
-            })
-            
-    except Exception as e:
-        st.error(f"Error procesando el archivo: {str(e)}")
-        st.code(traceback.format_exc())
-        st.stop()
-        
-if st.button("💾 Guardar en Base de Datos"):
-    try:
-        # Mantener todo como strings
-        df['hora'] = df['hora'].astype(str).str.replace("NaT", "")
+    with col1:
+        st.metric("Total de defensas", vista["total"])
+        st.write("Primeros registros:")
+        st.dataframe(vista["primeros"])
         
-        # Filtrar valores inválidos
-        df['hora'] = df['hora'].apply(
-            lambda x: x if re.match(r"\d{2}:\d{2}", str(x)) else None
+    with col2:
+        st.write("Estadísticas:")
+        st.json({
+            "Fechas únicas": vista["fechas"],
+            "Lugares únicos": vista["lugares"]
+        })
+
+    # Profesores o locales con dos defensas a la misma fecha y hora
+    conflictos = vista["conflictos"]
+    if conflictos.empty:
+        st.success("Sin conflictos de profesores ni de locales")
+    else:
+        st.warning(f"⚠️ {len(conflictos)} conflictos: profesores o locales con dos defensas a la misma hora")
+        st.dataframe(conflictos, use_container_width=True)
+
+    reemplazar_tabla = st.checkbox(
+        "Reemplazar toda la tabla",
+        help="Si no se marca, solo se insertan las defensas nuevas y se actualizan las que cambiaron"
+    )
+
+    # El guardado es de esta sesión: otra que suba el mismo archivo comparte
+    # la lectura pero no ve este guardado ni su resultado
+    guardados = st.session_state.setdefault("guardados", {})  # clave del trabajo -> id del guardado
+    guardado = gestor.obtener_guardado(guardados.get(trabajo.clave))
+    if st.button("💾 Guardar en Base de Datos", disabled=guardado is not None and guardado.activo):
+        # Se guardan los lotes ya leídos, en segundo plano
+        guardado = gestor.guardar(trabajo.clave, base, reemplazar=reemplazar_tabla)
+        if guardado is not None:
+            guardados[trabajo.clave] = guardado.id
+
+    if guardado is not None and guardado.activo:
+        progreso(guardado)
+    elif guardado is not None and guardado.estado == trabajos.GUARDADO:
+        resumen = guardado.resumen
+        st.success(
+            f"✅ {resumen['procesadas']} defensas procesadas: {resumen['insertadas']} nuevas, "
+            f"{resumen['actualizadas']} actualizadas, {resumen['sin_cambios']} sin cambios"
         )
-        
-        # Guardar en BD
-        with engine.begin() as connection:
-            df.to_sql(
-                name='defensas_tesis',
-                con=connection,
-                if_exists='replace',
-                index=False,
-                dtype={
-                    'fecha': Date(),
-                    'hora': String(10),
-                    'lugar': String(100)
-                }
-            )
-        st.success(f"✅ {len(df)} defensas guardadas!")
-        
-    except Exception as e:
-        st.error(f"❌ Error: {str(e)}")
-        st.code(traceback.format_exc())
+    elif guardado is not None and guardado.estado == trabajos.ERROR:
+        st.error("❌ Error al guardar")
+        st.code(guardado.error)
 
 
+# Abrir la base no la modifica: si su esquema es anterior (o está vacía),
+# se completa al guardar un archivo o cuando el usuario lo pide aquí
+if base.pendiente:
+    st.warning(f"La base no tiene el esquema actual (faltan: {', '.join(base.pendiente)})")
+    if st.button("🛠️ Actualizar la base de datos"):
+        base.preparar()
+        st.rerun()
+    st.stop()
+
+# Lecturas en caché, válidas mientras no cambie la versión de la tabla
+if st.sidebar.button("🔄 Recargar datos", help="Descartar la caché si la base se modificó fuera de la aplicación"):
+    datos.limpiar_cache()
+    if any(verificar_resumenes(base.preparar().escritura, reparar=True).values()):
+        st.sidebar.info("Estadísticas recalculadas: no coincidían con la base")
+version = datos.version_actual(datos.URL_BD)
+
+def consultar(consulta_sql, params=None):
+    return datos.consultar(datos.URL_BD, version, consulta_sql, params)
+
  # Consultas predefinidas
 st.sidebar.header("Filtros Avanzados")
 
 # Obtener valores únicos para los filtros
-df_completo = pd.read_sql_table('defensas_tesis', engine)
-tutores = ["Todos"] + sorted(df_completo['tutores'].dropna().unique().tolist())
-oponentes = ["Todos"] + sorted(df_completo['oponente'].dropna().unique().tolist())
+def lista_profesores(rol):
+    return consultar(*consulta_profesores(rol))['nombre'].tolist()
+
+tutores = ["Todos"] + lista_profesores('tutor')
+oponentes = ["Todos"] + lista_profesores('oponente')
+lugares = ["Todos"] + consultar(*consulta_conteo_por('lugar'))['lugar'].tolist()
 
 # Widgets de filtro
 filtro_tutor = st.sidebar.selectbox(
@@ -115,25 +169,51 @@ filtro_oponente = st.sidebar.selectbox(
     index=0
 )
 
-# Aplicar filtros a los datos
-df_filtrado = df_completo.copy()
+filtro_fecha = st.sidebar.date_input("Filtrar por fecha", [])
+filtro_lugar = st.sidebar.selectbox("Filtrar por lugar", lugares)
 
-if filtro_tutor != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['tutores'].str.contains(filtro_tutor, na=False)]
+st.sidebar.header("Búsqueda Combinada")
+busqueda_avanzada = st.sidebar.text_input("Buscar en todos los campos:")
 
-if filtro_oponente != "Todos":
-    df_filtrado = df_filtrado[df_filtrado['oponente'] == filtro_oponente]
+def mostrar_paginado(clave, consulta_sql, params, **opciones_tabla):
+    # Solo se pide a la base la página visible y el total de filas
+    col1, col2 = st.columns(2)
+    with col1:
+        tamano_pagina = st.selectbox("Filas por página", [25, 50, 100, 200], index=1, key=f"{clave}_tamano")
+    total = int(consultar(*paginar(consulta_sql, params, 0, 0)[1])['total'].iloc[0])
+    paginas = max(1, -(-total // tamano_pagina))
+    with col2:
+        pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, key=f"{clave}_pagina")
+    desplazamiento = (pagina - 1) * tamano_pagina
+    pagina_df = consultar(*paginar(consulta_sql, params, tamano_pagina, desplazamiento)[0])
+    st.write(f"Mostrando: {desplazamiento + 1 if total else 0}–{desplazamiento + len(pagina_df)} de {total} resultados")
+    st.dataframe(pagina_df, use_container_width=True, hide_index=True, **opciones_tabla)
+    return total
+
+# Aplicar filtros en la base de datos
+consulta_sql, params = consulta_filtrada(
+    tutor=filtro_tutor if filtro_tutor != "Todos" else None,
+    oponente=filtro_oponente if filtro_oponente != "Todos" else None,
+    fechas=filtro_fecha,
+    lugar=filtro_lugar if filtro_lugar != "Todos" else None,
+    texto=busqueda_avanzada,
+    fts=base.texto_completo
+)
 
 # Mostrar resultados
 st.subheader(f"Defensas Filtradas")
-st.write(f"Mostrando: {len(df_filtrado)} resultados")
-
-# Mostrar tabla con nuevos filtros
-st.dataframe(
-    df_filtrado,
-    use_container_width=True,
-    column_order=["fecha", "estudiante", "tutores", "oponente", "lugar", "hora"],
-    height=600
+total_filtrado = mostrar_paginado(
+    "filtradas", consulta_sql, params,
+    column_order=["fecha", "estudiante", "tutores", "presidente", "miembro_1", "miembro_2", "oponente", "lugar", "hora"]
+)
+
+# Exportación bajo demanda: el CSV completo solo se genera al pulsar el botón
+st.download_button(
+    label="Descargar como CSV",
+    data=partial(datos.generar_csv, datos.URL_BD, consulta_sql, params),
+    file_name='defensas_filtradas.csv',
+    mime='text/csv',
+    disabled=total_filtrado == 0
 )
 
 # Modificar el selectbox de consultas
@@ -150,15 +230,9 @@ consulta = st.sidebar.selectbox(
 
 # Actualizar lógica de consultas
 if consulta == "Defensas por tutor":
-    resultados = pd.read_sql(
-        "SELECT tutores, COUNT(*) as total FROM defensas_tesis GROUP BY tutores ORDER BY total DESC", 
-        engine
-    )
+    resultados = consultar(*consulta_conteo_por_profesor('tutor'))
 elif consulta == "Defensas por oponente":
-    resultados = pd.read_sql(
-        "SELECT oponente, COUNT(*) as total FROM defensas_tesis GROUP BY oponente ORDER BY total DESC", 
-        engine
-    )
+    resultados = consultar(*consulta_conteo_por_profesor('oponente'))
           
 # Consultas predefinidas
 st.sidebar.header("Consultas")
@@ -171,15 +245,14 @@ consulta = st.sidebar.selectbox(
     ]
 )
 
+st.subheader(f"Resultados: {consulta}")
 if consulta == "Próximas defensas por fecha":
-    resultados = pd.read_sql("SELECT * FROM defensas_tesis ORDER BY fecha, hora", engine)
+    mostrar_paginado("predefinida", "SELECT * FROM defensas_tesis ORDER BY fecha, hora", {})
 elif consulta == "Defensas por estudiante":
-    resultados = pd.read_sql("SELECT estudiante, fecha, hora, lugar FROM defensas_tesis ORDER BY estudiante", engine)
+    mostrar_paginado("predefinida", "SELECT estudiante, fecha, hora, lugar FROM defensas_tesis ORDER BY estudiante", {})
 elif consulta == "Defensas por lugar":
-    resultados = pd.read_sql("SELECT lugar, COUNT(*) as total FROM defensas_tesis GROUP BY lugar", engine)
-
-st.subheader(f"Resultados: {consulta}")
-st.dataframe(resultados, use_container_width=True)
+    resultados = consultar(*consulta_conteo_por('lugar'))
+    st.dataframe(resultados, use_container_width=True)
 
 # Sección de Visualización Completa
 st.sidebar.header("Visualización Completa")
@@ -187,55 +260,28 @@ mostrar_db = st.sidebar.checkbox("Mostrar toda la base de datos")
 
 if mostrar_db:
     st.subheader("Base de Datos Completa")
-    
-    # Cargar todos los datos
-    try:
-        df_completo = pd.read_sql_table('defensas_tesis', engine)
-        
-        # Mostrar con filtros
-        col1, col2 = st.columns(2)
-        with col1:
-            filtro_fecha = st.date_input("Filtrar por fecha", [])
-        with col2:
-            filtro_lugar = st.selectbox("Filtrar por lugar", ["Todos"] + df_completo['lugar'].unique().tolist())
-        
-        # Aplicar filtros
-        if filtro_fecha:
-            df_filtrado = df_completo[df_completo['fecha'].isin(filtro_fecha)]
-        else:
-            df_filtrado = df_completo
-            
-        if filtro_lugar != "Todos":
-            df_filtrado = df_filtrado[df_filtrado['lugar'] == filtro_lugar]
-        
-        # Mostrar datos
-        st.dataframe(
-            df_filtrado,
-            use_container_width=True,
-            height=600,
-            hide_index=True,
-            column_order=["fecha", "estudiante", "tutores", "presidente", "lugar", "hora"]
-        )
-        
-        # Botón de descarga
-        st.download_button(
-            label="Descargar como CSV",
-            data=df_filtrado.to_csv(index=False).encode('utf-8'),
-            file_name='defensas_completas.csv',
-            mime='text/csv'
-        )
-        
-    except Exception as e:
-        st.error(f"No se pudo cargar la base de datos: {str(e)}")
+    consulta_completa = "SELECT * FROM defensas_tesis ORDER BY fecha, hora"
+    total_completo = mostrar_paginado(
+        "completa", consulta_completa, {}, height=600,
+        column_order=["fecha", "estudiante", "tutores", "presidente", "lugar", "hora"]
+    )
+    st.download_button(
+        label="Descargar como CSV",
+        data=partial(datos.generar_csv, datos.URL_BD, consulta_completa),
+        file_name='defensas_completas.csv',
+        mime='text/csv',
+        key="csv_completo",
+        disabled=total_completo == 0
+    )
 
 # Sección de Estadísticas Rápidas
+resumen = consultar(*consulta_resumen_general())
 with st.expander("📊 Estadísticas Generales"):
-    if 'df_completo' in locals() and not df_completo.empty:
-        total_defensas = len(df_completo)
-        
+    total_defensas = int(resumen['defensas'].iloc[0])
+    if total_defensas:
         # Manejo seguro de fechas
-        fecha_min = df_completo['fecha'].min()
-        fecha_max = df_completo['fecha'].max()
+        fecha_min = pd.to_datetime(resumen['primera_fecha'].iloc[0])
+        fecha_max = pd.to_datetime(resumen['ultima_fecha'].iloc[0])
         
         # Convertir a texto si son válidas
         str_fecha_min = fecha_min.strftime("%d/%m/%Y") if pd.notnull(fecha_min) else "N/A"
@@ -246,10 +292,10 @@ with st.expander("📊 Estadísticas Generales"):
         col2.metric("Primera defensa", str_fecha_min)
         col3.metric("Última defensa", str_fecha_max)
         
-        # Filtrar fechas válidas para el gráfico
-        df_fechas_validas = df_completo[pd.notnull(df_completo['fecha'])]
-        if not df_fechas_validas.empty:
-            st.line_chart(df_fechas_validas.set_index('fecha')['hora'].value_counts())
+        # Ocupación por hora, precalculada en resumen_defensas
+        por_hora = consultar(*consulta_conteo_por('hora'))
+        if not por_hora.empty:
+            st.line_chart(por_hora.set_index('hora')['total'])
         else:
             st.warning("No hay fechas válidas para mostrar el gráfico")
     else:
@@ -260,18 +306,22 @@ with st.expander("📊 Estadísticas por Rol"):
     
     with col1:
         st.write("**Top 5 Tutores**")
-        st.bar_chart(df_completo['tutores'].value_counts().head(5))
+        st.bar_chart(consultar(*consulta_conteo_por_profesor('tutor')).head(5).set_index('profesor')['total'])
         
     with col2:
         st.write("**Top 5 Oponentes**")
-        st.bar_chart(df_completo['oponente'].value_counts().head(5))
-        
-st.sidebar.header("Búsqueda Combinada")
-busqueda_avanzada = st.sidebar.text_input("Buscar en todos los campos:")
+        st.bar_chart(consultar(*consulta_conteo_por_profesor('oponente')).head(5).set_index('profesor')['total'])
 
-if busqueda_avanzada:
-    mask = df_filtrado.apply(
-        lambda row: row.astype(str).str.contains(busqueda_avanzada, case=False).any(),
-        axis=1
-    )
-    df_filtrado = df_filtrado[mask]
\ No newline at end of file
+# Panel de depuración: últimas etapas medidas en este proceso. Solo muestra;
+# la medición es de todo el proceso y se activa con DEFENSAS_PERFIL al
+# arrancar la aplicación, no desde una sesión
+with st.sidebar.expander("🐞 Depuración"):
+    if instrumentacion.activo():
+        st.caption(f"Medición de tiempos activa ({instrumentacion.ruta()})")
+    else:
+        st.caption(f"Medición de tiempos desactivada: arranque con {instrumentacion.VARIABLE_ENTORNO}=1")
+    if instrumentacion.ultimos_tramos:
+        tramos = pd.DataFrame(list(instrumentacion.ultimos_tramos)[::-1])
+        st.dataframe(tramos[["inicio", "tramo", "ms", "filas", "memoria_mb", "padre"]], hide_index=True)
+    else:
+        st.caption("Sin mediciones todavía")
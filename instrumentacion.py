@@ -0,0 +1,138 @@
+# instrumentacion.py
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Medición de las etapas del procesamiento (tramos o "spans"): duración,
+# filas procesadas y variación de memoria de cada tramo, anidados según se
+# llaman. Desactivada no hace más que comprobar una variable; activada
+# (DEFENSAS_PERFIL=1, DEFENSAS_PERFIL=ruta.jsonl, --perfil o activar())
+# añade una línea JSON por tramo al registro y guarda los últimos en memoria
+# para el panel de depuración de la interfaz web.
+
+VARIABLE_ENTORNO = "DEFENSAS_PERFIL"
+RUTA_PREDETERMINADA = "perfil_defensas.jsonl"
+TAMANO_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+ultimos_tramos = deque(maxlen=500)
+_estado = {"ruta": None, "archivo": None}
+_tramo_actual = contextvars.ContextVar("tramo_actual", default=None)
+_bloqueo = threading.Lock()
+
+class Tramo:
+    __slots__ = ("nombre", "filas", "datos", "padre", "nivel")
+
+    def __init__(self, nombre, filas=None, datos=None, padre=None):
+        self.nombre = nombre
+        self.filas = filas
+        self.datos = datos or {}
+        self.padre = padre
+        self.nivel = padre.nivel + 1 if padre else 0
+
+# Se devuelve cuando la medición está desactivada; asignarle filas o datos no tiene efecto
+TRAMO_INACTIVO = Tramo("inactivo")
+
+def valor_activacion(valor):
+    # "1", "si", "true" -> ruta por defecto; "0", "no", "false" o vacío -> desactivado
+    valor = (valor or "").strip()
+    if valor.lower() in ("", "0", "no", "false"):
+        return None
+    if valor.lower() in ("1", "si", "sí", "true", "yes"):
+        return RUTA_PREDETERMINADA
+    return valor
+
+def activar(ruta=None):
+    _estado["ruta"] = ruta or RUTA_PREDETERMINADA
+    # Los procesos hijos (procesar_lote) heredan la variable y registran en el mismo archivo
+    os.environ[VARIABLE_ENTORNO] = _estado["ruta"]
+
+def desactivar():
+    with _bloqueo:
+        if _estado["archivo"]:
+            _estado["archivo"].close()
+        _estado.update(ruta=None, archivo=None)
+    os.environ.pop(VARIABLE_ENTORNO, None)
+
+def activo():
+    return _estado["ruta"] is not None
+
+def ruta():
+    return _estado["ruta"]
+
+def memoria_mb():
+    # Memoria residente actual del proceso (Linux); None donde no está disponible
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * TAMANO_PAGINA / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+@contextmanager
+def medir(nombre, filas=None, **datos):
+    if _estado["ruta"] is None:
+        yield TRAMO_INACTIVO
+        return
+    tramo = Tramo(nombre, filas, datos, _tramo_actual.get())
+    token = _tramo_actual.set(tramo)
+    marca = datetime.now()
+    memoria_inicial = memoria_mb()
+    inicio = time.perf_counter()
+    try:
+        yield tramo
+    finally:
+        duracion = time.perf_counter() - inicio
+        memoria_final = memoria_mb()
+        _tramo_actual.reset(token)
+        registrar({
+            "tramo": nombre,
+            "padre": tramo.padre.nombre if tramo.padre else None,
+            "nivel": tramo.nivel,
+            "inicio": marca.isoformat(timespec="milliseconds"),
+            "ms": round(duracion * 1000, 3),
+            "filas": tramo.filas,
+            "filas_s": round(tramo.filas / duracion) if tramo.filas and duracion else None,
+            "memoria_mb": round(memoria_final - memoria_inicial, 2) if memoria_inicial is not None else None,
+            "pid": os.getpid(),
+            **tramo.datos
+        })
+
+def instrumentar(nombre=None, filas=None):
+    # Decorador: mide cada llamada. filas recibe el resultado y devuelve cuántas filas procesó.
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if _estado["ruta"] is None:
+                return funcion(*args, **kwargs)
+            with medir(etiqueta) as tramo:
+                resultado = funcion(*args, **kwargs)
+                if filas is not None:
+                    tramo.filas = filas(resultado)
+                return resultado
+        return envoltura
+    return decorador
+
+def registrar(registro):
+    ultimos_tramos.append(registro)
+    with _bloqueo:
+        ruta = _estado["ruta"]
+        if ruta is None:
+            return
+        archivo = _estado["archivo"]
+        if archivo is None or archivo.name != ruta:
+            if archivo:
+                archivo.close()
+            archivo = _estado["archivo"] = open(ruta, "a", encoding="utf-8")
+        archivo.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+        archivo.flush()
+
+_ruta_entorno = valor_activacion(os.environ.get(VARIABLE_ENTORNO))
+if _ruta_entorno:
+    _estado["ruta"] = _ruta_entorno
@@ -0,0 +1,211 @@
+# nombres.py
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+# Resolución de las variantes de un mismo profesor ("Juan Pérez García",
+# "J. Pérez", "Juan Peres García") a una sola identidad. Trabaja sobre la
+# clave de clave_nombre (sin tildes, títulos, puntuación ni mayúsculas).
+#
+# Para no comparar cada nombre con todos los demás, un nombre solo se compara
+# con los que comparten al menos dos claves de bloque: el comienzo fonético
+# de cada palabra y la inicial del nombre unida al de cada apellido. Los
+# bloques demasiado grandes (nombres de pila comunes) se ignoran, así que cada
+# búsqueda hace unas pocas comparaciones. Entre los candidatos decide la
+# alineación de palabras (iguales, iniciales o apellidos con una o dos letras
+# de diferencia; el nombre de pila nunca admite diferencias) y desempata la
+# similitud de trigramas.
+
+MAX_BLOQUE = 200  # Bloques con más nombres no generan candidatos
+LARGO_BLOQUE = 4  # Letras fonéticas de cada palabra en la clave de bloque
+MIN_SIMILITUD = 0.35  # Por debajo no se intenta alinear ("j perez" y "juan perez garcia" dan 0.46)
+
+FUERTE = "fuerte"  # Las mismas palabras salvo errores de escritura
+DEBIL = "debil"  # Una forma abreviada de la otra (iniciales, sin segundo apellido)
+
+REGLAS_FONETICAS = [
+    (re.compile(r"ll"), "y"), (re.compile(r"v"), "b"), (re.compile(r"z"), "s"),
+    (re.compile(r"c(?=[ei])"), "s"), (re.compile(r"qu(?=[ei])"), "k"), (re.compile(r"c"), "k"),
+    (re.compile(r"(?<!k)h"), ""), (re.compile(r"(\w)\1+"), r"\1"),
+]
+
+@lru_cache(maxsize=8192)
+def fonetica(palabra):
+    # Grafías que suenan igual en español: "gonzalez" y "gonsales", "cerbantes" y "cervantes"
+    for patron, reemplazo in REGLAS_FONETICAS:
+        palabra = patron.sub(reemplazo, palabra)
+    return palabra
+
+def claves_bloque(clave):
+    # "juan perez garcia" -> pere, garc, juan, j|pere, j|garc; "j perez" comparte pere y j|pere
+    palabras = clave.split()
+    bloques = {fonetica(palabra)[:LARGO_BLOQUE] for palabra in palabras if len(palabra) >= 3}
+    bloques.update(
+        f"{palabras[0][0]}|{fonetica(palabra)[:LARGO_BLOQUE]}" for palabra in palabras[1:] if len(palabra) >= 3
+    )
+    return bloques
+
+@lru_cache(maxsize=65536)
+def trigramas(clave):
+    texto = f"  {clave} "
+    return frozenset(texto[posicion:posicion + 3] for posicion in range(len(texto) - 2))
+
+def similitud(a, b):
+    # Coeficiente de Dice entre los trigramas de dos claves
+    ta, tb = trigramas(a), trigramas(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+@lru_cache(maxsize=65536)
+def distancia(a, b, maximo):
+    # Distancia de edición (Levenshtein); se corta en cuanto supera maximo
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, letra in enumerate(a, 1):
+        actual = [i]
+        for j, otra in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (letra != otra)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return anterior[-1]
+
+def tolerancia(palabra, nombre_pila=False):
+    # Letras distintas que se aceptan entre dos palabras: ninguna en el nombre
+    # de pila ("juan" y "juana", "mario" y "maria" son otras personas) ni en
+    # apellidos cortos; en los demás, según su largo
+    if nombre_pila or len(palabra) < 5:
+        return 0
+    return 1 if len(palabra) <= 7 else 2
+
+def alinear(corta, larga):
+    # Cada palabra de corta debe corresponder a una palabra distinta de larga:
+    # igual, parecida o (si es una sola letra) su inicial. Primero se emparejan
+    # las iguales y después las completas antes que las iniciales. El nombre
+    # de pila (la primera palabra) solo se empareja igual o por su inicial.
+    # Devuelve los pares (palabra, tipo) o None si alguna queda sin pareja.
+    libres = list(enumerate(larga))
+    pares = []
+    pendientes = []
+    for orden, palabra in enumerate(corta):
+        iguales = [posicion for posicion, (_, otra) in enumerate(libres) if otra == palabra]
+        if iguales:
+            libres.pop(iguales[0])
+            pares.append((palabra, "igual"))
+        else:
+            pendientes.append((orden, palabra))
+    for orden, palabra in sorted(pendientes, key=lambda pendiente: len(pendiente[1]), reverse=True):
+        eleccion = None
+        for posicion, (orden_otra, otra) in enumerate(libres):
+            maximo = tolerancia(palabra, nombre_pila=orden == 0 or orden_otra == 0)
+            if len(palabra) == 1:
+                if eleccion is None and otra.startswith(palabra):
+                    eleccion = (posicion, "inicial")
+            elif eleccion is None and maximo and len(otra) > 1 and distancia(palabra, otra, maximo) <= maximo:
+                eleccion = (posicion, "parecida")
+        if eleccion is None:
+            return None
+        libres.pop(eleccion[0])
+        pares.append((palabra, eleccion[1]))
+    return pares
+
+def comparar(a, b):
+    # (FUERTE o DEBIL, similitud) si a y b pueden ser la misma persona; None si no.
+    # La similitud de trigramas descarta rápido los que no se parecen.
+    puntuacion = similitud(a, b)
+    if puntuacion < MIN_SIMILITUD:
+        return None
+    pa, pb = a.split(), b.split()
+    if len(pa) > len(pb):
+        pa, pb = pb, pa
+    if len(pa) == 1 and len(pb) > 1:
+        return None  # Un apellido solo puede ser de cualquiera
+    pares = alinear(pa, pb)
+    if pares is None and len(pa) == len(pb):
+        pares = alinear(pb, pa)
+    if pares is None or not any(tipo != "inicial" and len(palabra) >= 3 for palabra, tipo in pares):
+        return None
+    sin_iniciales = all(tipo != "inicial" for _, tipo in pares)
+    return (FUERTE if len(pa) == len(pb) and sin_iniciales else DEBIL), puntuacion
+
+def completitud(clave):
+    # Para elegir el nombre canónico: más palabras enteras y, después, más largo
+    return sum(len(palabra) > 1 for palabra in clave.split()), len(clave), clave
+
+class IndiceNombres:
+    def __init__(self, alias=None):
+        self.identidad = {}  # clave -> identidad (id del profesor)
+        self.bloques = defaultdict(list)  # clave de bloque -> claves
+        for clave, identidad in (alias or {}).items():
+            self.agregar(clave, identidad)
+
+    def agregar(self, clave, identidad):
+        if clave not in self.identidad:
+            for bloque in claves_bloque(clave):
+                self.bloques[bloque].append(clave)
+        self.identidad[clave] = identidad
+
+    def candidatos(self, clave):
+        # Claves que comparten al menos dos bloques con clave (uno si solo tiene uno)
+        bloques = claves_bloque(clave)
+        compartidos = Counter()
+        for bloque in bloques:
+            otras = self.bloques.get(bloque, ())
+            if len(otras) <= MAX_BLOQUE:
+                compartidos.update(otras)
+        compartidos.pop(clave, None)
+        minimo = min(2, len(bloques))
+        return [otra for otra, veces in compartidos.items() if veces >= minimo]
+
+    def resolver(self, clave):
+        # Identidad de la clave: la suya si ya está, la de la variante más
+        # parecida con las mismas palabras o, si solo hay formas abreviadas
+        # compatibles, la única identidad a la que apuntan. None si no hay
+        # ninguna o si la forma abreviada podría ser de varias personas.
+        if clave in self.identidad:
+            return self.identidad[clave]
+        fuertes = []
+        debiles = set()
+        for otra in self.candidatos(clave):
+            resultado = comparar(clave, otra)
+            if resultado is None:
+                continue
+            tipo, puntuacion = resultado
+            if tipo == FUERTE:
+                fuertes.append((puntuacion, otra))
+            else:
+                debiles.add(self.identidad[otra])
+        if fuertes:
+            return self.identidad[max(fuertes)[1]]
+        if len(debiles) == 1:
+            return debiles.pop()
+        return None
+
+    def asignar(self, claves):
+        # Resuelve un lote de claves nuevas de la más completa a la menos, para
+        # que las abreviadas encuentren ya la completa. Las que no se parecen a
+        # ninguna son una identidad nueva, indicada con la propia clave (str).
+        # Devuelve {clave: identidad}.
+        asignacion = {}
+        for clave in sorted(set(claves), key=completitud, reverse=True):
+            identidad = self.resolver(clave)
+            asignacion[clave] = clave if identidad is None else identidad
+            self.agregar(clave, asignacion[clave])
+        return asignacion
+
+    def agrupar(self, alias):
+        # Vuelve a agrupar variantes ya asignadas ({clave: id}). Devuelve
+        # {id: id destino} con los profesores que resultan ser otro.
+        destino = {}
+        def raiz(identidad):
+            while identidad in destino:
+                identidad = destino[identidad]
+            return identidad
+        for clave in sorted(alias, key=completitud, reverse=True):
+            propia = raiz(alias[clave])
+            encontrada = self.resolver(clave)
+            encontrada = propia if encontrada is None else raiz(encontrada)
+            if encontrada != propia:
+                destino[propia] = encontrada
+            self.agregar(clave, encontrada)
+        return {origen: raiz(origen) for origen in destino}
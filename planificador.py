@@ -0,0 +1,232 @@
+# planificador.py
+import heapq
+from collections import defaultdict
+from datetime import date, time, timedelta
+import pandas as pd
+from openpyxl import Workbook
+from sqlalchemy import text
+from excel_processor import COLUMNAS_ENCABEZADO, MESES, clave_nombre, separar_nombres
+from disponibilidad import MotorDisponibilidad
+
+NOMBRES_MESES = {int(numero): nombre for nombre, numero in MESES.items()}
+FRANJAS_PREDETERMINADAS = ["09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00"]
+# Orden en que se cubre el tribunal: primero los roles con menos candidatos
+PUESTOS_TRIBUNAL = (('presidente', 1), ('oponente', 1), ('miembro', 2))
+
+class Planificador:
+    # Propone tribunal, fecha, hora y lugar para defensas pendientes.
+    # La ocupación de profesores y locales se guarda como mapas de bits por día
+    # (un bit por franja, como en MotorDisponibilidad), de modo que comprobar
+    # un hueco cuesta unas pocas operaciones de bits. La búsqueda es voraz:
+    # primero las defensas cuyos tutores tienen menos huecos libres, cada una en
+    # el primer hueco donde tutores, local y tribunal completo están libres, y
+    # el tribunal con los profesores de menos carga.
+
+    def __init__(self, motor, dias, lugares, ocupacion_lugares=None, habilitados=None,
+                 carga_historica=None, max_por_dia=3):
+        self.motor = motor
+        self.franjas = motor.franjas
+        self.dias = [str(dia) for dia in dias]
+        self.lugares = list(lugares)
+        self.ocupacion_lugares = defaultdict(lambda: defaultdict(int))  # fecha -> lugar -> máscara
+        for (fecha, lugar), mascara in (ocupacion_lugares or {}).items():
+            self.ocupacion_lugares[fecha][lugar] |= mascara
+        # rol -> ids que pueden ocuparlo; sin historial cualquier profesor sirve
+        todos = list(motor.profesores)
+        habilitados = habilitados or {}
+        self.habilitados = {rol: habilitados.get(rol) or todos for rol, _ in PUESTOS_TRIBUNAL}
+        self.carga_historica = carga_historica or {}
+        self.carga = defaultdict(int)  # Tribunales asignados en esta planificación
+        self.reservas = defaultdict(lambda: defaultdict(int))  # id -> fecha -> máscara
+        self.max_por_dia = max_por_dia
+        self.ids_por_clave = dict(motor.variantes)  # Cualquier variante del nombre del tutor
+
+    @classmethod
+    def desde_bd(cls, conn, dias, lugares=None, franjas=None, max_por_dia=3):
+        franjas = franjas or FRANJAS_PREDETERMINADAS
+        motor = MotorDisponibilidad.desde_bd(conn, franjas)
+        indice = {franja: posicion for posicion, franja in enumerate(franjas)}
+
+        if not lugares:
+            lugares = [fila[0] for fila in conn.execute(text(
+                "SELECT DISTINCT lugar FROM defensas_tesis WHERE lugar IS NOT NULL AND lugar <> '' ORDER BY lugar"
+            ))]
+        ocupacion_lugares = defaultdict(int)
+        filas = conn.execute(text("""
+            SELECT DISTINCT fecha, substr(hora, 1, 5), lugar FROM defensas_tesis
+            WHERE fecha IS NOT NULL AND hora IS NOT NULL AND lugar IS NOT NULL
+        """))
+        for fecha, hora, lugar in filas:
+            if hora in indice:
+                ocupacion_lugares[(str(fecha), lugar)] |= 1 << indice[hora]
+
+        # Presidentes solo entre quienes ya presidieron; oponentes y miembros
+        # entre quienes ya formaron parte de algún tribunal
+        habilitados = defaultdict(set)
+        carga_historica = defaultdict(int)
+        filas = conn.execute(text("""
+            SELECT profesor_id, rol, total FROM resumen_profesores
+            WHERE rol IN ('presidente', 'miembro', 'oponente')
+        """))
+        for profesor_id, rol, total in filas:
+            carga_historica[profesor_id] += total
+            habilitados['miembro'].add(profesor_id)
+            habilitados['oponente'].add(profesor_id)
+            if rol == 'presidente':
+                habilitados['presidente'].add(profesor_id)
+        habilitados = {rol: sorted(ids) for rol, ids in habilitados.items()}
+
+        return cls(motor, dias, lugares, ocupacion_lugares, habilitados, carga_historica, max_por_dia)
+
+    def resolver_tutores(self, tutores):
+        # Ids de los tutores registrados; los desconocidos se identifican por su
+        # nombre canónico para que tampoco se les asignen dos defensas a la vez
+        claves = (clave_nombre(nombre) for nombre in separar_nombres(tutores))
+        return [self.ids_por_clave.get(clave, clave) for clave in claves if clave]
+
+    def ocupado(self, id_, fecha):
+        return self.motor.ocupacion.get(id_, {}).get(fecha, 0) | self.reservas[id_][fecha]
+
+    def huecos_libres(self, ids):
+        total = 0
+        for fecha in self.dias:
+            mascara = 0
+            for id_ in ids:
+                mascara |= self.ocupado(id_, fecha)
+            total += bin(self.motor.todas & ~mascara).count("1")
+        return total
+
+    def lugar_libre(self, fecha, bit):
+        ocupacion = self.ocupacion_lugares[fecha]
+        for lugar in self.lugares:
+            if not ocupacion[lugar] & bit:
+                return lugar
+        return None
+
+    def elegir_tribunal(self, fecha, bit, excluidos):
+        # Para cada puesto, los candidatos libres en el hueco con menos carga
+        # (nueva primero, histórica como desempate)
+        usados = set(excluidos)
+        tribunal = {}
+        for rol, cantidad in PUESTOS_TRIBUNAL:
+            candidatos = [
+                id_ for id_ in self.habilitados[rol]
+                if id_ not in usados and not self.ocupado(id_, fecha) & bit
+                and bin(self.ocupado(id_, fecha)).count("1") < self.max_por_dia
+            ]
+            if len(candidatos) < cantidad:
+                return None
+            tribunal[rol] = heapq.nsmallest(
+                cantidad, candidatos,
+                key=lambda id_: (self.carga[id_], self.carga_historica.get(id_, 0), id_)
+            )
+            usados.update(tribunal[rol])
+        return tribunal
+
+    def buscar_hueco(self, tutores):
+        for fecha in self.dias:
+            ocupado_tutores = 0
+            for id_ in tutores:
+                ocupado_tutores |= self.ocupado(id_, fecha)
+            libres = self.motor.todas & ~ocupado_tutores
+            while libres:
+                bit = libres & -libres  # Franja libre más temprana
+                libres ^= bit
+                lugar = self.lugar_libre(fecha, bit)
+                if lugar is None:
+                    continue
+                tribunal = self.elegir_tribunal(fecha, bit, tutores)
+                if tribunal:
+                    return fecha, bit, lugar, tribunal
+        return None
+
+    def reservar(self, fecha, bit, lugar, tutores, tribunal):
+        self.ocupacion_lugares[fecha][lugar] |= bit
+        for id_ in tutores:
+            self.reservas[id_][fecha] |= bit
+        for ids in tribunal.values():
+            for id_ in ids:
+                self.reservas[id_][fecha] |= bit
+                self.carga[id_] += 1
+
+    def nombre(self, id_):
+        return self.motor.profesores[id_][0]
+
+    def planificar(self, pendientes):
+        # pendientes: iterable de (estudiante, tutores). Devuelve un DataFrame
+        # con las columnas de procesar_excel y la lista de estudiantes sin hueco.
+        tareas = [(estudiante, tutores, self.resolver_tutores(tutores)) for estudiante, tutores in pendientes]
+        tareas.sort(key=lambda tarea: self.huecos_libres(tarea[2]))
+
+        propuestas = []
+        sin_asignar = []
+        for estudiante, tutores, ids_tutores in tareas:
+            hueco = self.buscar_hueco(ids_tutores)
+            if hueco is None:
+                sin_asignar.append(estudiante)
+                continue
+            fecha, bit, lugar, tribunal = hueco
+            self.reservar(fecha, bit, lugar, ids_tutores, tribunal)
+            hora = self.franjas[bit.bit_length() - 1]
+            miembro_1, miembro_2 = (self.nombre(id_) for id_ in tribunal['miembro'])
+            propuestas.append({
+                "fecha": date.fromisoformat(fecha),
+                "estudiante": estudiante,
+                "tutores": tutores,
+                "presidente": self.nombre(tribunal['presidente'][0]),
+                "miembro_1": miembro_1,
+                "miembro_2": miembro_2,
+                "oponente": self.nombre(tribunal['oponente'][0]),
+                "hora": time(int(hora[:2]), int(hora[3:5])),
+                "lugar": lugar
+            })
+
+        columnas = ["fecha", "estudiante", "tutores", "presidente", "miembro_1", "miembro_2", "oponente", "hora", "lugar"]
+        df = pd.DataFrame(propuestas, columns=columnas)
+        return df.sort_values(["fecha", "hora", "lugar"], ignore_index=True), sin_asignar
+
+def dias_habiles(desde, hasta):
+    # Días de lunes a viernes entre dos fechas (incluidas)
+    dia = pd.to_datetime(desde).date()
+    hasta = pd.to_datetime(hasta).date()
+    dias = []
+    while dia <= hasta:
+        if dia.weekday() < 5:
+            dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
+
+def leer_pendientes(ruta):
+    # CSV o Excel con una columna de estudiantes y otra de tutores (mismos
+    # títulos que el calendario: "Estudiantes" y "Tutor")
+    df = pd.read_csv(ruta) if str(ruta).lower().endswith(".csv") else pd.read_excel(ruta)
+    columnas = {str(columna).strip().lower(): columna for columna in df.columns}
+    estudiante = columnas.get("estudiantes", columnas.get("estudiante"))
+    tutor = columnas.get("tutor", columnas.get("tutores"))
+    if estudiante is None or tutor is None:
+        raise ValueError("El archivo debe tener las columnas 'Estudiantes' y 'Tutor'")
+    df = df[df[estudiante].notna()]
+    return [
+        (str(nombre).strip(), None if pd.isna(tutores) else str(tutores).strip())
+        for nombre, tutores in zip(df[estudiante], df[tutor])
+    ]
+
+def fecha_en_texto(fecha):
+    # "26 de febrero 2025", el formato de los encabezados de fecha del calendario
+    return f"{fecha.day} de {NOMBRES_MESES[fecha.month]} {fecha.year}"
+
+def exportar_excel(df, ruta):
+    # Mismo formato que lee procesar_excel: por cada día una fila con la fecha,
+    # otra con los encabezados y una fila por defensa, a partir de la columna B
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Calendario")
+    for fecha, grupo in df.groupby("fecha", sort=True):
+        hoja.append([None, fecha_en_texto(fecha)])
+        hoja.append([None] + COLUMNAS_ENCABEZADO)
+        for fila in grupo.itertuples(index=False):
+            hoja.append([
+                None, fila.estudiante, fila.tutores, fila.presidente, fila.miembro_1,
+                fila.miembro_2, fila.oponente, fecha.strftime("%d/%m/%Y"),
+                fila.hora.strftime("%H:%M"), fila.lugar
+            ])
+    libro.save(ruta)
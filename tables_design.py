@@ -1,41 +1,90 @@
 #tables_design.py
 
+import sys
 from rich.console import Console
 from rich.table import Table
+from instrumentacion import medir
+
+FILAS_POR_PAGINA = 50  # Filas que se dibujan de una vez con rich
 
 def print_rich_pivot_table(df, title="Horarios del profesor"):
-    console = Console()
-    table = Table(title=title, title_style="bold italic red", show_lines=True, border_style="green", header_style="bold italic blue", caption="🟢 => Libre    🔴 => Ocupado")
-    table.add_column("Fecha", style="bold italic cyan")
-    for col in df.columns:
-        table.add_column(str(col), style="italic bright_white", overflow="fold")
-    for idx, row in df.iterrows():
-        table.add_row(str(idx), *[str(x) for x in row])
-    console.print(table)
+    mostrar_tabla(
+        df, title,
+        dict(title_style="bold italic red", border_style="green", header_style="bold italic blue", caption="🟢 => Libre    🔴 => Ocupado"),
+        estilo_columnas="italic bright_white", nombre_indice="Fecha"
+    )
 
 def print_rich_df_preview(df, title="Vista previa del archivo procesado"):
-    console = Console()
-    table = Table(title=title, title_style="bold italic red", show_lines=True, border_style="dark_blue", header_style="italic bold dark_magenta")
-    for col in df.columns:
-        table.add_column(str(col), style="italic bright_cyan", overflow="fold")
-    for _, row in df.iterrows():
-        table.add_row(*[str(x) for x in row])
-    console.print(table)
+    mostrar_tabla(
+        df, title,
+        dict(title_style="bold italic red", border_style="dark_blue", header_style="italic bold dark_magenta"),
+        estilo_columnas="italic bright_cyan"
+    )
 
 def print_rich_query_results(df, title="Resultados de la consulta"):
-    console = Console()
-    table = Table(title=title, title_style="bold italic red", show_lines=True, border_style="green", header_style="italic bold black on dark_green")
-    for col in df.columns:
-        table.add_column(str(col), style="italic yellow", overflow="fold")
-    for _, row in df.iterrows():
-        table.add_row(*[str(x) for x in row])
-    console.print(table)
+    mostrar_tabla(
+        df, title,
+        dict(title_style="bold italic red", border_style="green", header_style="italic bold black on dark_green"),
+        estilo_columnas="italic yellow"
+    )
 
 def print_rich_sql_results(df, title="Resultados SQL"):
+    mostrar_tabla(
+        df, title,
+        dict(title_style="bold italic red", border_style="cyan", header_style="bold italic dark_blue"),
+        estilo_columnas="italic bright_blue"
+    )
+
+def mostrar_tabla(df, title, estilo_tabla, estilo_columnas, nombre_indice=None, filas_por_pagina=FILAS_POR_PAGINA):
+    # En una terminal se dibuja con rich una página de filas cada vez y, si hay
+    # más, se puede navegar entre páginas. Redirigida a un archivo o a otro
+    # programa, la tabla sale completa como texto separado por tabuladores.
     console = Console()
-    table = Table(title=title, title_style="bold italic red", show_lines=True, border_style="cyan", header_style="bold italic dark_blue")
-    for col in df.columns:
-        table.add_column(str(col), style="italic bright_blue", overflow="fold")
-    for _, row in df.iterrows():
-        table.add_row(*[str(x) for x in row])
-    console.print(table)
\ No newline at end of file
+    if not console.is_terminal:
+        with medir("render_tabla_plano", filas=len(df)):
+            imprimir_plano(df, title, nombre_indice, estilo_tabla.get("caption"))
+        return
+
+    total = len(df)
+    paginas = max(1, -(-total // filas_por_pagina))
+    pagina = 0
+    while True:
+        inicio = pagina * filas_por_pagina
+        with medir("render_tabla_rich") as tramo:
+            pagina_df = df.iloc[inicio:inicio + filas_por_pagina]
+            tramo.filas = len(pagina_df)
+            console.print(construir_tabla(pagina_df, title, estilo_tabla, estilo_columnas, nombre_indice))
+        if paginas == 1:
+            return
+        console.print(f"Página {pagina + 1} de {paginas} ({total} filas)", style="italic", highlight=False)
+        if not sys.stdin.isatty():
+            return
+        opcion = input("[s]iguiente, [a]nterior, número de página o Enter para continuar: ").strip().lower()
+        if opcion == "s":
+            pagina = min(pagina + 1, paginas - 1)
+        elif opcion == "a":
+            pagina = max(pagina - 1, 0)
+        elif opcion.isdigit():
+            pagina = min(max(int(opcion) - 1, 0), paginas - 1)
+        else:
+            return
+
+def construir_tabla(df, title, estilo_tabla, estilo_columnas, nombre_indice=None):
+    table = Table(title=title, show_lines=True, **estilo_tabla)
+    # Cada columna se convierte a texto de una vez en lugar de celda a celda
+    columnas = [df[columna].to_numpy(dtype=object).astype(str).tolist() for columna in df.columns]
+    if nombre_indice:
+        table.add_column(nombre_indice, style="bold italic cyan")
+        columnas.insert(0, df.index.to_numpy(dtype=object).astype(str).tolist())
+    for columna in df.columns:
+        table.add_column(str(columna), style=estilo_columnas, overflow="fold")
+    for fila in zip(*columnas):
+        table.add_row(*fila)
+    return table
+
+def imprimir_plano(df, title, nombre_indice=None, caption=None):
+    sys.stdout.write(f"{title}\n")
+    df.to_csv(sys.stdout, sep="\t", index=nombre_indice is not None, index_label=nombre_indice, lineterminator="\n")
+    if caption:
+        sys.stdout.write(f"{caption}\n")
+    sys.stdout.flush()
@@ -0,0 +1,27 @@
+# conftest.py
+import os
+import tempfile
+import pytest
+
+# Las pruebas no tocan el catálogo ni la caché de snapshots del usuario; se
+# fija antes de importar los módulos, que leen estas variables al cargarse
+DATOS_PRUEBAS = tempfile.mkdtemp(prefix="defensas_pruebas_")
+os.environ["DEFENSAS_CATALOGO"] = os.path.join(DATOS_PRUEBAS, "catalogo_defensas.json")
+os.environ["DEFENSAS_CACHE"] = os.path.join(DATOS_PRUEBAS, "cache")
+
+from benchmark import generar_calendario_excel
+from database import crear_engine, aplicar_esquema
+
+@pytest.fixture
+def engine(tmp_path):
+    # Base SQLite nueva en un archivo temporal, con el esquema completo
+    engine = crear_engine(f"sqlite:///{tmp_path / 'defensas.db'}")
+    with engine.begin() as conn:
+        aplicar_esquema(conn)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def calendario(tmp_path):
+    # Calendario sintético con el formato oficial (ver benchmark.generar_filas)
+    return generar_calendario_excel(str(tmp_path / "calendario.xlsx"), 300)
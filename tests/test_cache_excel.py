@@ -0,0 +1,55 @@
+# test_cache_excel.py
+import os
+import pandas as pd
+import pytest
+import cache_excel
+from cache_excel import procesar_excel_cacheado, ruta_snapshot
+from excel_processor import procesar_excel_stream
+
+@pytest.fixture(autouse=True)
+def directorio_cache(tmp_path, monkeypatch):
+    directorio = tmp_path / "cache"
+    monkeypatch.setattr(cache_excel, "DIRECTORIO_CACHE", str(directorio))
+    return directorio
+
+def leer(ruta):
+    return pd.concat(list(procesar_excel_cacheado(ruta)), ignore_index=True)
+
+def sin_cache(ruta):
+    return pd.concat(list(procesar_excel_stream(ruta)), ignore_index=True)
+
+def test_segunda_lectura_desde_el_snapshot(calendario):
+    primera = leer(calendario)
+    assert os.path.exists(ruta_snapshot(calendario, "hoja"))
+    pd.testing.assert_frame_equal(leer(calendario), primera)
+
+def test_publicacion_fallida_solo_descarta_el_snapshot(calendario, directorio_cache, monkeypatch):
+    def fallar(*args):
+        raise OSError("disco lleno")
+    monkeypatch.setattr(cache_excel.os, "replace", fallar)
+    pd.testing.assert_frame_equal(leer(calendario), sin_cache(calendario))
+    assert os.listdir(directorio_cache) == []
+
+def test_recorte_fallido_no_interrumpe_la_lectura(calendario, monkeypatch):
+    def fallar(*args):
+        raise PermissionError("sin permiso")
+    monkeypatch.setattr(cache_excel, "recortar_cache", fallar)
+    pd.testing.assert_frame_equal(leer(calendario), sin_cache(calendario))
+    assert os.path.exists(ruta_snapshot(calendario, "hoja"))
+
+def test_snapshot_borrado_mientras_se_lee(calendario, monkeypatch):
+    esperado = leer(calendario)
+    def borrado_por_otro_proceso(ruta):
+        os.remove(ruta)
+        raise FileNotFoundError(ruta)
+    monkeypatch.setattr(cache_excel, "leer_snapshot", borrado_por_otro_proceso)
+    pd.testing.assert_frame_equal(leer(calendario), esperado)
+
+def test_error_del_excel_no_queda_tapado_por_la_cache(calendario, directorio_cache, monkeypatch):
+    def lotes_con_error(ruta, chunk_rows):
+        yield from procesar_excel_stream(ruta, 100)
+        raise ValueError("hoja dañada")
+    monkeypatch.setattr(cache_excel, "procesar_excel_stream", lotes_con_error)
+    monkeypatch.setattr(cache_excel.os, "remove", lambda ruta: (_ for _ in ()).throw(PermissionError(ruta)))
+    with pytest.raises(ValueError, match="hoja dañada"):
+        leer(calendario)
@@ -0,0 +1,50 @@
+# test_carga.py
+from sqlalchemy import inspect, text
+from database import guardar_defensas, indices_carga, diferencias_resumenes
+from excel_processor import procesar_excel_stream
+
+TRIGGERS_TEXTO = {"defensas_fts_insertar", "defensas_fts_borrar", "defensas_fts_actualizar"}
+
+def leer(calendario):
+    return list(procesar_excel_stream(calendario, chunk_rows=200))
+
+def contar(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar()
+
+def test_reimportar_no_cambia_nada(engine, calendario):
+    lotes = leer(calendario)
+    filas = sum(len(lote) for lote in lotes)
+    primera = guardar_defensas(engine, lotes)
+    assert primera == {'procesadas': filas, 'insertadas': filas, 'actualizadas': 0, 'sin_cambios': 0}
+    segunda = guardar_defensas(engine, leer(calendario))
+    assert segunda == {'procesadas': filas, 'insertadas': 0, 'actualizadas': 0, 'sin_cambios': filas}
+    assert contar(engine) == filas
+
+def test_reimportar_con_una_fila_cambiada(engine, calendario):
+    guardar_defensas(engine, leer(calendario))
+    lotes = leer(calendario)
+    lotes[0] = lotes[0].copy()
+    lotes[0].loc[lotes[0].index[0], "lugar"] = "Sala de Grados"
+    filas = sum(len(lote) for lote in lotes)
+    resumen = guardar_defensas(engine, lotes)
+    assert resumen == {'procesadas': filas, 'insertadas': 0, 'actualizadas': 1, 'sin_cambios': filas - 1}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM defensas_tesis WHERE lugar = 'Sala de Grados'")).scalar() == 1
+        assert not any(diferencias_resumenes(conn).values())
+
+def test_carga_masiva_restaura_indices_y_triggers(engine, calendario):
+    guardar_defensas(engine, leer(calendario), masiva=True)
+    guardar_defensas(engine, leer(calendario), masiva=True)
+    inspector = inspect(engine)
+    for indice in indices_carga():
+        assert indice.name in {existente["name"] for existente in inspector.get_indexes(indice.table.name)}
+    with engine.connect() as conn:
+        triggers = {fila[0] for fila in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'"))}
+        assert TRIGGERS_TEXTO <= triggers
+        # El índice de texto tiene todas las filas y sigue al día tras cambiarlas
+        assert conn.execute(text("SELECT COUNT(*) FROM defensas_fts")).scalar() == contar(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE defensas_tesis SET lugar = 'Anfiteatro Central' WHERE id = 1"))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM defensas_fts WHERE defensas_fts MATCH 'anfiteatro'")).scalars().all() == [1]
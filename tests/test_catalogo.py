@@ -0,0 +1,115 @@
+# test_catalogo.py
+import multiprocessing
+import sqlite3
+import pandas as pd
+import pytest
+from sqlalchemy import text
+from benchmark import generar_calendario_excel
+from catalogo import Catalogo, consultar_bases
+from consultas import calificar_tablas
+from database import crear_engine, crear_tabla, guardar_defensas
+from excel_processor import procesar_excel_stream
+
+@pytest.mark.parametrize("consulta, calificada", [
+    ("SELECT * FROM profesores", "SELECT * FROM b1.profesores AS profesores"),
+    ("SELECT * FROM profesores p, participaciones AS pa WHERE p.id = pa.profesor_id",
+     "SELECT * FROM b1.profesores p, b1.participaciones AS pa WHERE p.id = pa.profesor_id"),
+    ("SELECT * FROM defensas_tesis d JOIN participaciones pa ON pa.defensa_id = d.id LEFT JOIN profesores ON 1",
+     "SELECT * FROM b1.defensas_tesis d JOIN b1.participaciones pa ON pa.defensa_id = d.id LEFT JOIN b1.profesores AS profesores ON 1"),
+    ("SELECT * FROM profesores WHERE id IN (SELECT profesor_id FROM alias_profesores)",
+     "SELECT * FROM b1.profesores AS profesores WHERE id IN (SELECT profesor_id FROM b1.alias_profesores AS alias_profesores)"),
+    ("SELECT * FROM defensas_fts WHERE defensas_fts MATCH 'perez'",
+     "SELECT * FROM b1.defensas_fts AS defensas_fts WHERE defensas_fts MATCH 'perez'"),
+    # Ya calificadas o desconocidas quedan igual: las comprueba consultar_bases
+    ("SELECT * FROM b0.profesores", "SELECT * FROM b0.profesores"),
+    ("SELECT * FROM main.profesores p", "SELECT * FROM main.profesores p"),
+])
+def test_calificar_tablas(consulta, calificada):
+    assert calificar_tablas(consulta, "b1") == calificada
+
+@pytest.fixture
+def entradas(tmp_path):
+    # Dos bases con calendarios distintos, registradas en un catálogo temporal
+    catalogo = Catalogo(str(tmp_path / "catalogo.json"))
+    for semilla in (0, 1):
+        ruta = str(tmp_path / f"semestre_{semilla}.db")
+        engine = crear_engine(f"sqlite:///{ruta}")
+        crear_tabla(engine)
+        calendario = generar_calendario_excel(str(tmp_path / f"calendario_{semilla}.xlsx"), 120 + 40 * semilla, semilla=semilla)
+        guardar_defensas(engine, procesar_excel_stream(calendario))
+        engine.dispose()
+        catalogo.registrar(ruta)
+    return catalogo.seleccionar()
+
+def por_base(entradas, consulta):
+    # El resultado de la consulta en cada base por separado
+    resultados = []
+    for entrada in entradas:
+        engine = crear_engine(f"sqlite:///{entrada['ruta']}")
+        with engine.connect() as conn:
+            df = pd.read_sql(text(consulta), conn)
+        engine.dispose()
+        df.insert(0, "base", entrada["nombre"])
+        resultados.append(df)
+    return pd.concat(resultados, ignore_index=True)
+
+@pytest.mark.parametrize("consulta", [
+    "SELECT p.nombre, COUNT(*) AS total FROM profesores p, participaciones pa WHERE pa.profesor_id = p.id GROUP BY p.nombre",
+    "SELECT d.estudiante, p.nombre FROM defensas_tesis AS d JOIN participaciones pa ON pa.defensa_id = d.id "
+    "JOIN profesores p ON p.id = pa.profesor_id WHERE pa.rol = 'oponente'",
+    "SELECT COUNT(*) AS total FROM defensas_tesis WHERE id IN (SELECT defensa_id FROM participaciones WHERE rol = 'tutor')",
+    "SELECT x.total, COUNT(*) AS profesores FROM (SELECT COUNT(*) AS total FROM defensas_tesis) x JOIN profesores GROUP BY x.total",
+])
+def test_cada_parte_lee_su_base(entradas, consulta):
+    federada = consultar_bases(entradas, consulta)
+    esperada = por_base(entradas, consulta)
+    columnas = list(esperada.columns)
+    pd.testing.assert_frame_equal(
+        federada[columnas].sort_values(columnas, ignore_index=True),
+        esperada.sort_values(columnas, ignore_index=True),
+        check_dtype=False
+    )
+
+@pytest.mark.parametrize("consulta", [
+    "SELECT * FROM b0.profesores",
+    "SELECT * FROM profesores JOIN b1.participaciones pa ON pa.profesor_id = profesores.id",
+    "SELECT * FROM (SELECT COUNT(*) AS total FROM defensas_tesis) x, profesores",
+    "SELECT * FROM defensas_tesis WHERE id IN (SELECT defensa_id FROM b0.participaciones)",
+    "SELECT name FROM b0.sqlite_master",
+])
+def test_rechaza_leer_otra_base(entradas, consulta):
+    with pytest.raises(ValueError, match="otra base"):
+        consultar_bases(entradas, consulta)
+
+def test_rechaza_tablas_de_la_base_en_memoria(entradas):
+    with pytest.raises((ValueError, sqlite3.Error)):
+        consultar_bases(entradas, "SELECT * FROM main.defensas_tesis")
+
+def registrar_varias(ruta_catalogo, rutas):
+    catalogo = Catalogo(ruta_catalogo)
+    for ruta in rutas:
+        catalogo.registrar(ruta)
+
+def test_registros_en_paralelo_no_se_pierden(tmp_path):
+    rutas = []
+    for numero in range(24):
+        ruta = str(tmp_path / f"base_{numero}.db")
+        engine = crear_engine(f"sqlite:///{ruta}")
+        crear_tabla(engine)
+        engine.dispose()
+        rutas.append(ruta)
+    ruta_catalogo = str(tmp_path / "datos" / "catalogo.json")
+    procesos = [
+        multiprocessing.Process(target=registrar_varias, args=(ruta_catalogo, rutas[inicio::4]))
+        for inicio in range(4)
+    ]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join()
+    assert all(proceso.exitcode == 0 for proceso in procesos)
+    assert sorted(Catalogo(ruta_catalogo).leer()) == sorted(rutas)
+
+def test_registrar_carga_avisa_si_falla(tmp_path, capsys):
+    Catalogo(str(tmp_path / "catalogo.json")).registrar_carga(f"sqlite:///{tmp_path / 'no_existe.db'}")
+    assert "no se pudo registrar" in capsys.readouterr().err
@@ -0,0 +1,47 @@
+# test_conflictos.py
+import pandas as pd
+from sqlalchemy import text
+from conflictos import detectar_conflictos, conflictos_bd
+from database import guardar_defensas
+from excel_processor import clave_nombre
+
+def defensas(*filas):
+    # (estudiante, lugar, presidente, oponente) a la misma fecha y hora
+    return pd.DataFrame([{
+        "estudiante": estudiante, "fecha": "2024-06-10", "hora": "09:00", "lugar": lugar,
+        "tutores": None, "presidente": presidente, "miembro_1": None, "miembro_2": None, "oponente": oponente,
+    } for estudiante, lugar, presidente, oponente in filas])
+
+def agrupar(engine, *nombres):
+    # Variantes de nombre de un mismo profesor, como las deja nombres.py
+    with engine.begin() as conn:
+        profesor_id = conn.execute(text("INSERT INTO profesores (nombre, nombre_clave) VALUES (:nombre, :clave)"),
+                                   {"nombre": nombres[0], "clave": clave_nombre(nombres[0])}).lastrowid
+        for nombre in nombres:
+            conn.execute(text("INSERT INTO alias_profesores (nombre, nombre_clave, profesor_id) VALUES (:nombre, :clave, :id)"),
+                         {"nombre": nombre, "clave": clave_nombre(nombre), "id": profesor_id})
+
+def profesores(conflictos):
+    return conflictos[conflictos["tipo"] == "profesor"]
+
+def test_variantes_agrupadas_en_la_base_son_la_misma_persona(engine):
+    agrupar(engine, "Juan Pérez García", "J. Pérez")
+    df = defensas(("Ana", "Aula 1", "Juan Pérez García", None), ("Luis", "Aula 2", None, "J. Pérez"))
+    assert profesores(detectar_conflictos([df])).empty
+    conflictos = profesores(detectar_conflictos([df], engine))
+    assert conflictos[["estudiante", "en_conflicto_con"]].values.tolist() == [["Luis", "Ana"]]
+
+def test_nombres_desconocidos_se_comparan_por_su_clave(engine):
+    agrupar(engine, "Juan Pérez García", "J. Pérez")
+    df = defensas(("Ana", "Aula 1", "Rosa Martí", None), ("Luis", "Aula 2", None, "Rosa Marti"))
+    assert len(profesores(detectar_conflictos([df], engine))) == 1
+
+def test_dos_variantes_en_la_misma_defensa_no_son_conflicto(engine):
+    agrupar(engine, "Juan Pérez García", "J. Pérez")
+    df = defensas(("Ana", "Aula 1", "Juan Pérez García", "J. Pérez"))
+    assert detectar_conflictos([df], engine).empty
+
+def test_revisar_una_base_usa_sus_alias(engine):
+    agrupar(engine, "Juan Pérez García", "J. Pérez")
+    guardar_defensas(engine, [defensas(("Ana", "Aula 1", "Juan Pérez García", None), ("Luis", "Aula 2", None, "J. Pérez"))])
+    assert len(profesores(conflictos_bd(engine))) == 1
@@ -0,0 +1,30 @@
+# test_consola.py
+import builtins
+from sqlalchemy import text
+import cache_excel
+from consola_app import AplicacionConsola
+from database import crear_engine
+
+def test_procesar_y_guardar_abre_el_excel_una_vez(calendario, tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_excel, "DIRECTORIO_CACHE", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    lecturas = []
+    original = cache_excel.procesar_excel_stream
+    def contar(ruta, chunk_rows):
+        lecturas.append(ruta)
+        return original(ruta, chunk_rows)
+    monkeypatch.setattr(cache_excel, "procesar_excel_stream", contar)
+    # Sin actualizar la base vacía (n), guardar (s) en nueva.db y seguir
+    # consultando la base actual (n)
+    respuestas = iter(["n", "s", "nueva", "n"])
+    monkeypatch.setattr(builtins, "input", lambda *args: next(respuestas))
+
+    app = AplicacionConsola(f"sqlite:///{tmp_path / 'actual.db'}")
+    app.procesar_archivo(calendario)
+
+    assert lecturas == [calendario]
+    engine = crear_engine(f"sqlite:///{tmp_path / 'nueva.db'}")
+    with engine.connect() as conn:
+        guardadas = conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar()
+    engine.dispose()
+    assert guardadas == len(list(original(calendario, 5000))[0])
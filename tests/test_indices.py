@@ -0,0 +1,23 @@
+# test_indices.py
+import pytest
+from database import verificar_indices, plan_consulta
+from consultas import consulta_filtrada, consulta_defensas_profesor
+
+def test_busquedas_usan_indices(engine):
+    planes = verificar_indices(engine)
+    assert set(planes) == {'fecha', 'lugar', 'hora', 'profesor'}
+    assert all(planes.values()), planes
+
+@pytest.mark.parametrize("consulta, params", [
+    consulta_filtrada(fechas=("2025-03-01", "2025-03-31")),
+    consulta_filtrada(fechas="2025-03-01", lugar="Aula 3"),
+    consulta_filtrada(lugar="Aula 3"),
+    consulta_filtrada(tutor="Dr. Juan Pérez"),
+    consulta_filtrada(oponente="Dra. Ana Gómez", fechas=("2025-03-01", "2025-03-31")),
+    consulta_defensas_profesor("Juan Pérez", exacto=True),
+    consulta_defensas_profesor("Juan Pérez", rol="tutor", exacto=True),
+], ids=["fechas", "fecha_lugar", "lugar", "tutor", "oponente_fechas", "profesor", "profesor_rol"])
+def test_filtros_no_recorren_tablas(engine, consulta, params):
+    with engine.connect() as conn:
+        detalle = plan_consulta(conn, consulta, params)
+    assert not [paso for paso in detalle if paso.startswith("SCAN")], detalle
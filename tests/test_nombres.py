@@ -0,0 +1,98 @@
+# test_nombres.py
+import pandas as pd
+import pytest
+from sqlalchemy import text
+import cli
+from database import guardar_defensas, diferencias_resumenes
+from excel_processor import clave_nombre
+from nombres import comparar, IndiceNombres, FUERTE, DEBIL
+
+def claves(*nombres):
+    return [clave_nombre(nombre) for nombre in nombres]
+
+def test_tildes_iniciales_y_segundo_apellido_son_la_misma_persona():
+    variantes = claves("Dr. Juan Pérez García", "Juan Perez Garcia", "J. Pérez García", "Juan Pérez", "Juan Peres García")
+    asignacion = IndiceNombres().asignar(variantes)
+    assert len(set(asignacion.values())) == 1
+
+@pytest.mark.parametrize("a, b", [
+    ("Juan Pérez", "Juana Pérez"),
+    ("Mario López", "María López"),
+    ("Luis Díaz", "Luis Días"),  # Apellido corto: sin errores de escritura
+])
+def test_nombres_de_pila_distintos_no_se_unen(a, b):
+    assert comparar(*claves(a, b)) is None
+    asignacion = IndiceNombres().asignar(claves(a, b))
+    assert len(set(asignacion.values())) == 2
+
+def test_errores_en_apellidos_largos():
+    assert comparar(*claves("Ana Gómez", "Ana Gomes"))[0] == FUERTE
+    assert comparar(*claves("Rosa Martí", "R. Martí"))[0] == DEBIL
+
+def test_inicial_ambigua_queda_aparte():
+    indice = IndiceNombres({clave_nombre("Juan Pérez"): 1, clave_nombre("José Pérez"): 2})
+    assert indice.resolver(clave_nombre("J. Pérez")) is None
+    asignacion = indice.asignar(claves("J. Pérez"))
+    assert asignacion[clave_nombre("J. Pérez")] not in (1, 2)
+
+def test_inicial_con_una_sola_persona_se_une():
+    indice = IndiceNombres({clave_nombre("Juan Pérez"): 1, clave_nombre("Ana Pérez"): 2})
+    assert indice.resolver(clave_nombre("J. Pérez")) == 1
+
+def defensas(filas):
+    columnas = ["estudiante", "tutores", "presidente", "miembro_1", "miembro_2", "oponente"]
+    df = pd.DataFrame(filas, columns=columnas)
+    df["fecha"] = pd.Timestamp("2025-03-03")
+    df["hora"] = [f"{9 + posicion:02d}:00" for posicion in range(len(df))]
+    df["lugar"] = "Aula 3"
+    return df
+
+def participaciones(conn):
+    # {nombre del profesor: [(estudiante, rol)]}
+    filas = conn.execute(text("""
+        SELECT p.nombre, d.estudiante, pa.rol FROM participaciones pa
+        JOIN profesores p ON p.id = pa.profesor_id JOIN defensas_tesis d ON d.id = pa.defensa_id
+        ORDER BY 1, 2, 3
+    """)).fetchall()
+    resultado = {}
+    for nombre, estudiante, rol in filas:
+        resultado.setdefault(nombre, []).append((estudiante, rol))
+    return resultado
+
+def test_separar_devuelve_la_variante_y_sus_participaciones(engine, tmp_path):
+    guardar_defensas(engine, [defensas([
+        ("Est 1", "Dra. Ana Gómez", "Dr. Carlos Ruiz", "Lic. Rosa Martí", "MSc. Luis Díaz", "Dr. Juan Pérez"),
+        ("Est 2", "Dr. Carlos Ruiz", "Ana Gomes", "Lic. Rosa Martí", "MSc. Luis Díaz", "Dr. Juan Pérez"),
+        ("Est 3", "Dr. Carlos Ruiz, Ana Gomes", "Dra. Ana Gómez", "Lic. Rosa Martí", "MSc. Luis Díaz", "Dr. Juan Pérez"),
+    ])])
+    with engine.connect() as conn:
+        unidas = participaciones(conn)
+    assert "Ana Gomes" not in unidas
+    assert len(unidas["Dra. Ana Gómez"]) == 4
+
+    db = engine.url.database
+    assert cli.main(["names", "--db", db, "--separar", "Ana Gomes", "--salida", str(tmp_path / "nombres.csv")]) == cli.SALIDA_OK
+    with engine.connect() as conn:
+        separadas = participaciones(conn)
+        assert not any(diferencias_resumenes(conn).values())
+        alias = dict(conn.execute(text(
+            "SELECT a.nombre_clave, p.nombre FROM alias_profesores a JOIN profesores p ON p.id = a.profesor_id"
+        )).fetchall())
+    assert separadas["Ana Gomes"] == [("Est 2", "presidente"), ("Est 3", "tutor")]
+    assert separadas["Dra. Ana Gómez"] == [("Est 1", "tutor"), ("Est 3", "presidente")]
+    assert alias["ana gomes"] == "Ana Gomes" and alias["ana gomez"] == "Dra. Ana Gómez"
+    # Los demás profesores no cambian
+    assert {nombre: filas for nombre, filas in separadas.items() if "Ana" not in nombre} == \
+        {nombre: filas for nombre, filas in unidas.items() if "Ana" not in nombre}
+
+def test_separar_rechaza_la_unica_variante(engine, tmp_path):
+    guardar_defensas(engine, [defensas([
+        ("Est 1", "Dra. Ana Gómez", "Dr. Carlos Ruiz", "Lic. Rosa Martí", "MSc. Luis Díaz", "Dr. Juan Pérez"),
+    ])])
+    assert cli.main(["names", "--db", engine.url.database, "--separar", "Ana Gómez"]) == cli.SALIDA_ERROR
+
+def test_confirmar_sin_agrupar_es_un_error_de_uso(engine, capsys):
+    with pytest.raises(SystemExit) as salida:
+        cli.main(["names", "--db", engine.url.database, "--confirmar"])
+    assert salida.value.code == 2
+    assert "--agrupar" in capsys.readouterr().err
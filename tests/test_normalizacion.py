@@ -0,0 +1,55 @@
+# test_normalizacion.py
+from datetime import date, datetime, time
+import pandas as pd
+import pytest
+from benchmark import (
+    generar_filas_crudas, procesar_filas_iterrows,
+    limpiar_nombres_referencia, normalizar_hora_referencia, normalizar_lugar_referencia
+)
+from excel_processor import (
+    procesar_filas, parsear_fecha, limpiar_nombres, normalizar_hora, normalizar_lugar,
+    hora_normalizada, limpiar_cache
+)
+
+HORAS = [
+    "09:00", "9:00", "9:5", "10:30", "11:00:00", " 9:30 ", "9.30", "9:30 am", "2:00 pm", "14h30",
+    "1 pkm", "1 PKM", "", " ", None, float("nan"), "abc", "25:00", "9:60", "12:00:99", "2024-06-10 09:30",
+    time(9, 0), time(13, 30, 15), datetime(2024, 6, 10, 9, 30), pd.Timestamp("2024-06-10 15:45"),
+]
+
+@pytest.fixture(autouse=True)
+def sin_cache():
+    # Cada prueba parte de las cachés vacías y no deja valores a las demás
+    limpiar_cache()
+    yield
+    limpiar_cache()
+
+@pytest.mark.parametrize("hora", HORAS, ids=repr)
+def test_normalizar_hora_igual_que_la_referencia(hora):
+    esperado = normalizar_hora_referencia(hora)
+    assert normalizar_hora(hora) == esperado
+    # Segunda llamada desde la caché
+    assert normalizar_hora(hora) == esperado
+    # Conversión a time de procesar_filas frente a pd.to_datetime(...).time()
+    referencia = pd.to_datetime(esperado, errors="coerce")
+    assert hora_normalizada(hora) == (None if pd.isna(referencia) else referencia.time())
+
+@pytest.mark.parametrize("texto", ["Dr. Juan Pérez @jperez", "  Ana Gómez  ", "@solo", "", None, float("nan")], ids=repr)
+def test_limpiar_nombres_igual_que_la_referencia(texto):
+    assert limpiar_nombres(texto) == limpiar_nombres_referencia(texto)
+
+@pytest.mark.parametrize("lugar", ["Aula 3 (planta baja)", "Salón Francofonia", "Resp Lab 2", "Aula 5", "", None], ids=repr)
+def test_normalizar_lugar_igual_que_la_referencia(lugar):
+    assert normalizar_lugar(lugar) == normalizar_lugar_referencia(lugar)
+
+@pytest.mark.parametrize("texto, fecha", [
+    ("10 de junio 2024", date(2024, 6, 10)),
+    ("1 de Septiembre 2023", date(2023, 9, 1)),
+])
+def test_parsear_fecha(texto, fecha):
+    assert parsear_fecha(texto) == fecha
+
+def test_procesar_filas_igual_que_iterrows():
+    df_raw = generar_filas_crudas(500)
+    df, _ = procesar_filas(df_raw)
+    pd.testing.assert_frame_equal(df, procesar_filas_iterrows(df_raw))
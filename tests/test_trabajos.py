@@ -0,0 +1,36 @@
+# test_trabajos.py
+import os
+import time
+from sqlalchemy import text
+from conexiones import BaseDatos
+from trabajos import GestorTrabajos, LISTO, GUARDADO
+
+def esperar(tarea, segundos=60):
+    limite = time.time() + segundos
+    while tarea.activo and time.time() < limite:
+        time.sleep(0.05)
+    return tarea
+
+def test_lectura_sin_lotes_en_memoria_y_guardado(tmp_path, calendario):
+    with open(calendario, "rb") as archivo:
+        contenido = archivo.read()
+    gestor = GestorTrabajos(hilos=1, max_trabajos=1)
+    trabajo = esperar(gestor.enviar("calendario.xlsx", contenido))
+    assert trabajo.estado == LISTO, trabajo.error
+    assert trabajo.contenido is None and not hasattr(trabajo, "lotes")
+    assert trabajo.vista_previa["total"] == trabajo.filas > 0
+
+    base = BaseDatos(f"sqlite:///{tmp_path / 'defensas.db'}")
+    guardado = esperar(gestor.guardar(trabajo.clave, base))
+    assert guardado.estado == GUARDADO, guardado.error
+    assert guardado.resumen["insertadas"] == guardado.filas_guardadas == trabajo.filas
+    with base.lectura.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM defensas_tesis")).scalar() == trabajo.filas
+        assert conn.execute(text("SELECT DISTINCT archivo_origen FROM defensas_tesis")).scalars().all() == ["calendario.xlsx"]
+
+    # Al olvidar la lectura se borra su copia en disco
+    otro = esperar(gestor.enviar("otro.xlsx", contenido + b"\0"))
+    assert gestor.obtener(trabajo.clave) is None
+    assert not os.path.exists(trabajo.ruta)
+    otro.liberar()
+    base.cerrar()
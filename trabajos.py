@@ -0,0 +1,204 @@
+# trabajos.py
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cache_excel import procesar_excel_cacheado
+from catalogo import Catalogo
+from conflictos import DetectorConflictos, alias_bd
+from database import guardar_defensas
+from instrumentacion import medir
+
+# Procesamiento en segundo plano de los archivos subidos a la interfaz web.
+# Streamlit vuelve a ejecutar gui.py en cada interacción; si el archivo se
+# leyera dentro del script, la página quedaría bloqueada mientras tanto y se
+# volvería a leer en cada clic. Aquí cada archivo se identifica por el hash de
+# su contenido y se lee una sola vez en un hilo del gestor: la lectura (vista
+# previa) la comparten todas las sesiones que suben el mismo archivo.
+# Cada guardado es en cambio de la sesión que lo pide (Guardado, con su
+# propio id), con su opción de reemplazar, su avance y su resultado.
+#
+# Los lotes no se guardan en memoria: el archivo subido se escribe en disco y
+# el guardado vuelve a recorrerlo con procesar_excel_cacheado, que lee el
+# snapshot Arrow escrito durante la vista previa (o el Excel sin pyarrow).
+
+HILOS = int(os.environ.get("DEFENSAS_HILOS_TRABAJOS", 2))
+MAX_TRABAJOS = 20  # Lecturas terminadas que se recuerdan (con su archivo en disco)
+MAX_GUARDADOS = 100  # Guardados terminados que se recuerdan
+
+EN_COLA = "en cola"
+PROCESANDO = "procesando"
+LISTO = "listo"
+GUARDANDO = "guardando"
+GUARDADO = "guardado"
+ERROR = "error"
+
+class Trabajo:
+    # Lectura de un archivo subido, compartida entre sesiones
+    def __init__(self, clave, nombre, contenido):
+        self.clave = clave
+        self.nombre = nombre
+        self.contenido = contenido  # Se suelta al escribirlo en ruta
+        # Copia en disco con el nombre subido (archivo_origen de cada defensa)
+        self.ruta = os.path.join(tempfile.mkdtemp(prefix="defensas_"), os.path.basename(nombre))
+        self.estado = EN_COLA
+        self.filas = 0  # Defensas leídas hasta ahora
+        self.vista_previa = None  # total, primeros, fechas, lugares y conflictos
+        self.error = None
+        self.creado = time.time()
+        self.segundos = None
+        self.guardando = 0  # Guardados en curso que leen ruta
+
+    @property
+    def activo(self):
+        return self.estado in (EN_COLA, PROCESANDO)
+
+    @property
+    def en_uso(self):
+        return self.activo or self.guardando > 0
+
+    def liberar(self):
+        shutil.rmtree(os.path.dirname(self.ruta), ignore_errors=True)
+
+class Guardado:
+    # Guardado de un Trabajo ya leído, pedido por una sesión
+    def __init__(self, trabajo, reemplazar):
+        self.id = uuid.uuid4().hex
+        self.trabajo = trabajo
+        self.clave = trabajo.clave
+        self.nombre = trabajo.nombre
+        self.filas = trabajo.filas
+        self.reemplazar = reemplazar
+        self.estado = GUARDANDO
+        self.filas_guardadas = 0
+        self.resumen = None  # Resultado de guardar_defensas
+        self.error = None
+
+    @property
+    def activo(self):
+        return self.estado == GUARDANDO
+
+    @property
+    def en_uso(self):
+        return self.activo
+
+class GestorTrabajos:
+    def __init__(self, hilos=HILOS, max_trabajos=MAX_TRABAJOS, max_guardados=MAX_GUARDADOS):
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="trabajo_defensas")
+        self.trabajos = OrderedDict()  # clave -> Trabajo, del más antiguo al más reciente
+        self.guardados = OrderedDict()  # id -> Guardado
+        self.max_trabajos = max_trabajos
+        self.max_guardados = max_guardados
+        self.bloqueo = threading.Lock()
+
+    def enviar(self, nombre, contenido, base=None):
+        # Devuelve el trabajo de ese contenido; solo se procesa si es nuevo
+        # o si el intento anterior falló. Con base (BaseDatos de conexiones.py)
+        # los conflictos reconocen los profesores por sus alias en esa base.
+        clave = hashlib.sha256(contenido).hexdigest()
+        with self.bloqueo:
+            anterior = self.trabajos.get(clave)
+            if anterior is not None and anterior.estado != ERROR:
+                self.trabajos.move_to_end(clave)
+                return anterior
+            trabajo = self.trabajos[clave] = Trabajo(clave, nombre, contenido)
+            olvidados = self.recortar(self.trabajos, self.max_trabajos)
+        for olvidado in olvidados + ([anterior] if anterior is not None else []):
+            olvidado.liberar()
+        self.ejecutor.submit(self.procesar, trabajo, base)
+        return trabajo
+
+    def obtener(self, clave):
+        return self.trabajos.get(clave)
+
+    def obtener_guardado(self, id_guardado):
+        return self.guardados.get(id_guardado)
+
+    def guardar(self, clave, base, reemplazar=False):
+        # Nuevo guardado de un trabajo ya leído en base (la BaseDatos de
+        # conexiones.py, cuyo esquema se completa al guardar). Devuelve el
+        # Guardado, que la sesión recuerda por su id; None si no está listo.
+        with self.bloqueo:
+            trabajo = self.trabajos.get(clave)
+            if trabajo is None or trabajo.estado != LISTO:
+                return None
+            guardado = Guardado(trabajo, reemplazar)
+            trabajo.guardando += 1
+            self.guardados[guardado.id] = guardado
+            self.recortar(self.guardados, self.max_guardados)
+        self.ejecutor.submit(self.guardar_trabajo, guardado, base)
+        return guardado
+
+    @staticmethod
+    def recortar(tareas, maximo):
+        # Olvidar las tareas terminadas más antiguas; devuelve las olvidadas
+        olvidadas = []
+        for clave in list(tareas):
+            if len(tareas) <= maximo:
+                break
+            if not tareas[clave].en_uso:
+                olvidadas.append(tareas.pop(clave))
+        return olvidadas
+
+    def procesar(self, trabajo, base=None):
+        trabajo.estado = PROCESANDO
+        inicio = time.perf_counter()
+        try:
+            with open(trabajo.ruta, "wb") as archivo:
+                archivo.write(trabajo.contenido)
+            trabajo.contenido = None
+            primeros = None
+            detector = DetectorConflictos(alias_bd(base.lectura) if base is not None else None)
+            fechas = set()
+            lugares = set()
+            with medir("trabajo_vista_previa") as tramo:
+                for lote in procesar_excel_cacheado(trabajo.ruta):
+                    if primeros is None:
+                        primeros = lote.head(3)
+                    detector.agregar(lote)
+                    fechas.update(lote['fecha'].unique().tolist())
+                    lugares.update(lote['lugar'].unique().tolist())
+                    trabajo.filas += len(lote)
+                tramo.filas = trabajo.filas
+            trabajo.vista_previa = {
+                "total": trabajo.filas,
+                "primeros": primeros,
+                "fechas": sorted(fechas),
+                "lugares": len(lugares),
+                "conflictos": detector.resultado(),
+            }
+            trabajo.estado = LISTO
+        except Exception:
+            trabajo.error = traceback.format_exc()
+            trabajo.estado = ERROR
+        finally:
+            # Los bytes subidos ya están en disco (o la lectura falló)
+            trabajo.contenido = None
+            trabajo.segundos = time.perf_counter() - inicio
+
+    def guardar_trabajo(self, guardado, base):
+        def lotes():
+            # Del snapshot que dejó la vista previa, lote a lote
+            for lote in procesar_excel_cacheado(guardado.trabajo.ruta):
+                yield lote
+                guardado.filas_guardadas += len(lote)
+        try:
+            with medir("trabajo_guardar", filas=guardado.filas):
+                guardado.resumen = guardar_defensas(
+                    base.preparar().escritura, lotes(), reemplazar=guardado.reemplazar, filas_esperadas=guardado.filas
+                )
+            Catalogo().registrar_carga(base.url)
+            guardado.estado = GUARDADO
+        except Exception:
+            # La lectura sigue siendo válida: se puede pedir otro guardado
+            guardado.error = traceback.format_exc()
+            guardado.estado = ERROR
+        finally:
+            with self.bloqueo:
+                guardado.trabajo.guardando -= 1